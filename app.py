@@ -1,6 +1,8 @@
 import streamlit as st
 import os
 from utils.database import create_tables, check_user_login # Importa a função do DB
+from utils.manutencao import schedule_maintenance
+from utils.pagina import load_css, init_session
 
 # Configurações Iniciais
 st.set_page_config(
@@ -12,17 +14,13 @@ st.set_page_config(
 # Inicializa as tabelas do DB (garante que existem)
 create_tables()
 
+# Backup e otimização periódicos do banco (rodam em segundo plano, no máximo 1x por dia)
+schedule_maintenance()
+
 # Inicialização do estado de sessão para Login
-if "logged_in" not in st.session_state: st.session_state["logged_in"] = False
-if "username" not in st.session_state: st.session_state["username"] = ""
-if "role" not in st.session_state: st.session_state["role"] = "guest"
-
-# Função para carregar CSS (assumindo que style.css existe)
-def load_css(file_name="style.css"):
-    if os.path.exists(file_name):
-        with open(file_name, encoding='utf-8') as f: 
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-    
+init_session()
+
+# CSS em cache no processo (relido só quando o style.css muda)
 load_css()
 
 # --- Conteúdo da Página Inicial ---
@@ -1,36 +1,19 @@
+import re
 import streamlit as st
-import os
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from utils.database import (
-    add_produto, get_all_produtos, mark_produto_as_sold,
-    MARCAS, ESTILOS, TIPOS
+    add_produto, get_produto_by_id, mark_produto_as_sold, sell_produto_by_codigo,
+    get_estoque_chat, get_valor_estoque, get_mais_vendidos_desde, get_produtos_vencendo, get_produtos_abaixo_de,
+    get_cliente, buscar_clientes, get_compras_cliente,
+    MARCAS, ESTILOS, TIPOS, LIMITE_CHAT
 )
+from utils.pagina import setup_page, format_to_brl, format_date, format_cliente
 
-# --- Funções Auxiliares ---
-def load_css(file_name):
-    if not os.path.exists(file_name):
-        st.warning(f"O arquivo CSS '{file_name}' não foi encontrado.")
-        return
-    try:
-        with open(file_name, encoding='utf-8') as f: 
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-    except Exception as e:
-        st.error(f"Erro ao carregar CSS: {e}")
-
-load_css("style.css")
-
-# Ações do chatbot
-st.set_page_config(page_title="Chatbot de Estoque - Cores e Fragrâncias")
-
-# Inicializa o estado de login se não existir
-if 'logged_in' not in st.session_state:
-    st.session_state['logged_in'] = False
-
-# Verifica se o usuário está logado
-if not st.session_state.get("logged_in"):
-    st.error("Acesso negado. Faça login na área administrativa para usar o chatbot.")
-    st.info("Vá para a página 'Área Administrativa' para entrar.")
-    st.stop()
+# Ações do chatbot (exige login)
+setup_page(
+    "Chatbot de Estoque", login=True,
+    mensagem="Acesso negado. Faça login na página 'Área Administrativa' para usar o chatbot."
+)
 
 # --- CHATBOT ---
 
@@ -44,6 +27,111 @@ if "chat_state" not in st.session_state:
 
 st.title("🤖 Chatbot de Estoque (Operacional)")
 
+# --- Consultas (cada comando vira uma consulta SQL com LIMIT) ---
+MARCAS_POR_NOME = {m.lower(): m for m in MARCAS}
+PERIODOS_CHAT = {"hoje": 0, "semana": 7, "mes": 30, "mês": 30}
+
+RE_VALOR_ESTOQUE = re.compile(r"^valor (?:do )?estoque(?: (.+))?$")
+RE_MAIS_VENDIDOS = re.compile(r"^mais vendidos(?: (hoje|semana|mes|mês))?$")
+RE_VENCE_EM = re.compile(r"^vence(?:m)? em (\d+) dias?$")
+RE_ABAIXO_DE = re.compile(r"^abaixo de (\d+)(?: unidades?)?$")
+
+
+def _marca(texto):
+    """Nome da marca como cadastrado (o chat recebe tudo em minúsculas)."""
+    texto = texto.strip()
+    return MARCAS_POR_NOME.get(texto, texto.title())
+
+
+def _lista(titulo, total, linhas):
+    """Monta a resposta em lista, avisando quando há mais itens do que os exibidos."""
+    response = f"**{titulo}** ({total}):\n" + "".join(f"- {linha}\n" for linha in linhas)
+    if total > len(linhas):
+        response += f"\n_... e mais {total - len(linhas)} produto(s). Use os filtros da página de estoque para ver todos._"
+    return response
+
+
+def answer_query(user_input):
+    """Responde às perguntas agregadas do chat; retorna None se o texto não for uma delas."""
+    if m := RE_VALOR_ESTOQUE.match(user_input):
+        marca = _marca(m.group(1)) if m.group(1) else None
+        valores = get_valor_estoque(marca)
+        if not valores:
+            return f"Nenhum produto em estoque{f' da marca **{marca}**' if marca else ''}."
+        unidades = sum(v['unidades'] for v in valores)
+        venda = sum(v['valor_venda'] for v in valores)
+        custo = sum(v['valor_custo'] for v in valores)
+        response = (f"💰 **Valor do estoque{f' ({marca})' if marca else ''}:** {format_to_brl(venda)} "
+                    f"a preço de venda, {format_to_brl(custo)} a custo • {unidades} unidade(s).")
+        if not marca:
+            response += "\n" + "".join(
+                f"- {v['marca']}: {format_to_brl(v['valor_venda'])} ({v['unidades']} un.)\n" for v in valores[:LIMITE_CHAT]
+            )
+        return response
+
+    if m := RE_MAIS_VENDIDOS.match(user_input):
+        periodo = m.group(1) or "semana"
+        inicio = datetime.combine(date.today() - timedelta(days=PERIODOS_CHAT[periodo]), datetime.min.time())
+        produtos = get_mais_vendidos_desde(inicio.isoformat())
+        if not produtos:
+            return f"Nenhuma venda registrada ({periodo})."
+        return f"🏆 **Mais vendidos ({periodo}):**\n" + "".join(
+            f"{i}. **{p['nome']}** (ID: {p['produto_id']}) - {p['unidades']} un., {format_to_brl(p['receita'])}\n"
+            for i, p in enumerate(produtos, 1)
+        )
+
+    if m := RE_VENCE_EM.match(user_input):
+        dias = int(m.group(1))
+        total, produtos = get_produtos_vencendo(dias)
+        if not total:
+            return f"Nenhum produto em estoque vence nos próximos {dias} dia(s)."
+        hoje = date.today().isoformat()
+        return _lista(f"⏰ Vencem em até {dias} dia(s)", total, [
+            f"**{p['nome']}** (ID: {p['id']}) - {format_date(p['data_validade'])}"
+            f"{' ⚠️ vencido' if p['data_validade'] < hoje else ''}, Qtd: {p['quantidade']}"
+            for p in produtos
+        ])
+
+    if m := RE_ABAIXO_DE.match(user_input):
+        unidades = int(m.group(1))
+        total, produtos = get_produtos_abaixo_de(unidades)
+        if not total:
+            return f"Nenhum produto com menos de {unidades} unidade(s) em estoque."
+        return _lista(f"📉 Abaixo de {unidades} unidade(s)", total, [
+            f"**{p['nome']}** (ID: {p['id']}) - Qtd: {p['quantidade']}, Marca: {p['marca']}" for p in produtos
+        ])
+
+    return None
+
+
+def answer_cliente(termo):
+    """Comando 'cliente': mostra o cliente da sessão, troca de cliente ou limpa ('cliente nenhum')."""
+    termo = termo.strip()
+    if termo in ("nenhum", "sem"):
+        st.session_state["cliente_id"] = None
+        return "Vendas sem cliente a partir de agora."
+    if not termo:
+        cliente = get_cliente(st.session_state["cliente_id"]) if st.session_state.get("cliente_id") else None
+        if not cliente:
+            return "Nenhum cliente selecionado. Use `cliente [nome ou telefone]`."
+        compras = get_compras_cliente(cliente["id"], limit=5)
+        return (f"👤 **{format_cliente(cliente)}** • {cliente['num_compras']} compra(s), "
+                f"{format_to_brl(cliente['total_gasto'])} no total\n" + "".join(
+                    f"- {format_date(v['data_venda'])}: {v.get('nome') or v['produto_id']} ({v['quantidade']} un.)\n"
+                    for v in compras))
+
+    if termo.startswith("#") and termo[1:].isdigit():
+        clientes = [c for c in [get_cliente(int(termo[1:]))] if c]
+    else:
+        clientes = buscar_clientes(termo)
+    if len(clientes) != 1:
+        if not clientes:
+            return f"Nenhum cliente encontrado para '{termo}'. Cadastre-o em Gerenciar Produtos > Clientes."
+        return "Mais de um cliente encontrado; escolha com `cliente #ID`:\n" + "".join(
+            f"- #{c['id']} {format_cliente(c)}\n" for c in clientes)
+    st.session_state["cliente_id"] = clientes[0]["id"]
+    return f"👤 As próximas vendas serão de **{format_cliente(clientes[0])}**. Use `cliente nenhum` para tirar."
+
 # Função principal do Chatbot
 def process_command(user_input: str):
     user_input = user_input.strip().lower()
@@ -122,7 +210,7 @@ def process_command(user_input: str):
             add_produto(
                 state["data"]["nome"], state["data"]["preco"], state["data"]["quantidade"], 
                 state["data"]["marca"], state["data"]["estilo"], state["data"]["tipo"], 
-                None, data_validade_iso
+                None, data_validade_iso, usuario=st.session_state.get("username")
             )
             nome = state["data"]["nome"]
             state["step"] = "idle"
@@ -142,11 +230,16 @@ def process_command(user_input: str):
     elif state["step"] == "sell_waiting_id":
         try:
             produto_id = int(user_input)
-            produtos = get_all_produtos() # Pega os dados mais frescos
-            produtos_map = {p['id']: p for p in produtos}
+            produto = get_produto_by_id(produto_id) # Busca só o produto pedido (dados mais frescos)
+            produtos_map = {produto_id: produto} if produto else {}
             
             if produto_id in produtos_map and int(produtos_map[produto_id]['quantidade']) > 0:
-                mark_produto_as_sold(produto_id, 1) # Vende 1 unidade
+                try:
+                    mark_produto_as_sold(produto_id, 1, st.session_state.get("local_id"), usuario=st.session_state.get("username"),
+                                         cliente_id=st.session_state.get("cliente_id")) # 1 unidade, do local e cliente da sessão
+                except ValueError as e: # Sem estoque no local escolhido
+                    st.session_state["chat_state"] = {"step": "idle", "data": {}}
+                    return f"❌ {e}"
                 
                 # Mensagem de sucesso
                 estoque_restante = int(produtos_map[produto_id]['quantidade']) - 1
@@ -179,9 +272,16 @@ def process_command(user_input: str):
             # ... (Comandos inalterados) ...
             return ("**Comandos disponíveis:**\n"
                     "- `adicionar produto`: Inicia o formulário de cadastro.\n"
-                    "- `estoque`: Mostra todos os produtos.\n"
+                    "- `estoque`: Mostra os produtos em estoque.\n"
                     "- `estoque [marca]`: Filtra o estoque por uma marca (ex: `estoque eudora`).\n"
+                    "- `valor estoque [marca]`: Valor total do estoque (ex: `valor estoque natura`).\n"
+                    "- `mais vendidos [hoje|semana|mes]`: Ranking de vendas do período.\n"
+                    "- `vence em [N] dias`: Produtos com validade nos próximos N dias.\n"
+                    "- `abaixo de [N] unidades`: Produtos com estoque baixo.\n"
                     "- `vender [ID]`: Marca 1 unidade de um produto como vendido. Ou digite `vender` para ser guiado.\n"
+                    "- `scan [código]`: Vende 1 unidade pelo código de barras/SKU (ex: `scan 7891234567890`).\n"
+                    "- `cliente [nome ou telefone]`: Define o cliente das próximas vendas (`cliente` mostra o atual e "
+                    "as últimas compras; `cliente nenhum` tira).\n"
                     "- `cancelar`: Cancela a operação atual.\n"
                     "- `ajuda`: Mostra esta lista.")
 
@@ -191,6 +291,20 @@ def process_command(user_input: str):
             st.session_state["chat_state"] = state
             return "Ok, vamos adicionar um produto. Qual é o **Nome** dele?"
             
+        elif user_input == "cliente" or user_input.startswith("cliente "):
+            return answer_cliente(user_input[len("cliente"):])
+
+        elif user_input.startswith("scan "):
+            codigo = user_input.split(maxsplit=1)[1]
+            try:
+                produto = sell_produto_by_codigo(codigo, 1, st.session_state.get("local_id"), usuario=st.session_state.get("username"),
+                                                 cliente_id=st.session_state.get("cliente_id"))
+            except ValueError as e:
+                return f"❌ {e}"
+            if produto['quantidade'] == 0:
+                return f"✅ Produto **{produto['nome']}** (ID: {produto['id']}) marcado como **VENDIDO** e fora de estoque."
+            return f"✅ 1 unidade de **{produto['nome']}** (ID: {produto['id']}) vendida. Estoque restante: {produto['quantidade']}."
+
         elif user_input.startswith("vender"):
             parts = user_input.split()
             if len(parts) == 2: # Tenta vender diretamente pelo ID
@@ -203,28 +317,23 @@ def process_command(user_input: str):
                 st.session_state["chat_state"] = state
                 return "Certo. Qual é o **ID do produto** que você vendeu?"
 
+        elif (resposta := answer_query(user_input)) is not None:
+            return resposta
+
         elif user_input.startswith("estoque"):
-            produtos = get_all_produtos() # Pega os dados mais frescos
-            if len(user_input.split()) == 1:
-                if not produtos:
-                    return "Nenhum produto cadastrado no estoque."
-                
-                response = "**Produtos em Estoque:**\n"
-                for p in produtos:
-                    response += f"- **{p['nome']}** (ID: {p['id']}) - R$ {p['preco']:.2f}, Qtd: {p['quantidade']}, Marca: {p['marca']}\n"
-                return response
-                
-            else:
-                target_marca = user_input.split("estoque ", 1)[1].strip().title()
-                produtos_filtrados = [p for p in produtos if p.get("marca") == target_marca]
-                
-                if not produtos_filtrados:
-                    return f"Nenhum produto encontrado para a marca **{target_marca}**."
-                    
-                response = f"**Produtos da marca {target_marca} em Estoque:**\n"
-                for p in produtos_filtrados:
-                    response += f"- **{p['nome']}** (ID: {p['id']}) - R$ {p['preco']:.2f}, Qtd: {p['quantidade']}, Estilo: {p['estilo']}\n"
-                return response
+            marca = _marca(user_input.split("estoque", 1)[1]) if len(user_input.split()) > 1 else None
+            total, produtos = get_estoque_chat(marca)
+            if not total:
+                return f"Nenhum produto encontrado para a marca **{marca}**." if marca else "Nenhum produto cadastrado no estoque."
+            if marca:
+                return _lista(f"Produtos da marca {marca} em Estoque", total, [
+                    f"**{p['nome']}** (ID: {p['id']}) - R$ {p['preco']:.2f}, Qtd: {p['quantidade']}, Estilo: {p['estilo']}"
+                    for p in produtos
+                ])
+            return _lista("Produtos em Estoque", total, [
+                f"**{p['nome']}** (ID: {p['id']}) - R$ {p['preco']:.2f}, Qtd: {p['quantidade']}, Marca: {p['marca']}"
+                for p in produtos
+            ])
 
         else:
             return "Desculpe, não entendi o comando. Digite 'ajuda' para ver os comandos disponíveis."
@@ -0,0 +1,118 @@
+import streamlit as st
+import pandas as pd
+from datetime import date, timedelta
+from utils.database import (
+    get_receita_por_periodo, get_top_vendidos, get_mix_vendas,
+    get_margem_por_periodo, get_margem_por_produto, get_margem_por_marca, get_valor_estoque
+)
+from utils.pagina import setup_page, format_to_brl
+
+setup_page("Dashboard de Vendas", layout="wide", login=True)
+
+st.title("📈 Dashboard de Vendas")
+st.caption("Os números abaixo vêm das tabelas de resumo, atualizadas a cada venda.")
+
+# --- Filtros ---
+col_periodo, col_inicio, col_fim = st.columns(3)
+with col_periodo:
+    periodo_label = st.selectbox("Agrupar por", ["Dia", "Semana", "Mês"], index=0)
+with col_inicio:
+    data_inicio = st.date_input("De", value=date.today() - timedelta(days=90))
+with col_fim:
+    data_fim = st.date_input("Até", value=date.today())
+
+periodo = {"Dia": "dia", "Semana": "semana", "Mês": "mes"}[periodo_label]
+receita = get_receita_por_periodo(
+    periodo,
+    data_inicio.isoformat() if data_inicio else None,
+    data_fim.isoformat() if data_fim else None,
+)
+
+if not receita:
+    st.info("Nenhuma venda registrada no período selecionado.")
+    st.stop()
+
+df_receita = pd.DataFrame(receita).set_index("periodo")
+
+# --- Indicadores ---
+m1, m2, m3 = st.columns(3)
+m1.metric("Receita no Período", format_to_brl(df_receita["receita"].sum()))
+m2.metric("Unidades Vendidas", int(df_receita["unidades"].sum()))
+m3.metric("Número de Vendas", int(df_receita["num_vendas"].sum()))
+
+st.subheader(f"Receita por {periodo_label}")
+st.bar_chart(df_receita["receita"])
+
+st.markdown("---")
+
+# --- Mais Vendidos e Mix ---
+col_top, col_mix = st.columns(2)
+
+with col_top:
+    st.subheader("🏆 Mais Vendidos (geral)")
+    top = get_top_vendidos(10)
+    if top:
+        df_top = pd.DataFrame(top)[["nome", "marca", "unidades", "receita"]]
+        df_top["receita"] = df_top["receita"].map(format_to_brl)
+        st.dataframe(df_top, hide_index=True)
+    else:
+        st.info("Sem dados de vendas.")
+
+with col_mix:
+    dimensao_label = st.radio("Mix de vendas por", ["Marca", "Tipo"], horizontal=True)
+    dimensao = dimensao_label.lower()
+    mix = get_mix_vendas(dimensao)
+    if mix:
+        st.bar_chart(pd.DataFrame(mix).set_index(dimensao)["receita"])
+    else:
+        st.info("Sem dados de vendas.")
+
+st.markdown("---")
+
+# --- Margem e Lucro ---
+st.subheader("💹 Margem e Lucro")
+st.caption("Calculados pelo custo registrado no momento de cada venda (vendas sem custo cadastrado contam como custo zero).")
+
+margem = get_margem_por_periodo(
+    periodo,
+    data_inicio.isoformat() if data_inicio else None,
+    data_fim.isoformat() if data_fim else None,
+)
+df_margem = pd.DataFrame(margem).set_index("periodo")
+receita_total, lucro_total = df_margem["receita"].sum(), df_margem["lucro"].sum()
+
+l1, l2, l3 = st.columns(3)
+l1.metric("Custo no Período", format_to_brl(df_margem["custo"].sum()))
+l2.metric("Lucro no Período", format_to_brl(lucro_total))
+l3.metric("Margem", f"{(lucro_total / receita_total * 100) if receita_total else 0:.1f}%".replace('.', ','))
+st.bar_chart(df_margem["lucro"])
+
+col_lucro_produto, col_lucro_marca = st.columns(2)
+
+with col_lucro_produto:
+    st.markdown("##### Produtos com Maior Lucro")
+    top_lucro = get_margem_por_produto(10)
+    if top_lucro:
+        df_top_lucro = pd.DataFrame(top_lucro)[["nome", "unidades", "lucro", "margem"]]
+        df_top_lucro["lucro"] = df_top_lucro["lucro"].map(format_to_brl)
+        df_top_lucro.columns = ["Produto", "Unidades", "Lucro", "Margem (%)"]
+        st.dataframe(df_top_lucro, hide_index=True)
+
+with col_lucro_marca:
+    st.markdown("##### Lucro por Marca")
+    por_marca = get_margem_por_marca()
+    if por_marca:
+        df_marca = pd.DataFrame(por_marca)[["marca", "receita", "lucro", "margem"]]
+        df_marca["receita"] = df_marca["receita"].map(format_to_brl)
+        df_marca["lucro"] = df_marca["lucro"].map(format_to_brl)
+        df_marca.columns = ["Marca", "Receita", "Lucro", "Margem (%)"]
+        st.dataframe(df_marca, hide_index=True)
+
+st.markdown("##### 📦 Estoque Atual (venda x custo)")
+estoque = get_valor_estoque()
+if estoque:
+    df_estoque = pd.DataFrame(estoque)
+    e1, e2, e3 = st.columns(3)
+    e1.metric("Valor de Venda", format_to_brl(df_estoque["valor_venda"].sum()))
+    e2.metric("Valor de Custo", format_to_brl(df_estoque["valor_custo"].sum()))
+    e3.metric("Lucro Potencial", format_to_brl(df_estoque["lucro_potencial"].sum()))
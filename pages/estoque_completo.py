@@ -1,60 +1,52 @@
 import streamlit as st
-from utils.database import get_all_produtos, ASSETS_DIR # Importado ASSETS_DIR para fotos
+from utils.database import ASSETS_DIR, get_facetas, contar_facetas # ASSETS_DIR para fotos
+from utils.atualizacao import get_produtos_cache, watch_changes
+from utils.pagina import setup_page, select_local, format_to_brl
 from datetime import datetime
 import os
 
-# --- Funções Auxiliares ---
-
-def format_to_brl(value):
-    """Formata um float para string no formato R$ 1.234.567,89."""
-    try:
-        # 1. Converte para float (se já não for)
-        num = float(value)
-        # 2. Formata com underscore (_) como separador de milhar e ponto (.) como decimal
-        formatted = f"{num:_.2f}" 
-        # 3. Substitui o ponto (decimal) por vírgula (,)
-        formatted = formatted.replace('.', ',') 
-        # 4. Substitui o underscore (milhar) por ponto (.) e adiciona o prefixo R$
-        return "R$ " + formatted.replace('_', '.') 
-    except (ValueError, TypeError):
-        return "R$ N/A"
-
-def load_css(file_name="style.css"):
-    if not os.path.exists(file_name):
-        # Apenas um aviso, pois o arquivo pode estar em outro lugar
-        return
-    try:
-        with open(file_name, encoding='utf-8') as f: 
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-    except Exception as e:
-        st.error(f"Erro ao carregar CSS: {e}")
-
 # --- Configuração e Carga Inicial ---
 
-load_css("style.css") # Aplica o CSS
-st.set_page_config(page_title="Estoque - Cores e Fragrâncias")
+setup_page("Estoque") # Título da aba + CSS (em cache no processo)
 
 st.title("📦 Estoque Completo")
 
-# 🔄 CHAMADA CRÍTICA: Obter dados mais recentes
-produtos = get_all_produtos()
+# 🔄 Dados da sessão: só os produtos alterados desde a última leitura são buscados no banco
+local_id = select_local() # Com mais de um local, mostra o estoque do local escolhido
+produtos = get_produtos_cache(local_id=local_id)
+watch_changes() # Recarrega a página quando outra sessão altera o estoque
 
 if not produtos:
     st.info("Nenhum produto cadastrado no estoque.")
 else:
-    # Coleta de categorias únicas para os filtros
-    marcas = sorted(list({p.get("marca") for p in produtos if p.get("marca")}))
-    estilos = sorted(list({p.get("estilo") for p in produtos if p.get("estilo")}))
-    tipos = sorted(list({p.get("tipo") for p in produtos if p.get("tipo")}))
+    # Contagens dos filtros: combinações (marca, estilo, tipo) em cache até a próxima escrita
+    combinacoes = get_facetas(local_id)
+    valores = contar_facetas(combinacoes)
+    filtros = {f: st.session_state.get(f"filtro_{f}") for f in ("marca", "estilo", "tipo")}
+    filtros = {f: v if v in valores[f] else None for f, v in filtros.items()}
+    contagens = contar_facetas(combinacoes, **filtros)
+
+    def filtro_facetado(coluna, rotulo, faceta, todos):
+        """Selectbox com a contagem de cada opção, ex.: 'Natura (132)'.
+
+        Sem 'key': quando as contagens mudam o widget é recriado, com a escolha guardada em filtro_<faceta>.
+        """
+        contagem = contagens[faceta]
+        opcoes = {f"{todos} ({contagem[None]})": None}
+        opcoes.update({f"{v} ({contagem.get(v, 0)})": v for v in sorted(v for v in valores[faceta] if v is not None)})
+        rotulos = list(opcoes)
+        with coluna:
+            escolha = opcoes[st.selectbox(rotulo, rotulos, index=list(opcoes.values()).index(filtros[faceta]))]
+        st.session_state[f"filtro_{faceta}"] = escolha
+        return escolha or todos
 
     # Filtros em colunas
     col1, col2, col3 = st.columns(3)
-    with col1:
-        marca_filtro = st.selectbox("Filtrar por Marca", ["Todas"] + marcas)
-    with col2:
-        estilo_filtro = st.selectbox("Filtrar por Estilo", ["Todos"] + estilos)
-    with col3:
-        tipo_filtro = st.selectbox("Filtrar por Tipo", ["Todos"] + tipos)
+    marca_filtro = filtro_facetado(col1, "Filtrar por Marca", "marca", "Todas")
+    estilo_filtro = filtro_facetado(col2, "Filtrar por Estilo", "estilo", "Todos")
+    tipo_filtro = filtro_facetado(col3, "Filtrar por Tipo", "tipo", "Todos")
+    if any(st.session_state[f"filtro_{f}"] != v for f, v in filtros.items()):
+        st.rerun() # A escolha mudou: as contagens dos outros filtros precisam refletir o novo filtro
 
     # Aplicação dos filtros
     produtos_filtrados = produtos
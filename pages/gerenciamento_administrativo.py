@@ -1,29 +1,24 @@
 import streamlit as st
 import os
-from utils.database import add_user, get_user, get_all_users, hash_password
+import json
+import pandas as pd
+from utils.database import (
+    add_user, get_user, get_all_users, hash_password, get_write_metrics,
+    flush_audit, get_auditoria, get_usuarios_auditoria, ACOES_AUDITORIA
+)
+from utils.manutencao import (
+    backup_database, optimize_database, get_database_stats, list_backups, check_integrity, format_bytes
+)
+from utils.imagens import collect_image_garbage
+from utils.catalogo import publish_catalog, get_catalog_status
+from utils.jobs import submit_job, list_jobs
+from utils.pagina import setup_page, is_admin, format_date
 
-# --- Funções Auxiliares ---
-def load_css(file_name):
-    """Carrega e aplica o CSS personalizado, forçando a codificação UTF-8."""
-    if not os.path.exists(file_name):
-        st.warning(f"O arquivo CSS '{file_name}' não foi encontrado.")
-        return
-    try:
-        with open(file_name, encoding='utf-8') as f: 
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-    except Exception as e:
-        st.error(f"Erro ao carregar CSS: {e}")
-
-load_css("style.css")
-
-st.set_page_config(page_title="Área Administrativa - Cores e Fragrâncias")
+# Sem exigir login: é aqui que o login é feito
+setup_page("Área Administrativa")
 
 st.title("🔐 Área Administrativa")
 
-# Inicializa o estado de login
-if "logged_in" not in st.session_state:
-    st.session_state["logged_in"] = False
-
 # Adiciona botão de Logout se logado
 if st.session_state.get("logged_in"):
     st.sidebar.success(f"Logado como: **{st.session_state.get('username')}** ({st.session_state.get('role')})")
@@ -36,7 +31,8 @@ if st.session_state.get("logged_in"):
 
 st.markdown("Faça login ou cadastre um novo administrador ou funcionário abaixo.")
 
-option = st.selectbox("Escolha uma ação", ["Login", "Cadastrar Novo Usuário", "Gerenciar Contas (Admins)"])
+option = st.selectbox("Escolha uma ação", ["Login", "Cadastrar Novo Usuário", "Gerenciar Contas (Admins)", "Manutenção do Banco (Admins)",
+                                             "Limpeza de Imagens (Admins)", "Auditoria (Admins)"])
 
 if option == "Login":
     username = st.text_input("Nome de usuário", key="login_user")
@@ -69,12 +65,12 @@ elif option == "Cadastrar Novo Usuário":
             if get_user(new_username):
                 st.error("Nome de usuário já existe.")
             else:
-                add_user(new_username, new_password, role=role)
+                add_user(new_username, new_password, role=role, usuario=st.session_state.get('username'))
                 st.success(f"Usuário '{new_username}' criado com papel '{role}'. Agora faça login.")
                 st.rerun() # Atualiza a página para limpar os campos e incentivar o login
 
 elif option == "Gerenciar Contas (Admins)":
-    if not st.session_state.get('logged_in') or st.session_state.get('role') != 'admin':
+    if not is_admin():
         st.error('Apenas administradores podem gerenciar contas. Faça login como admin.')
     else:
         st.subheader('Usuários cadastrados')
@@ -82,4 +78,157 @@ elif option == "Gerenciar Contas (Admins)":
         # Não incluí a funcionalidade de deletar usuário para simplificar,
         # mas você a adicionaria aqui, com um st.button e st.rerun().
         for u in users:
-            st.write(f"- {u.get('username')} ({u.get('role')})")
\ No newline at end of file
+            st.write(f"- {u.get('username')} ({u.get('role')})")
+
+elif option == "Manutenção do Banco (Admins)":
+    if not is_admin():
+        st.error('Apenas administradores podem fazer a manutenção do banco. Faça login como admin.')
+    else:
+        st.subheader('Banco de dados (data/estoque.db)')
+        stats = get_database_stats()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Tamanho do arquivo", format_bytes(stats['tamanho_arquivo']))
+        c2.metric("Páginas livres", f"{stats['freelist_count']} ({stats['fragmentacao']:.1f}%)")
+        c3.metric("WAL", format_bytes(stats['tamanho_wal']))
+        st.caption(f"Último backup: {stats['ultimo_backup'] or '-'} • Última otimização: {stats['ultima_otimizacao'] or '-'}")
+
+        metricas = get_write_metrics()
+        st.caption(
+            f"Escritas neste servidor: {metricas['transacoes']} • Espera média pelo lock: "
+            f"{metricas['espera_media'] * 1000:.1f} ms (máx. {metricas['espera_max'] * 1000:.0f} ms) • "
+            f"Novas tentativas: {metricas['retentativas']} • Falhas por banco ocupado: {metricas['falhas']}"
+        )
+
+        col_backup, col_otimizar, col_integridade = st.columns(3)
+        with col_backup:
+            if st.button('💾 Fazer Backup Agora'):
+                caminho = backup_database()
+                st.success(f"Backup criado: {os.path.basename(caminho)}")
+        with col_otimizar:
+            if st.button('🧹 Otimizar / Compactar'):
+                resultado = optimize_database()
+                st.success(f"Otimização concluída: {format_bytes(resultado['antes']['tamanho_arquivo'])} → "
+                           f"{format_bytes(resultado['depois']['tamanho_arquivo'])}")
+        with col_integridade:
+            if st.button('🩺 Verificar Integridade'):
+                problemas = check_integrity()
+                if problemas:
+                    st.error("Problemas encontrados: " + "; ".join(problemas))
+                else:
+                    st.success("Banco íntegro.")
+
+        st.markdown('##### Catálogo público')
+        catalogo = get_catalog_status()
+        st.caption(
+            f"Pasta: {catalogo['destino']} • {catalogo['produtos']} produto(s) • "
+            f"Atualizado em: {format_date(catalogo['atualizado_em'], '%d/%m/%Y %H:%M')} • "
+            "Republicado sozinho após as alterações."
+        )
+        if st.button('🛍️ Refazer Catálogo Completo'):
+            submit_job('publicar_catalogo', publish_catalog, completo=True, usuario=st.session_state.get('username'))
+            st.success('Publicação enviada para segundo plano.')
+
+        st.markdown('##### Backups')
+        backups = list_backups()
+        if not backups:
+            st.info("Nenhum backup ainda.")
+        for b in backups:
+            st.write(f"- {b['nome']} ({format_bytes(b['tamanho'])})")
+
+elif option == "Limpeza de Imagens (Admins)":
+    if not is_admin():
+        st.error('Apenas administradores podem limpar as imagens. Faça login como admin.')
+    else:
+        st.subheader('Fotos órfãs e duplicadas em assets/')
+        st.caption('A análise não apaga nada. Arquivos enviados na última hora são ignorados.')
+
+        if st.button('🔍 Analisar'):
+            st.session_state['gc_relatorio'] = collect_image_garbage(dry_run=True)
+
+        relatorio = st.session_state.get('gc_relatorio')
+        if relatorio:
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Órfãs", len(relatorio['orfaos']))
+            c2.metric("Grupos de duplicadas", len(relatorio['duplicados']))
+            c3.metric("Espaço recuperável", format_bytes(relatorio['bytes_recuperaveis']))
+
+            with st.expander("Detalhes"):
+                for nome in relatorio['orfaos']:
+                    st.write(f"- Órfã: {nome}")
+                for grupo in relatorio['duplicados']:
+                    st.write(f"- Mantém **{grupo['manter']}**, remove: {', '.join(grupo['duplicados'])}")
+
+            if relatorio['orfaos'] or relatorio['duplicados']:
+                if st.button('🗑️ Remover Órfãs e Duplicadas'):
+                    submit_job('limpeza_imagens', collect_image_garbage, dry_run=False,
+                               usuario=st.session_state.get('username'))
+                    st.session_state.pop('gc_relatorio', None)
+                    st.success('Limpeza enviada para segundo plano.')
+
+        for job in list_jobs(usuario=st.session_state.get('username'), limit=20):
+            if job['tipo'] == 'limpeza_imagens' and job['status'] == 'concluido':
+                resultado = job['resultado']
+                st.info(f"Última limpeza (#{job['id']}): {len(resultado['removidos'])} arquivo(s) removido(s), "
+                        f"{format_bytes(resultado['bytes_recuperaveis'])} recuperados.")
+                break
+
+elif option == "Auditoria (Admins)":
+    if not is_admin():
+        st.error('Apenas administradores podem ver a auditoria. Faça login como admin.')
+    else:
+        st.subheader('Auditoria de ações')
+        flush_audit()  # Grava o que ainda está no buffer deste processo antes de consultar
+
+        TODOS = "Todos"
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            filtro_usuario = st.selectbox("Usuário", [TODOS] + get_usuarios_auditoria(), key="aud_usuario")
+        with c2:
+            filtro_acao = st.selectbox("Ação", [TODOS] + list(ACOES_AUDITORIA),
+                                       format_func=lambda a: ACOES_AUDITORIA.get(a, a), key="aud_acao")
+        with c3:
+            filtro_produto = st.number_input("ID do produto (0 = todos)", min_value=0, step=1, key="aud_produto")
+        c4, c5 = st.columns(2)
+        with c4:
+            data_inicio = st.date_input("De", value=None, format="DD/MM/YYYY", key="aud_inicio")
+        with c5:
+            data_fim = st.date_input("Até", value=None, format="DD/MM/YYYY", key="aud_fim")
+
+        filtros = {
+            "usuario": None if filtro_usuario == TODOS else filtro_usuario,
+            "acao": None if filtro_acao == TODOS else filtro_acao,
+            "produto_id": int(filtro_produto) or None,
+            "data_inicio": data_inicio.isoformat() if data_inicio else None,
+            "data_fim": data_fim.isoformat() if data_fim else None,
+        }
+        # Paginação por chave: guarda o último ID de cada página já vista; volta ao início se o filtro mudar
+        if st.session_state.get('aud_filtros') != filtros:
+            st.session_state['aud_filtros'] = filtros
+            st.session_state['aud_paginas'] = []
+        paginas = st.session_state['aud_paginas']
+
+        entradas = get_auditoria(**filtros, limit=50, before=paginas[-1] if paginas else None)
+        if not entradas:
+            st.info("Nenhuma ação registrada com esses filtros.")
+        else:
+            df = pd.DataFrame([{
+                "Quando": format_date(e['em'], '%d/%m/%Y %H:%M:%S'),
+                "Usuário": e['usuario'] or '-',
+                "Ação": ACOES_AUDITORIA.get(e['acao'], e['acao']),
+                "Produto": e['produto_id'] or '',
+                "Antes": json.dumps(e['antes'], ensure_ascii=False) if e['antes'] else '',
+                "Depois": json.dumps(e['depois'], ensure_ascii=False) if e['depois'] else '',
+            } for e in entradas])
+            st.dataframe(df, hide_index=True)
+
+        col_ant, col_pag, col_prox = st.columns([1, 2, 1])
+        with col_ant:
+            if st.button("⬅️ Mais recentes", disabled=not paginas):
+                paginas.pop()
+                st.rerun()
+        with col_pag:
+            st.caption(f"Página {len(paginas) + 1}")
+        with col_prox:
+            if st.button("Mais antigas ➡️", disabled=len(entradas) < 50):
+                paginas.append(entradas[-1]['id'])
+                st.rerun()
@@ -1,42 +1,30 @@
 import streamlit as st
 import os
+import io
+import functools
 from datetime import datetime, date
 from utils.database import (
     add_produto, get_all_produtos, update_produto, delete_produto, get_produto_by_id,
-    export_produtos_to_csv_content, import_produtos_from_csv_buffer, generate_stock_pdf_bytes,
-    mark_produto_as_sold,
-    MARCAS, ESTILOS, TIPOS, ASSETS_DIR
+    export_produtos_to_csv_content, import_produtos_from_csv_buffer, generate_stock_pdf_bytes, generate_labels_pdf_bytes,
+    export_produtos_delta_to_csv_content,
+    export_produtos_to_xlsx_bytes, import_produtos_from_xlsx_buffer,
+    mark_produto_as_sold, get_produtos_para_repor, export_reposicao_to_csv_content,
+    remove_product_photo, get_produto_by_codigo, sell_produto_by_codigo, add_lote, get_lotes, get_historico_precos,
+    get_locais, add_local, set_local_ativo, get_estoque_por_local, transfer_estoque, get_transferencias,
+    add_cliente, update_cliente, get_cliente, buscar_clientes, get_compras_cliente,
+    MARCAS, ESTILOS, TIPOS, ASSETS_DIR, LOCAL_PRINCIPAL, NOME_LOCAL_PRINCIPAL
 )
+from utils.jobs import submit_job, cancel_job, list_jobs, get_job_file
+from utils.atualizacao import get_produtos_cache, watch_changes
+from utils.pagina import setup_page, is_admin, select_local, select_cliente, format_cliente, format_to_brl, format_date
+
+# CSS (em cache no processo) + verificação de login
+setup_page("Gerenciar Produtos", login=True)
 
-# --- FUNÇÃO CSS ADICIONADA ---
-def load_css(file_name="style.css"):
-    """Carrega e aplica o CSS personalizado, forçando a codificação UTF-8."""
-    if os.path.exists(file_name):
-        with open(file_name, encoding='utf-8') as f: 
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-
-# Chama o CSS para esta página
-load_css()
-# -----------------------------
-
-# --- Verificação de Login ---
-if not st.session_state.get("logged_in"):
-    st.error("🔒 **Acesso Restrito.** Por favor, faça login na Área Administrativa.")
-    st.stop()
-    
 # Inicialização de estado para Edição
 if 'edit_mode' not in st.session_state: st.session_state['edit_mode'] = False
 if 'edit_product_id' not in st.session_state: st.session_state['edit_product_id'] = None
 
-# --- Helpers ---
-def format_to_brl(value):
-    """Formata um float para string no formato R$ 1.234,56."""
-    try:
-        # Troca ponto por X, vírgula por ponto, X por vírgula (solução para o float)
-        return f"R$ {float(value):_.2f}".replace('.', 'X').replace('_', '.').replace('X', ',')
-    except (ValueError, TypeError):
-        return "R$ N/A"
-
 # -------------------------------------------------------------------
 # FUNÇÃO DE CADASTRO DE PRODUTO
 # -------------------------------------------------------------------
@@ -45,6 +33,7 @@ def add_product_form():
     
     with st.form("add_product_form", clear_on_submit=True):
         nome = st.text_input("Nome do Produto", max_chars=150)
+        codigo_barras = st.text_input("Código de Barras / SKU (Opcional)", max_chars=64, key="add_input_codigo_barras")
         
         col1, col2 = st.columns([3, 1]) 
 
@@ -56,12 +45,17 @@ def add_product_form():
             tipo = st.selectbox("🏷️ Tipo", options=['Selecionar'] + TIPOS, key="add_input_tipo")
 
             preco = st.number_input("Preço (R$)", min_value=0.01, format="%.2f", step=1.0)
+            preco_custo = st.number_input("Preço de Custo (R$, opcional)", min_value=0.0, format="%.2f", step=1.0,
+                                          key="add_input_preco_custo")
             quantidade = st.number_input("Quantidade em Estoque", min_value=1, step=1, value=1)
+            estoque_minimo = st.number_input("Estoque Mínimo (alerta de reposição, 0 = sem alerta)", min_value=0, step=1, value=0,
+                                             key="add_input_estoque_minimo")
             
             data_validade = st.date_input("🗓️ Data de Validade (Opcional)", 
                                            value=None, 
                                            min_value=date.today(), 
                                            key="add_input_validade_lote")
+            lote = st.text_input("Código do Lote (Opcional)", max_chars=64, key="add_input_lote")
             
         with col2:
             st.markdown("##### Foto do Produto")
@@ -91,11 +85,15 @@ def add_product_form():
                 validade_iso = data_validade.isoformat() if data_validade else None
                 add_produto(
                     nome, preco, quantidade, marca, estilo, tipo, 
-                    photo_name, validade_iso
+                    photo_name, validade_iso, estoque_minimo, codigo_barras, lote, preco_custo,
+                    usuario=st.session_state.get('username')
                 )
                 st.success(f"Produto '{nome}' ({quantidade} unidades) adicionado com sucesso!")
                 st.rerun()
             except Exception as e:
+                # Não deixa a foto órfã em assets/ se o cadastro falhar
+                if photo_name:
+                    remove_product_photo(photo_name)
                 st.error(f"Erro ao adicionar produto no banco de dados: {e}")
 
 
@@ -129,8 +127,15 @@ def show_edit_form():
     with st.form(key=f"edit_product_form_{produto_id}", clear_on_submit=False):
         # Campos principais
         nome = st.text_input("Nome", value=produto.get("nome"))
+        codigo_barras = st.text_input("Código de Barras / SKU", value=produto.get("codigo_barras") or "", max_chars=64)
         preco = st.number_input("Preço (R$)", value=default_preco, format="%.2f", min_value=0.01)
-        quantidade = st.number_input("Quantidade em Estoque", value=default_quantidade, min_value=0, step=1)
+        preco_custo = st.number_input("Preço de Custo (R$)", value=float(produto.get("preco_custo") or 0.0),
+                                      format="%.2f", min_value=0.0)
+        quantidade = st.number_input("Quantidade em Estoque", value=default_quantidade, min_value=0, step=1,
+                                     help=f"Total de todos os locais; a diferença entra ou sai do local '{NOME_LOCAL_PRINCIPAL}' "
+                                          "(aumento = lote de ajuste com a validade abaixo; redução = lotes que vencem primeiro).")
+        estoque_minimo = st.number_input("Estoque Mínimo (alerta de reposição, 0 = sem alerta)",
+                                         value=int(produto.get("estoque_minimo") or 0), min_value=0, step=1)
         
         # Selectbox para atributos (usa index para preencher o valor atual)
         marca_index = MARCAS.index(produto.get("marca")) if produto.get("marca") in MARCAS else 0
@@ -143,6 +148,8 @@ def show_edit_form():
         
         data_validade = st.date_input("🗓️ Data de Validade (Opcional)", 
                                        value=default_validade, 
+                                       help="A validade do produto vem dos lotes (a que vence primeiro). "
+                                            "A data informada vale para o lote de ajuste criado ao aumentar a quantidade.",
                                        key="edit_validade")
                                        
         uploaded = st.file_uploader("Alterar Foto", type=["jpg","png","jpeg"])
@@ -159,13 +166,9 @@ def show_edit_form():
                 st.error("Nome, Preço (>0) e Quantidade (>=0) são obrigatórios.")
                 return
 
-            photo_name = produto.get("foto")
+            old_photo = produto.get("foto")
+            photo_name = old_photo
             if uploaded:
-                # Lógica para remover e salvar nova foto...
-                if photo_name and os.path.exists(os.path.join(ASSETS_DIR, photo_name)):
-                    try: os.remove(os.path.join(ASSETS_DIR, photo_name))
-                    except Exception: st.warning("Não foi possível remover a foto antiga.")
-                
                 try:
                     photo_name = f"{int(datetime.now().timestamp())}_{uploaded.name}"
                     with open(os.path.join(ASSETS_DIR, photo_name), "wb") as f:
@@ -176,22 +179,79 @@ def show_edit_form():
             
             try:
                 validade_iso = data_validade.isoformat() if data_validade else None
-                update_produto(produto_id, nome, preco, quantidade, marca, estilo, tipo, photo_name, validade_iso)
-                st.success(f"Produto '{nome}' atualizado com sucesso!")
-                st.session_state["edit_mode"] = False
-                st.session_state["edit_product_id"] = None
-                st.rerun()
+                update_produto(produto_id, nome, preco, quantidade, marca, estilo, tipo, photo_name, validade_iso, estoque_minimo,
+                               codigo_barras, preco_custo, usuario=st.session_state.get('username'))
             except Exception as e:
+                if photo_name != old_photo:
+                    remove_product_photo(photo_name)
                 st.error(f"Erro ao atualizar produto no banco de dados: {e}")
+                return
+
+            # A foto antiga só é apagada depois que o banco aponta para a nova (e se ninguém mais a usa)
+            if old_photo and photo_name != old_photo:
+                submit_job('remover_foto', remove_product_photo, old_photo, usuario=st.session_state.get('username'))
+
+            st.success(f"Produto '{nome}' atualizado com sucesso!")
+            st.session_state["edit_mode"] = False
+            st.session_state["edit_product_id"] = None
+            st.rerun()
                 
         if cancel:
             st.session_state["edit_mode"] = False
             st.session_state["edit_product_id"] = None
             st.rerun()
 
+    show_lotes(produto_id)
+    show_historico_precos(produto_id)
+
+def show_historico_precos(produto_id):
+    """Lista as últimas mudanças de preço e de custo do produto."""
+    historico = get_historico_precos(produto_id)
+    if not historico:
+        return
+    with st.expander("📈 Histórico de Preços"):
+        for h in historico:
+            st.write(f"- {format_date(h['em'], '%d/%m/%Y %H:%M')} (UTC) • Preço: {format_to_brl(h['preco_antigo'])} → "
+                     f"{format_to_brl(h['preco_novo'])} • Custo: {format_to_brl(h['custo_antigo'])} → {format_to_brl(h['custo_novo'])}")
+
+def show_lotes(produto_id):
+    """Lista os lotes do produto (ordem de saída) e permite registrar a entrada de um novo lote."""
+    st.markdown("---")
+    st.markdown("##### 📦 Lotes em Estoque (sai primeiro o que vence primeiro)")
+    lotes = get_lotes(produto_id)
+    if not lotes:
+        st.caption("Nenhum lote com estoque.")
+    for l in lotes:
+        validade = format_date(l.get('data_validade'))
+        st.write(f"- Lote **{l.get('lote') or 'sem código'}** • Validade: {validade} • Quantidade: {l.get('quantidade')}")
+
+    with st.form(key=f"add_lote_form_{produto_id}", clear_on_submit=True):
+        st.markdown("###### Repor Estoque (Novo Lote)")
+        col_qtd, col_val, col_lote = st.columns(3)
+        with col_qtd:
+            quantidade = st.number_input("Quantidade", min_value=1, step=1, value=1)
+        with col_val:
+            validade = st.date_input("Validade (Opcional)", value=None)
+        with col_lote:
+            codigo_lote = st.text_input("Código do Lote (Opcional)", max_chars=64)
+        if st.form_submit_button("Registrar Lote"):
+            try:
+                add_lote(produto_id, int(quantidade), validade.isoformat() if validade else None, codigo_lote,
+                         usuario=st.session_state.get('username'))
+                st.success(f"Lote com {quantidade} unidade(s) registrado.")
+                st.rerun()
+            except ValueError as e:
+                st.error(f"Erro: {e}")
+
 # -------------------------------------------------------------------
 # FUNÇÃO DE LISTAGEM, AÇÕES E DOWNLOADS
 # -------------------------------------------------------------------
+def _on_delta_baixado(novo_token):
+    """Callback do download incremental: o próximo token vira o ponto de partida da próxima exportação."""
+    st.session_state['ultimo_token_delta'] = novo_token or ''
+    st.session_state['delta_desde'] = novo_token or ''
+    st.session_state.pop('delta_export', None)
+
 def manage_products_list_actions():
     st.title("🛠️ Gerenciar Produtos e Relatórios")
     
@@ -209,38 +269,89 @@ def manage_products_list_actions():
             mime='text/csv',
             key='btn_download_csv'
         )
+        if st.button('⬇️ Gerar Planilha XLSX', key='btn_xlsx_gen'):
+            submit_job('exportar_xlsx', export_produtos_to_xlsx_bytes, usuario=st.session_state.get('username'), extensao='xlsx')
+            st.success('Geração da planilha enviada para segundo plano. O download aparece em "Tarefas em Segundo Plano".')
+        with st.expander('🔄 Exportação Incremental (loja virtual)'):
+            desde = st.text_input(
+                'Alterados desde (token da última sincronização)',
+                value=st.session_state.get('ultimo_token_delta', ''),
+                help='Vazio exporta o catálogo inteiro. Remoções saem com a coluna "removido" = 1.',
+                key='delta_desde'
+            )
+            # Só consulta o banco no clique: o corpo do expander roda a cada rerun, mesmo fechado
+            if st.button('🔄 Gerar CSV de Alterações', key='btn_delta_gen'):
+                st.session_state['delta_export'] = (desde, *export_produtos_delta_to_csv_content(desde.strip() or None))
+            delta = st.session_state.get('delta_export')
+            if delta and delta[0] == desde:
+                _, delta_content, novo_token = delta
+                st.caption(f"Próximo token: `{novo_token or '-'}`")
+                st.download_button(
+                    label='⬇️ Baixar CSV de Alterações',
+                    data=delta_content.encode('utf-8'),
+                    file_name=f'estoque_delta_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+                    mime='text/csv',
+                    key='btn_download_delta',
+                    disabled=not delta_content,
+                    on_click=_on_delta_baixado,
+                    args=(novo_token,)
+                )
 
     # 2. Importação CSV
     with col_b:
-        uploaded_csv = st.file_uploader('⬆️ Importar CSV (Adiciona Novos Produtos)', type=['csv'], key='import_csv')
+        uploaded_csv = st.file_uploader('⬆️ Importar CSV/XLSX (Adiciona Novos Produtos)', type=['csv', 'xlsx'], key='import_csv')
         if uploaded_csv is not None and st.button('Processar Importação', key='btn_import'):
-            try:
-                count = import_produtos_from_csv_buffer(uploaded_csv)
-                st.success(f'{count} produtos importados com sucesso! (Novos itens adicionados).')
-                st.rerun()
-            except Exception as e:
-                st.error('Erro ao importar CSV: ' + str(e))
+            # Copia os bytes: o arquivo enviado pode ser liberado antes da tarefa terminar
+            if uploaded_csv.name.lower().endswith('.xlsx'):
+                tipo_job, importar = 'importar_xlsx', import_produtos_from_xlsx_buffer
+            else:
+                tipo_job, importar = 'importar_csv', import_produtos_from_csv_buffer
+            arquivo = io.BytesIO(uploaded_csv.getvalue())
+            arquivo.name = uploaded_csv.name
+            # 'usuario' do submit_job identifica a tarefa; o da importação vai para a auditoria
+            submit_job(tipo_job, functools.partial(importar, usuario=st.session_state.get('username')), arquivo,
+                       usuario=st.session_state.get('username'))
+            st.success('Importação enviada para segundo plano. Acompanhe em "Tarefas em Segundo Plano".')
                 
     # 3. Gerar PDF
     with col_c:
         if st.button('⬇️ Gerar Relatório PDF (Estoque Ativo)', key='btn_pdf_gen'):
-            try:
-                pdf_bytes = generate_stock_pdf_bytes() 
-                st.download_button(
-                    label='Baixar PDF',
-                    data=pdf_bytes,
-                    file_name=f'relatorio_estoque_ativo_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
-                    mime='application/pdf',
-                    key='btn_download_pdf'
+            submit_job('relatorio_pdf', generate_stock_pdf_bytes, usuario=st.session_state.get('username'), extensao='pdf')
+            st.success('Geração do PDF enviada para segundo plano. O download aparece em "Tarefas em Segundo Plano".')
+        with st.expander('🏷️ Etiquetas de Preço'):
+            etq_marca = st.selectbox('Marca', ['Todas'] + MARCAS, key='etq_marca')
+            etq_tipo = st.selectbox('Tipo', ['Todos'] + TIPOS, key='etq_tipo')
+            em_estoque = [p for p in get_produtos_cache(local_id=st.session_state.get('local_id')) if p['quantidade'] > 0]
+            etq_ids = st.multiselect(
+                'Produtos (vazio = todos do filtro)',
+                [p['id'] for p in em_estoque],
+                format_func={p['id']: f"{p['nome']} (ID {p['id']})" for p in em_estoque}.get,
+                key='etq_ids'
+            )
+            etq_por_unidade = st.checkbox('Uma etiqueta por unidade em estoque', key='etq_por_unidade')
+            etq_copias = st.number_input('Cópias por produto', min_value=1, max_value=50, value=1, step=1,
+                                         key='etq_copias', disabled=etq_por_unidade)
+            if st.button('🏷️ Gerar Etiquetas (PDF)', key='btn_etiquetas_gen'):
+                # Filtros posicionais: 'tipo' já é o nome do parâmetro de submit_job
+                submit_job(
+                    'etiquetas_pdf', generate_labels_pdf_bytes,
+                    etq_ids or None,
+                    None if etq_marca == 'Todas' else etq_marca,
+                    None,
+                    None if etq_tipo == 'Todos' else etq_tipo,
+                    copias=etq_copias, por_unidade=etq_por_unidade,
+                    usuario=st.session_state.get('username'), extensao='pdf'
                 )
-                st.success('PDF gerado. Use o botão logo abaixo para baixar.')
-            except Exception as e:
-                st.error('Erro ao gerar PDF: ' + str(e))
+                st.success('Geração das etiquetas enviada para segundo plano. O download aparece em "Tarefas em Segundo Plano".')
+
+    show_jobs_panel()
     
     st.markdown("---")
     st.subheader("Visualizar / Ações (Edição/Remoção/Venda)")
     
-    produtos = get_all_produtos()
+    local_id = st.session_state.get('local_id')
+    produtos = get_produtos_cache(local_id=local_id)
+    watch_changes() # Recarrega a lista quando outra sessão altera o estoque
     if not produtos:
         st.info("Nenhum produto cadastrado no estoque.")
         return
@@ -267,20 +378,19 @@ def manage_products_list_actions():
             valor_total_produto_exibicao = "R$ N/A"
             
         # Formatação de Data de Validade
-        validade_exibicao = p.get('data_validade') or '-'
-        if validade_exibicao != '-':
-             try:
-                validade_exibicao = datetime.fromisoformat(validade_exibicao).strftime('%d/%m/%Y')
-             except (ValueError, TypeError):
-                pass
+        validade_exibicao = format_date(p.get('data_validade'))
         
         
         with st.container(border=True):
             cols = st.columns([3, 1, 1])
             with cols[0]:
                 st.markdown(f"### {p.get('nome')} <small style='color:gray'>ID: {produto_id}</small>", unsafe_allow_html=True)
+                if p.get('codigo_barras'):
+                    st.caption(f"Código de barras: {p.get('codigo_barras')}")
                 
                 st.write(f"**Preço Unitário:** {preco_exibicao} • **Quantidade em Estoque:** **{quantidade_int}**")
+                if p.get('quantidade_total', quantidade_int) != quantidade_int:
+                    st.caption(f"Total em todos os locais: {p['quantidade_total']}")
                 st.write(f"**VALOR TOTAL DESTE PRODUTO:** **{valor_total_produto_exibicao}**")
                 st.write(f"**Marca:** {p.get('marca')} • **Estilo:** {p.get('estilo')} • **Tipo:** {p.get('tipo')}")
                 st.write(f"**Validade:** {validade_exibicao}")
@@ -292,7 +402,8 @@ def manage_products_list_actions():
                     with col_venda:
                         if st.button("💰 Vender 1 Unidade", key=f'sell_{produto_id}'):
                             try:
-                                mark_produto_as_sold(produto_id, 1) 
+                                mark_produto_as_sold(produto_id, 1, local_id, usuario=st.session_state.get('username'),
+                                                     cliente_id=st.session_state.get('cliente_id'))
                                 st.success(f"1 unidade de '{p.get('nome')}' foi vendida.")
                                 st.rerun()
                             except ValueError as e: # Captura a exceção de estoque insuficiente
@@ -302,6 +413,10 @@ def manage_products_list_actions():
                 else:
                     st.info("Produto fora de estoque.")
 
+                estoque_minimo = int(p.get('estoque_minimo') or 0)
+                if estoque_minimo > 0 and quantidade_int <= estoque_minimo:
+                    st.warning(f"⚠️ Estoque baixo: mínimo definido é {estoque_minimo} unidade(s).")
+
             with cols[1]:
                 # Exibição da foto
                 photo_path = os.path.join(ASSETS_DIR, p.get('foto')) if p.get('foto') else None
@@ -311,17 +426,19 @@ def manage_products_list_actions():
                     st.info('Sem foto')
                     
             with cols[2]:
-                role = st.session_state.get('role','staff')
                 if st.button('✏️ Editar', key=f'mod_{produto_id}'):
                     st.session_state['edit_product_id'] = produto_id
                     st.session_state['edit_mode'] = True
                     st.rerun() 
 
                 # Apenas admin pode remover
-                if role == 'admin':
+                if is_admin():
                     if st.button('🗑️ Remover', key=f'rem_{produto_id}'):
                         try:
-                            delete_produto(produto_id)
+                            foto = delete_produto(produto_id, remove_foto=False, usuario=st.session_state.get('username'))
+                            if foto:
+                                submit_job('remover_foto', remove_product_photo, foto,
+                                           usuario=st.session_state.get('username'))
                             st.warning(f"Produto '{p.get('nome')}' removido.")
                             st.rerun()
                         except Exception as e:
@@ -333,15 +450,300 @@ def manage_products_list_actions():
     st.markdown(f"## 💰 **Valor Total do Estoque: {format_to_brl(total_valor_estoque)}**")
 
 
+# -------------------------------------------------------------------
+# PAINEL DE TAREFAS EM SEGUNDO PLANO
+# -------------------------------------------------------------------
+JOB_LABELS = {
+    'importar_csv': 'Importação CSV',
+    'relatorio_pdf': 'Relatório PDF',
+    'importar_xlsx': 'Importação XLSX',
+    'exportar_xlsx': 'Planilha XLSX',
+    'remover_foto': 'Remoção de foto',
+    'etiquetas_pdf': 'Etiquetas PDF',
+    'publicar_catalogo': 'Catálogo público',
+}
+
+# Arquivos gerados pelas tarefas: extensão -> (rótulo, prefixo do nome, MIME)
+JOB_DOWNLOADS = {
+    'pdf': ('Baixar PDF', 'relatorio_estoque_ativo', 'application/pdf'),
+    'xlsx': ('Baixar XLSX', 'estoque_export', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+# Prefixo do nome do arquivo quando o tipo da tarefa não usa o padrão da extensão
+JOB_PREFIXOS = {
+    'etiquetas_pdf': 'etiquetas',
+}
+
+@st.fragment(run_every=2)
+def show_jobs_panel():
+    """Lista as tarefas do usuário; o fragmento se atualiza sozinho sem recarregar a página."""
+    jobs = list_jobs(usuario=st.session_state.get('username'), limit=5)
+    if not jobs:
+        return
+
+    with st.expander("⏳ Tarefas em Segundo Plano", expanded=any(j['status'] in ('pendente', 'executando') for j in jobs)):
+        for job in jobs:
+            label = JOB_LABELS.get(job['tipo'], job['tipo'])
+            col_info, col_acao = st.columns([3, 1])
+            with col_info:
+                st.write(f"**#{job['id']} {label}** • {job['status']}")
+                if job['status'] in ('pendente', 'executando'):
+                    st.progress(float(job['progresso'] or 0.0))
+                elif job['status'] == 'concluido' and job['tipo'] in ('importar_csv', 'importar_xlsx'):
+                    st.caption(f"{job.get('resultado')} produtos importados.")
+                elif job.get('mensagem'):
+                    st.caption(job['mensagem'])
+            with col_acao:
+                if job['status'] in ('pendente', 'executando'):
+                    if st.button('Cancelar', key=f"cancel_job_{job['id']}"):
+                        cancel_job(job['id'])
+                elif job['status'] == 'concluido' and job.get('arquivo'):
+                    extensao = job['arquivo'].rsplit('.', 1)[-1]
+                    arquivo_bytes = get_job_file(job)
+                    if arquivo_bytes and extensao in JOB_DOWNLOADS:
+                        rotulo, prefixo, mime = JOB_DOWNLOADS[extensao]
+                        prefixo = JOB_PREFIXOS.get(job['tipo'], prefixo)
+                        st.download_button(
+                            label=rotulo,
+                            data=arquivo_bytes,
+                            file_name=f'{prefixo}_{job["id"]}.{extensao}',
+                            mime=mime,
+                            key=f"btn_download_job_{job['id']}"
+                        )
+
+
+# -------------------------------------------------------------------
+# MODO SCANNER (VENDA POR CÓDIGO DE BARRAS)
+# -------------------------------------------------------------------
+def _on_scan():
+    """Callback do campo de leitura: vende 1 unidade e limpa o campo para o próximo código."""
+    codigo = st.session_state.get('scan_input', '').strip()
+    st.session_state['scan_input'] = ''
+    if not codigo:
+        return
+
+    historico = st.session_state.setdefault('scan_historico', [])
+    try:
+        produto = sell_produto_by_codigo(codigo, 1, st.session_state.get('local_id'), usuario=st.session_state.get('username'),
+                                         cliente_id=st.session_state.get('cliente_id'))
+        historico.insert(0, ('ok', f"✅ {produto['nome']} • {format_to_brl(produto['preco'])} • Restam {produto['quantidade']}"))
+    except ValueError as e:
+        produto = get_produto_by_codigo(codigo)
+        nome = f" ({produto['nome']})" if produto else ""
+        historico.insert(0, ('erro', f"❌ {codigo}{nome}: {e}"))
+    del historico[20:]
+
+def show_scan_mode():
+    st.subheader("📷 Modo Scanner (Venda por Código de Barras)")
+    st.caption("Clique no campo e leia os códigos com o leitor. Cada leitura vende 1 unidade.")
+
+    st.text_input("Código de barras / SKU", key='scan_input', on_change=_on_scan)
+
+    for status, mensagem in st.session_state.get('scan_historico', []):
+        if status == 'ok':
+            st.success(mensagem)
+        else:
+            st.error(mensagem)
+
+
+# -------------------------------------------------------------------
+# TRANSFERÊNCIAS ENTRE LOCAIS
+# -------------------------------------------------------------------
+def show_transfers():
+    st.subheader("🚚 Transferências entre Locais")
+    st.caption("Move unidades entre a loja, o quiosque e a venda porta a porta. O total do produto não muda.")
+
+    locais = get_locais()
+    if is_admin():
+        with st.expander("📍 Locais de Estoque"):
+            for l in get_locais(include_inactive=True):
+                col_nome, col_acao = st.columns([3, 1])
+                with col_nome:
+                    st.write(f"**{l['nome']}** • {l['unidades']} un.{'' if l['ativo'] else ' • inativo'}")
+                with col_acao:
+                    if l['id'] != LOCAL_PRINCIPAL and st.button("Desativar" if l['ativo'] else "Ativar", key=f"local_ativo_{l['id']}"):
+                        try:
+                            set_local_ativo(l['id'], not l['ativo'], usuario=st.session_state.get('username'))
+                            st.rerun()
+                        except ValueError as e:
+                            st.error(str(e))
+            with st.form("add_local_form", clear_on_submit=True):
+                nome_local = st.text_input("Novo local")
+                if st.form_submit_button("Adicionar Local"):
+                    try:
+                        add_local(nome_local, usuario=st.session_state.get('username'))
+                        st.rerun()
+                    except ValueError as e:
+                        st.error(str(e))
+
+    if len(locais) < 2:
+        st.info("Cadastre outro local de estoque para fazer transferências.")
+        return
+
+    produtos = [p for p in get_produtos_cache() if p['quantidade'] > 0]
+    if not produtos:
+        st.info("Nenhum produto com estoque.")
+        return
+    nomes_produtos = {p['id']: f"{p['nome']} (ID {p['id']})" for p in produtos}
+    nomes_locais = {l['id']: l['nome'] for l in locais}
+
+    produto_id = st.selectbox("Produto", list(nomes_produtos), format_func=nomes_produtos.get, key="transf_produto")
+    estoque = {e['local_id']: e['quantidade'] for e in get_estoque_por_local(produto_id)}
+    st.write(" • ".join(f"**{nomes_locais[i]}:** {estoque.get(i, 0)}" for i in nomes_locais))
+
+    with st.form("transfer_form"):
+        col_origem, col_destino, col_qtd = st.columns(3)
+        with col_origem:
+            origem = st.selectbox("De", list(nomes_locais), format_func=nomes_locais.get)
+        with col_destino:
+            destino = st.selectbox("Para", list(nomes_locais), index=1, format_func=nomes_locais.get)
+        with col_qtd:
+            quantidade = st.number_input("Quantidade", min_value=1, step=1, value=1)
+        if st.form_submit_button("Transferir"):
+            try:
+                transfer_estoque(produto_id, origem, destino, quantidade, usuario=st.session_state.get('username'))
+                st.success(f"{quantidade} unidade(s) transferida(s) de {nomes_locais[origem]} para {nomes_locais[destino]}.")
+                st.rerun()
+            except ValueError as e:
+                st.error(str(e))
+
+    st.markdown("---")
+    st.write("**Últimas transferências**")
+    for t in get_transferencias():
+        st.write(
+            f"- {format_date(t['em'], '%d/%m/%Y %H:%M')} • **{t.get('produto') or t['produto_id']}** • "
+            f"{t['quantidade']} un. • {t.get('origem')} → {t.get('destino')} • {t.get('usuario') or '-'}"
+        )
+
+
+# -------------------------------------------------------------------
+# CLIENTES (CADASTRO E HISTÓRICO DE COMPRAS)
+# -------------------------------------------------------------------
+def show_clientes():
+    st.subheader("👥 Clientes")
+    st.caption("Cadastro dos clientes e histórico de compras. Escolha o cliente na barra lateral ao vender.")
+
+    with st.expander("➕ Novo Cliente"):
+        with st.form("add_cliente_form", clear_on_submit=True):
+            nome = st.text_input("Nome")
+            telefone = st.text_input("Telefone", placeholder="(11) 91234-5678")
+            observacoes = st.text_area("Observações")
+            if st.form_submit_button("Cadastrar Cliente"):
+                try:
+                    st.session_state['cliente_aberto'] = add_cliente(nome, telefone, observacoes,
+                                                                     usuario=st.session_state.get('username'))
+                    st.success(f"Cliente '{nome}' cadastrado.")
+                except ValueError as e:
+                    st.error(str(e))
+
+    termo = st.text_input("Buscar por nome ou telefone", key="busca_cliente",
+                          help="Vazio: clientes que mais compraram.")
+    clientes = buscar_clientes(termo)
+    if not clientes:
+        st.info("Nenhum cliente encontrado.")
+        return
+    nomes = {c['id']: f"{format_cliente(c)} • {format_to_brl(c['total_gasto'])}" for c in clientes}
+    ids = list(nomes)
+    aberto = st.session_state.get('cliente_aberto')
+    cliente_id = st.selectbox("Cliente", ids, index=ids.index(aberto) if aberto in nomes else 0, format_func=nomes.get)
+    cliente = get_cliente(cliente_id)
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Total gasto", format_to_brl(cliente['total_gasto']))
+    c2.metric("Compras", cliente['num_compras'])
+    c3.metric("Ticket médio", format_to_brl(cliente['total_gasto'] / cliente['num_compras'] if cliente['num_compras'] else 0))
+    c4.metric("Última compra", format_date(cliente['ultima_compra']))
+    if cliente.get('observacoes'):
+        st.info(cliente['observacoes'])
+
+    with st.expander("✏️ Editar Cadastro"):
+        with st.form(f"edit_cliente_{cliente_id}"):
+            nome = st.text_input("Nome", value=cliente['nome'])
+            telefone = st.text_input("Telefone", value=cliente.get('telefone') or "")
+            observacoes = st.text_area("Observações", value=cliente.get('observacoes') or "")
+            if st.form_submit_button("Salvar Cliente"):
+                try:
+                    update_cliente(cliente_id, nome, telefone, observacoes, usuario=st.session_state.get('username'))
+                    st.rerun()
+                except ValueError as e:
+                    st.error(str(e))
+
+    # Histórico paginado por chave; "Carregar mais" busca a próxima página pelo índice (cliente_id, id)
+    if st.session_state.get('compras_cliente_id') != cliente_id:
+        st.session_state['compras_cliente_id'] = cliente_id
+        st.session_state['compras_paginas'] = 1
+    compras = []
+    for _ in range(st.session_state['compras_paginas']):
+        pagina = get_compras_cliente(cliente_id, limit=20, before=compras[-1]['id'] if compras else None)
+        compras.extend(pagina)
+        if len(pagina) < 20:
+            break
+
+    st.write("**Histórico de compras**")
+    if not compras:
+        st.info("Nenhuma compra registrada para este cliente.")
+        return
+    for v in compras:
+        st.write(
+            f"- {format_date(v['data_venda'], '%d/%m/%Y %H:%M')} • **{v.get('nome') or v['produto_id']}** • "
+            f"{v['quantidade']} un. • {format_to_brl(v['total'])}"
+        )
+    if len(compras) == st.session_state['compras_paginas'] * 20 and st.button("Carregar mais", key="compras_mais"):
+        st.session_state['compras_paginas'] += 1
+        st.rerun()
+
+
+# -------------------------------------------------------------------
+# FUNÇÃO DE REPOSIÇÃO (ESTOQUE ABAIXO DO MÍNIMO)
+# -------------------------------------------------------------------
+def show_reorder_list():
+    st.subheader("📉 Reposição de Estoque")
+    st.caption("Produtos com quantidade igual ou abaixo do estoque mínimo definido no cadastro.")
+
+    produtos = get_produtos_para_repor()
+    if not produtos:
+        st.success("Nenhum produto abaixo do estoque mínimo.")
+        return
+
+    st.warning(f"{len(produtos)} produto(s) precisam de reposição.")
+    st.download_button(
+        label='⬇️ Baixar Lista de Reposição (CSV)',
+        data=export_reposicao_to_csv_content(produtos).encode('utf-8'),
+        file_name=f'reposicao_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+        mime='text/csv',
+        key='btn_download_reposicao'
+    )
+
+    for p in produtos:
+        st.write(
+            f"- **{p.get('nome')}** (ID: {p.get('id')}) • {p.get('marca')} • "
+            f"Estoque: **{p.get('quantidade')}** / Mínimo: {p.get('estoque_minimo')} • Faltam: {p.get('faltam')}"
+        )
+
+
 # --- FLUXO PRINCIPAL DA PÁGINA ---
 
 if st.session_state.get('edit_mode'):
     show_edit_form()
 else:
     # Opções na barra lateral para navegação entre as ações principais
-    action = st.sidebar.selectbox("Ações de Gerenciamento", ["Visualizar / Ações", "Adicionar Produto"])
+    action = st.sidebar.selectbox(
+        "Ações de Gerenciamento",
+        ["Visualizar / Ações", "Adicionar Produto", "Modo Scanner", "Transferências", "Clientes", "Reposição"]
+    )
+    select_local() # Local das vendas e da listagem (só aparece com mais de um local)
+    if action in ("Visualizar / Ações", "Modo Scanner"):
+        select_cliente() # Cliente das vendas (opcional)
     
     if action == "Adicionar Produto":
         add_product_form()
+    elif action == "Modo Scanner":
+        show_scan_mode()
+    elif action == "Transferências":
+        show_transfers()
+    elif action == "Clientes":
+        show_clientes()
+    elif action == "Reposição":
+        show_reorder_list()
     else:
         manage_products_list_actions()
@@ -0,0 +1,100 @@
+import streamlit as st
+import pandas as pd
+from utils.database import (
+    MARCAS, ESTILOS, TIPOS, TIPOS_ALTERACAO_MASSA, NOME_LOCAL_PRINCIPAL,
+    preview_bulk_update, apply_bulk_update, undo_bulk_update, get_bulk_updates
+)
+from utils.pagina import setup_page, format_to_brl
+
+setup_page(
+    "Operações em Massa", layout="wide", role="admin",
+    mensagem="🔒 **Acesso Restrito.** Apenas administradores podem alterar produtos em massa."
+)
+
+st.title("🧮 Operações em Massa")
+st.caption("Reajuste de preço ou ajuste de estoque de todos os produtos de uma marca, estilo e/ou tipo.")
+
+TODAS = "Todas"
+
+# --- Filtros ---
+col_marca, col_estilo, col_tipo = st.columns(3)
+with col_marca:
+    marca = st.selectbox("Marca", [TODAS] + MARCAS)
+with col_estilo:
+    estilo = st.selectbox("Estilo", [TODAS] + ESTILOS)
+with col_tipo:
+    tipo = st.selectbox("Tipo", [TODAS] + TIPOS)
+
+filtros = {
+    "marca": None if marca == TODAS else marca,
+    "estilo": None if estilo == TODAS else estilo,
+    "tipo": None if tipo == TODAS else tipo,
+}
+
+# --- Operação ---
+col_op, col_valor = st.columns(2)
+with col_op:
+    tipo_alteracao = st.radio(
+        "Operação", list(TIPOS_ALTERACAO_MASSA), format_func=TIPOS_ALTERACAO_MASSA.get, horizontal=True
+    )
+with col_valor:
+    if tipo_alteracao == "preco_percentual":
+        valor = st.number_input("Reajuste (%)", value=0.0, step=1.0, format="%.2f", help="Use valores negativos para desconto.")
+    elif tipo_alteracao == "preco_absoluto":
+        valor = st.number_input("Acréscimo (R$)", value=0.0, step=0.50, format="%.2f", help="Use valores negativos para reduzir.")
+    else:
+        valor = st.number_input("Unidades (+/-)", value=0, step=1,
+                                help=f"Use valores negativos para baixar o estoque (só sai o que está no local '{NOME_LOCAL_PRINCIPAL}').")
+
+# --- Pré-visualização ---
+total, amostra = preview_bulk_update(tipo_alteracao, valor, **filtros)
+st.info(f"**{total}** produto(s) serão alterados.")
+
+if amostra:
+    df_amostra = pd.DataFrame(amostra)
+    if tipo_alteracao == "estoque":
+        df_amostra = df_amostra[["nome", "quantidade_antiga", "quantidade_nova"]]
+        df_amostra.columns = ["Produto", "Qtd. Atual", "Qtd. Nova"]
+    else:
+        df_amostra = df_amostra[["nome", "preco_antigo", "preco_novo"]]
+        df_amostra["preco_antigo"] = df_amostra["preco_antigo"].map(format_to_brl)
+        df_amostra["preco_novo"] = df_amostra["preco_novo"].map(format_to_brl)
+        df_amostra.columns = ["Produto", "Preço Atual", "Preço Novo"]
+    st.caption(f"Amostra ({len(amostra)} de {total}):")
+    st.dataframe(df_amostra, hide_index=True)
+
+confirmar = st.checkbox(f"Confirmo a alteração de {total} produto(s).", disabled=total == 0 or not valor)
+if st.button("Aplicar Alteração", type="primary", disabled=not confirmar):
+    try:
+        alteracao_id, afetados = apply_bulk_update(tipo_alteracao, valor, usuario=st.session_state.get("username"), **filtros)
+        st.success(f"Alteração #{alteracao_id} aplicada a {afetados} produto(s).")
+    except ValueError as e:
+        st.error(f"Erro ao aplicar a alteração: {e}")
+
+st.markdown("---")
+
+# --- Histórico e Desfazer ---
+st.subheader("🕘 Histórico")
+alteracoes = get_bulk_updates()
+if not alteracoes:
+    st.info("Nenhuma operação em massa registrada.")
+
+for a in alteracoes:
+    filtros_texto = ", ".join(f"{k}: {v}" for k, v in a['filtros'].items() if v) or "todos os produtos"
+    unidade = "%" if a['tipo'] == "preco_percentual" else ("un." if a['tipo'] == "estoque" else "R$")
+    col_info, col_acao = st.columns([4, 1])
+    with col_info:
+        st.markdown(
+            f"**#{a['id']}** • {TIPOS_ALTERACAO_MASSA.get(a['tipo'], a['tipo'])} {a['valor']:+g} {unidade} • "
+            f"{filtros_texto} • {a['total_produtos']} produto(s) • {a.get('usuario') or '-'} • {a['criado_em'][:16].replace('T', ' ')}"
+        )
+    with col_acao:
+        if a.get('desfeita_em'):
+            st.caption(f"Desfeita em {a['desfeita_em'][:16].replace('T', ' ')}")
+        elif st.button("Desfazer", key=f"desfazer_{a['id']}"):
+            try:
+                restaurados = undo_bulk_update(a['id'], usuario=st.session_state.get("username"))
+                st.success(f"{restaurados} produto(s) restaurado(s).")
+                st.rerun()
+            except ValueError as e:
+                st.error(str(e))
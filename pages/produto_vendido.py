@@ -1,44 +1,19 @@
 import streamlit as st
-from utils.database import get_all_produtos, ASSETS_DIR # Mantendo a importação do ASSETS_DIR
+from utils.database import get_vendas_page, ASSETS_DIR # Mantendo a importação do ASSETS_DIR
+from utils.atualizacao import get_produtos_cache, watch_changes
+from utils.pagina import setup_page, format_to_brl
 import os
 from datetime import datetime
 
-# --- Funções Auxiliares de Formatação ---
-def format_to_brl(value):
-    """Formata um float para string no formato R$ 1.234.567,89."""
-    try:
-        # 1. Converte para float (se já não for)
-        num = float(value)
-        # 2. Formata com underscore (_) como separador de milhar e ponto (.) como decimal
-        formatted = f"{num:_.2f}" 
-        # 3. Substitui o ponto (decimal) por vírgula (,)
-        formatted = formatted.replace('.', ',') 
-        # 4. Substitui o underscore (milhar) por ponto (.) e adiciona o prefixo R$
-        return "R$ " + formatted.replace('_', '.') 
-    except (ValueError, TypeError):
-        return "R$ N/A"
-
-def load_css(file_name):
-    """Carrega e aplica o CSS personalizado, forçando a codificação UTF-8."""
-    if not os.path.exists(file_name):
-        # Apenas um aviso, pois o arquivo pode estar em outro lugar
-        return
-    try:
-        with open(file_name, encoding='utf-8') as f: 
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
-    except Exception as e:
-        st.error(f"Erro ao carregar CSS: {e}")
-        
-load_css("style.css")
-
-st.set_page_config(page_title="Produtos Vendidos - Cores e Fragrâncias")
+setup_page("Produtos Vendidos")
 
 st.title("💰 Produtos Vendidos")
 st.markdown("---")
 st.info("Abaixo estão os produtos que foram marcados como vendidos e não possuem mais estoque (quantidade = 0).")
 
-# 🔄 CHAMADA CRÍTICA: Obter dados mais recentes
-todos_produtos = get_all_produtos(include_sold=True) # Inclui todos os dados para análise
+# 🔄 Dados da sessão: só os produtos alterados desde a última leitura são buscados no banco
+todos_produtos = get_produtos_cache(include_sold=True) # Inclui todos os dados para análise
+watch_changes() # Recarrega a página quando outra sessão altera o estoque
 
 # Filtra produtos que foram vendidos (vendido = 1) E que estão fora de estoque (quantidade = 0)
 # NOTA: Este filtro pode não refletir o histórico total de vendas, apenas itens ZERADOS.
@@ -88,3 +63,40 @@ else:
 
     # Exibição do Valor Total Vendido (fora de estoque)
     st.success(f"📊 Valor Total Vendido (fora de estoque): **{format_to_brl(total_vendido)}**")
+
+# --- Histórico de Vendas (paginação por chave) ---
+st.markdown("---")
+st.subheader("🧾 Histórico de Vendas")
+
+VENDAS_POR_PAGINA = 20
+
+# Pilha de cursores: o topo é o 'before' da página atual (None = primeira página)
+if "vendas_cursores" not in st.session_state:
+    st.session_state["vendas_cursores"] = [None]
+
+cursores = st.session_state["vendas_cursores"]
+vendas = get_vendas_page(VENDAS_POR_PAGINA, before=cursores[-1])
+
+if not vendas:
+    st.info("Nenhuma venda registrada.")
+else:
+    for v in vendas:
+        try:
+            data_venda = datetime.fromisoformat(v['data_venda']).strftime('%d/%m/%Y %H:%M')
+        except (ValueError, TypeError):
+            data_venda = 'N/A'
+        nome = v.get('nome') or f"Produto removido (ID {v.get('produto_id')})"
+        st.write(f"- {data_venda} • **{nome}** • {v.get('quantidade')} un. × {format_to_brl(v.get('preco_unitario'))}")
+
+    col_anterior, col_pagina, col_proxima = st.columns([1, 1, 1])
+    with col_anterior:
+        if len(cursores) > 1 and st.button("⬅️ Mais recentes"):
+            cursores.pop()
+            st.rerun()
+    with col_pagina:
+        st.caption(f"Página {len(cursores)}")
+    with col_proxima:
+        if len(vendas) == VENDAS_POR_PAGINA and st.button("Mais antigas ➡️"):
+            ultima = vendas[-1]
+            cursores.append((ultima['data_venda'], ultima['id']))
+            st.rerun()
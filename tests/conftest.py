@@ -0,0 +1,51 @@
+# ====================================================================
+# ARQUIVO: tests/conftest.py
+# Cada teste roda contra um banco SQLite novo em um diretório temporário
+# (database.DATABASE aponta para ele enquanto o teste roda). O import de
+# utils.database já cria/migra data/estoque.db no diretório atual, então os
+# testes importam a partir de um diretório temporário, como utils/carga.py.
+# Uso: python -m pytest -q
+# ====================================================================
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+_DIRETORIO = tempfile.TemporaryDirectory(prefix="estoque_testes_")
+os.chdir(_DIRETORIO.name)  # data/, assets/ e o banco do import ficam aqui, nunca no banco real
+
+from utils import database  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def banco(tmp_path, monkeypatch):
+    """Banco vazio (tabelas, índices e triggers criados) só para o teste."""
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "estoque.db"))
+    database._cache_relatorios.clear()
+    database.create_tables()
+    yield database
+    database.flush_audit()  # Antes de voltar ao banco real: o buffer é do processo
+    database._cache_relatorios.clear()
+
+
+@pytest.fixture
+def novo_produto():
+    """Cria produtos de teste: novo_produto(quantidade, validade, **campos) -> ID."""
+    contador = iter(range(1, 10_000))
+
+    def _criar(quantidade=10, data_validade=None, **campos):
+        n = next(contador)
+        dados = {"nome": f"Produto {n:03d}", "preco": 10.0, "marca": "Natura", "estilo": "Perfumaria",
+                 "tipo": "Colônias", "preco_custo": 4.0}
+        dados.update(campos)
+        return database.add_produto(
+            dados.pop("nome"), dados.pop("preco"), quantidade, dados.pop("marca"), dados.pop("estilo"),
+            dados.pop("tipo"), data_validade=data_validade, **dados
+        )
+    return _criar
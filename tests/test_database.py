@@ -0,0 +1,259 @@
+# ====================================================================
+# ARQUIVO: tests/test_database.py
+# Invariantes do banco: lotes x total do produto, desfazer das operações
+# em massa, resumos de vendas x 'vendas', locais de estoque, clientes,
+# paginação por chave e tokens da exportação incremental.
+# ====================================================================
+
+import io
+
+import pytest
+
+from utils import database as db
+
+
+def _consultar(sql, params=()):
+    conn = db.get_db_connection()
+    linhas = [dict(row) for row in conn.execute(sql, params).fetchall()]
+    conn.close()
+    return linhas
+
+
+def _lotes_divergentes():
+    """Produtos cujo total difere da soma dos lotes (deve ser sempre vazio)."""
+    return _consultar(
+        """
+        SELECT p.id, p.quantidade, COALESCE(SUM(l.quantidade), 0) AS soma_lotes
+        FROM produtos p LEFT JOIN lotes l ON l.produto_id = p.id
+        GROUP BY p.id HAVING p.quantidade <> soma_lotes
+        """
+    )
+
+
+def _lotes(pid):
+    return [(l["quantidade"], l["data_validade"]) for l in db.get_lotes(pid, include_empty=True)]
+
+
+def _estado_estoque():
+    return (_consultar("SELECT id, quantidade, data_validade FROM produtos ORDER BY id"),
+            _consultar("SELECT id, produto_id, quantidade, data_validade FROM lotes WHERE quantidade > 0 ORDER BY id"))
+
+
+# ====================================================================
+# LOTES
+# ====================================================================
+
+def test_venda_consome_lotes_fefo(novo_produto):
+    pid = novo_produto(5, "2027-01-01")
+    db.add_lote(pid, 3, "2026-12-01")
+
+    db.mark_produto_as_sold(pid, 4)
+
+    assert _lotes(pid) == [(0, "2026-12-01"), (4, "2027-01-01")]
+    assert db.get_produto_by_id(pid)["data_validade"] == "2027-01-01"
+    assert _lotes_divergentes() == []
+
+
+def test_edicao_de_quantidade_passa_pelos_lotes(novo_produto):
+    pid = novo_produto(5, "2026-12-01")
+    db.add_lote(pid, 10, "2027-01-01")
+    p = db.get_produto_by_id(pid)
+
+    db.update_produto(pid, p["nome"], p["preco"], 9, p["marca"], p["estilo"], p["tipo"], p["foto"], "2030-01-01")
+    assert _lotes(pid) == [(0, "2026-12-01"), (9, "2027-01-01")]
+
+    db.update_produto(pid, p["nome"], p["preco"], 12, p["marca"], p["estilo"], p["tipo"], p["foto"], "2026-06-01")
+    assert sorted(_lotes(pid)) == [(0, "2026-12-01"), (3, "2026-06-01"), (9, "2027-01-01")]
+    assert _lotes_divergentes() == []
+
+
+def test_edicao_nao_sobrescreve_validade_dos_lotes(novo_produto):
+    pid = novo_produto(5, "2026-12-01")
+    db.add_lote(pid, 10, "2027-01-01")
+    p = db.get_produto_by_id(pid)
+
+    db.update_produto(pid, p["nome"], p["preco"], p["quantidade"], p["marca"], p["estilo"], p["tipo"], p["foto"],
+                      "2030-01-01")
+
+    assert db.get_produto_by_id(pid)["data_validade"] == "2026-12-01"
+
+
+def test_codigo_de_barras_repetido_na_edicao(novo_produto):
+    novo_produto(1, codigo_barras="7891000000001")
+    pid = novo_produto(1)
+    p = db.get_produto_by_id(pid)
+
+    with pytest.raises(ValueError, match="já cadastrado"):
+        db.update_produto(pid, p["nome"], p["preco"], 1, p["marca"], p["estilo"], p["tipo"], p["foto"], None,
+                          codigo_barras="7891000000001")
+
+
+def test_importacao_cria_um_lote_por_produto():
+    csv = ("nome;preco;quantidade;marca;estilo;tipo;data_validade;codigo_barras\n"
+           "Importado A;10;5;Natura;Perfumaria;Colônias;2027-01-01;111\n"
+           "Importado B;20;0;Avon;Perfumaria;Colônias;;222\n"
+           "Repetido;30;7;Avon;Perfumaria;Colônias;;111\n")
+
+    inseridos = db.import_produtos_from_csv_buffer(io.BytesIO(csv.encode("utf-8")))
+
+    assert inseridos == 2
+    assert _consultar("SELECT COUNT(*) AS n FROM lotes")[0]["n"] == 1
+    assert _lotes_divergentes() == []
+
+
+# ====================================================================
+# OPERAÇÕES EM MASSA
+# ====================================================================
+
+def test_desfazer_reducao_devolve_aos_mesmos_lotes(novo_produto):
+    pid = novo_produto(5, "2026-12-01", marca="Jequiti")
+    db.add_lote(pid, 10, "2027-01-01")
+    novo_produto(8, marca="Avon")  # Fora do filtro
+    antes = _estado_estoque()
+
+    alteracao_id, total = db.apply_bulk_update("estoque", -7, marca="Jequiti")
+    assert total == 1
+    assert _lotes(pid) == [(0, "2026-12-01"), (8, "2027-01-01")]
+
+    assert db.undo_bulk_update(alteracao_id) == 1
+    assert _estado_estoque() == antes
+    assert _lotes_divergentes() == []
+
+
+def test_desfazer_entrada_retira_do_lote_de_ajuste(novo_produto):
+    pid = novo_produto(5, "2026-12-01", marca="Jequiti")
+    antes = _estado_estoque()
+
+    alteracao_id, _ = db.apply_bulk_update("estoque", 4, marca="Jequiti")
+    assert db.get_produto_by_id(pid)["quantidade"] == 9
+
+    db.undo_bulk_update(alteracao_id)
+    assert _estado_estoque() == antes
+    with pytest.raises(ValueError):
+        db.undo_bulk_update(alteracao_id)
+
+
+def test_desfazer_preserva_vendas_feitas_depois(novo_produto):
+    pid = novo_produto(10, "2026-12-01", marca="Jequiti")
+    alteracao_id, _ = db.apply_bulk_update("estoque", 5, marca="Jequiti")
+    db.mark_produto_as_sold(pid, 3)
+
+    db.undo_bulk_update(alteracao_id)
+
+    assert db.get_produto_by_id(pid)["quantidade"] == 7
+    assert _lotes_divergentes() == []
+
+
+def test_desfazer_preco_so_volta_se_nao_mudou_depois(novo_produto):
+    a = novo_produto(1, preco=10.0, marca="Jequiti")
+    b = novo_produto(1, preco=20.0, marca="Jequiti")
+    alteracao_id, _ = db.apply_bulk_update("preco_percentual", 10, marca="Jequiti")
+    p = db.get_produto_by_id(b)
+    db.update_produto(b, p["nome"], 99.0, p["quantidade"], p["marca"], p["estilo"], p["tipo"], p["foto"], None)
+
+    assert db.undo_bulk_update(alteracao_id) == 1
+    assert db.get_produto_by_id(a)["preco"] == pytest.approx(10.0)
+    assert db.get_produto_by_id(b)["preco"] == pytest.approx(99.0)
+
+
+def test_reducao_em_massa_respeita_o_local_principal(novo_produto):
+    pid = novo_produto(5, marca="Jequiti")
+    quiosque = db.add_local("Quiosque")
+    db.transfer_estoque(pid, db.LOCAL_PRINCIPAL, quiosque, 4)
+
+    alteracao_id, _ = db.apply_bulk_update("estoque", -3, marca="Jequiti")
+
+    por_local = {e["local_id"]: e["quantidade"] for e in db.get_estoque_por_local(pid)}
+    assert por_local == {db.LOCAL_PRINCIPAL: 0, quiosque: 4}
+    assert db.get_produto_by_id(pid)["quantidade"] == 4
+    db.undo_bulk_update(alteracao_id)
+    assert db.get_produto_by_id(pid)["quantidade"] == 5
+
+
+# ====================================================================
+# VENDAS E RESUMOS
+# ====================================================================
+
+def test_resumos_batem_com_vendas(novo_produto):
+    cliente = db.add_cliente("Maria", "(11) 99999-0000")
+    a = novo_produto(20, preco=10.0, preco_custo=4.0, marca="Natura")
+    b = novo_produto(20, preco=25.5, preco_custo=10.0, marca="Avon", tipo="Sabonetes")
+    db.mark_produto_as_sold(a, 2)
+    db.mark_produto_as_sold(b, 1, cliente_id=cliente)
+    db.sell_produtos_batch([{"produto_id": a, "quantidade": 3}, {"produto_id": b, "quantidade": 2}], cliente_id=cliente)
+
+    vendas = _consultar(
+        "SELECT SUM(quantidade) AS unidades, SUM(quantidade * preco_unitario) AS receita, "
+        "SUM(quantidade * custo_unitario) AS custo, COUNT(*) AS num FROM vendas"
+    )[0]
+    for tabela in ("vendas_resumo_dia", "vendas_resumo_produto", "vendas_resumo_marca_tipo"):
+        resumo = _consultar(f"SELECT SUM(unidades) AS unidades, SUM(receita) AS receita, SUM(custo) AS custo FROM {tabela}")[0]
+        assert resumo["unidades"] == vendas["unidades"], tabela
+        assert resumo["receita"] == pytest.approx(vendas["receita"]), tabela
+        assert resumo["custo"] == pytest.approx(vendas["custo"]), tabela
+    assert _consultar("SELECT SUM(num_vendas) AS n FROM vendas_resumo_dia")[0]["n"] == vendas["num"]
+
+    por_produto = _consultar(
+        "SELECT r.produto_id, r.unidades, SUM(v.quantidade) AS vendidas FROM vendas_resumo_produto r "
+        "JOIN vendas v ON v.produto_id = r.produto_id GROUP BY r.produto_id"
+    )
+    assert all(l["unidades"] == l["vendidas"] for l in por_produto)
+
+    c = db.get_cliente(cliente)
+    assert (c["num_compras"], c["unidades"]) == (2, 6)
+    assert c["total_gasto"] == pytest.approx(25.5 + 3 * 10.0 + 2 * 25.5)
+
+
+def test_venda_acima_do_estoque_nao_altera_nada(novo_produto):
+    pid = novo_produto(2)
+    with pytest.raises(ValueError):
+        db.mark_produto_as_sold(pid, 3)
+    assert db.get_produto_by_id(pid)["quantidade"] == 2
+    assert _consultar("SELECT COUNT(*) AS n FROM vendas")[0]["n"] == 0
+
+
+# ====================================================================
+# PAGINAÇÃO E EXPORTAÇÃO INCREMENTAL
+# ====================================================================
+
+def test_paginacao_por_chave_percorre_tudo_sem_repetir(novo_produto):
+    ids = {novo_produto(1, nome=f"Item {i % 7}") for i in range(23)}  # Nomes repetidos: desempate pelo ID
+    vistos, after = [], None
+    while True:
+        pagina = db.get_produtos_page(limit=5, after=after)
+        if not pagina:
+            break
+        vistos.extend(p["id"] for p in pagina)
+        after = (pagina[-1]["nome"], pagina[-1]["id"])
+
+    assert len(vistos) == len(set(vistos)) == len(ids)
+    assert set(vistos) == ids
+
+
+def test_token_da_exportacao_incremental_e_monotonico(novo_produto):
+    a = novo_produto(1)
+    _, _, token1 = db.export_produtos_delta()
+
+    b = novo_produto(1)
+    alterados, _, token2 = db.export_produtos_delta(token1)
+    assert token2 > token1
+    assert b in set(alterados["id"].tolist())
+
+    alterados, removidos, token3 = db.export_produtos_delta(token2)
+    assert token3 == token2  # Nada mudou: o token não anda (nem volta)
+    assert b in set(alterados["id"].tolist())  # Comparação inclusiva: a última linha pode repetir
+
+    db.delete_produto(a, remove_foto=False)
+    _, removidos, token4 = db.export_produtos_delta(token3)
+    assert token4 > token3
+    assert [r["id"] for r in removidos] == [a]
+
+
+def test_registro_de_alteracoes_avanca_a_cada_escrita(novo_produto):
+    seq = db.get_change_seq()
+    pid = novo_produto(1)
+    db.mark_produto_as_sold(pid, 1)
+
+    novo_seq, alterados, removidos = db.get_changes_since(seq)
+    assert novo_seq == db.get_change_seq() > seq
+    assert pid in alterados and not removidos
@@ -0,0 +1,296 @@
+# ====================================================================
+# ARQUIVO: utils/api.py
+# API HTTP/JSON local para o PDV e a loja virtual (sem passar pelo Streamlit).
+# Servidor da biblioteca padrão (uma thread por requisição), com pool de
+# conexões para as leituras e ETag/If-None-Match para consultas repetidas.
+# Uso pela linha de comando:
+#   python -m utils.api [--host 127.0.0.1] [--porta 8502]
+# Com a variável ESTOQUE_API_TOKEN definida, toda requisição precisa do
+# cabeçalho 'Authorization: Bearer <token>'; sem ela, as vendas ficam bloqueadas.
+#
+# Rotas:
+#   GET  /produtos/<id>                  produto pelo ID
+#   GET  /produtos?codigo=<código>       produto pelo código de barras/SKU
+#   GET  /produtos?q=<texto>&limite=<n>  busca pelo início do nome, da marca ou do código
+#   GET  /exportar?desde=<token>         alterados e removidos desde o token
+#   POST /vendas        {"produto_id" ou "codigo_barras", "quantidade", "local_id", "cliente_id"}
+#   POST /vendas/lote   {"itens": [{...}, ...], "local_id": <id>, "cliente_id": <id>}  (tudo ou nada)
+# Sem "local_id", a venda sai do local principal; "cliente_id" é opcional.
+# ====================================================================
+
+import os
+import json
+import queue
+import sqlite3
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from utils.database import (
+    DATABASE, DB_TIMEOUT, MARCAS, create_tables, sell_produtos_batch, export_produtos_delta, _banco_ocupado
+)
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+TAMANHO_POOL = int(os.environ.get("ESTOQUE_API_CONEXOES", "8"))
+LIMITE_BUSCA = 50
+API_TOKEN = os.environ.get("ESTOQUE_API_TOKEN")
+
+logger = logging.getLogger(__name__)
+
+
+# ====================================================================
+# POOL DE CONEXÕES (LEITURAS)
+# ====================================================================
+
+class ConnectionPool:
+    """Conexões SQLite reaproveitadas entre as threads do servidor.
+
+    Abre no máximo 'tamanho' conexões; quem pede uma conexão com o pool vazio espera
+    até outra thread devolver.
+    """
+
+    def __init__(self, database=DATABASE, tamanho=TAMANHO_POOL):
+        self.database = database
+        self.tamanho = tamanho
+        self._livres = queue.LifoQueue()
+        self._abertas = 0
+        self._lock = threading.Lock()
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.database, timeout=DB_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._livres.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                criar = self._abertas < self.tamanho
+                if criar:
+                    self._abertas += 1
+            conn = self._conectar() if criar else self._livres.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._livres.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = ConnectionPool()
+
+
+def _get_change_seq(conn):
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'alteracoes'").fetchone()
+    return row[0] if row else 0
+
+
+def _produto_etag(produto):
+    return f'"{produto["id"]}-{produto.get("atualizado_em") or 0}"'
+
+
+# ====================================================================
+# REQUISIÇÕES
+# ====================================================================
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "EstoqueAPI/1.0"
+    protocol_version = "HTTP/1.1"  # Mantém a conexão aberta entre requisições do mesmo terminal
+
+    # --- Respostas ---
+    def _responder(self, status, corpo=None, etag=None):
+        dados = json.dumps(corpo, ensure_ascii=False, default=str).encode("utf-8") if corpo is not None else b""
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if dados:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _erro(self, status, mensagem):
+        self._responder(status, {"erro": mensagem})
+
+    def _erro_interno(self, erro):
+        """Responde 503 se o banco seguiu ocupado depois das novas tentativas; 500 para o resto."""
+        if isinstance(erro, sqlite3.OperationalError) and _banco_ocupado(erro):
+            self._erro(503, "Banco de dados ocupado. Tente novamente em instantes.")
+        else:
+            logger.exception("Erro na requisição %s %s", self.command, self.path)
+            self._erro(500, "Erro interno do servidor.")
+
+    def _nao_modificado(self, etag):
+        """Responde 304 se o cliente já tem a versão 'etag'."""
+        if etag in [e.strip() for e in self.headers.get("If-None-Match", "").split(",")]:
+            self._responder(304, etag=etag)
+            return True
+        return False
+
+    def _autorizado(self, escrita=False):
+        if API_TOKEN:
+            if self.headers.get("Authorization") == f"Bearer {API_TOKEN}":
+                return True
+            self._erro(401, "Token de acesso inválido.")
+            return False
+        if escrita:
+            self._erro(403, "Defina ESTOQUE_API_TOKEN para habilitar as vendas pela API.")
+            return False
+        return True
+
+    def _ler_json(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(tamanho) or b"{}")
+        except json.JSONDecodeError:
+            raise ValueError("Corpo da requisição não é um JSON válido.")
+
+    def log_message(self, formato, *args):
+        pass  # Sem log por requisição (o PDV faz muitas consultas)
+
+    # --- GET ---
+    def do_GET(self):
+        if not self._autorizado():
+            return
+        try:
+            self._rotear_get()
+        except Exception as e:
+            self._erro_interno(e)
+
+    def _rotear_get(self):
+        url = urlsplit(self.path)
+        partes = [p for p in url.path.split("/") if p]
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if partes == ["produtos"] or (len(partes) == 2 and partes[0] == "produtos"):
+            with _pool.connection() as conn:
+                if len(partes) == 2:
+                    self._get_produto(conn, "id = ?", partes[1])
+                elif "codigo" in query:
+                    self._get_produto(conn, "codigo_barras = ? COLLATE NOCASE", query["codigo"].strip())
+                else:
+                    self._buscar(conn, query.get("q", ""), query.get("limite"))
+        elif partes == ["exportar"]:
+            self._exportar(query.get("desde"))
+        else:
+            self._erro(404, "Rota não encontrada.")
+
+    def _get_produto(self, conn, condicao, valor):
+        row = conn.execute(f"SELECT * FROM produtos WHERE {condicao}", (valor,)).fetchone()
+        if not row:
+            self._erro(404, "Produto não encontrado.")
+            return
+        produto = dict(row)
+        etag = _produto_etag(produto)
+        if not self._nao_modificado(etag):
+            self._responder(200, produto, etag=etag)
+
+    def _buscar(self, conn, termo, limite):
+        try:
+            limite = min(int(limite or LIMITE_BUSCA), 500)
+        except ValueError:
+            self._erro(400, "Parâmetro 'limite' inválido.")
+            return
+        # A lista só muda quando 'produtos' muda: o seq do registro de alterações identifica a versão
+        etag = f'W/"{_get_change_seq(conn)}"'
+        if self._nao_modificado(etag):
+            return
+        termo = termo.strip()
+        if not termo:
+            rows = conn.execute("SELECT * FROM produtos ORDER BY nome COLLATE NOCASE, id LIMIT ?", (limite,)).fetchall()
+            self._responder(200, [dict(r) for r in rows], etag=etag)
+            return
+        # Só prefixos: cada condição é uma faixa de índice (nome e código sem diferenciar maiúsculas,
+        # marca pela lista fixa), em vez de varrer a tabela com LIKE '%texto%'
+        padrao = termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        marcas = [m for m in MARCAS if m.lower().startswith(termo.lower())]
+        marcadores = ", ".join("?" for _ in marcas) or "NULL"
+        rows = conn.execute(
+            f"""
+            SELECT * FROM produtos
+            WHERE nome LIKE ? ESCAPE '\\' OR codigo_barras LIKE ? ESCAPE '\\' OR marca IN ({marcadores})
+            ORDER BY nome COLLATE NOCASE, id LIMIT ?
+            """,
+            (padrao, padrao, *marcas, limite)
+        ).fetchall()
+        self._responder(200, [dict(r) for r in rows], etag=etag)
+
+    def _exportar(self, desde):
+        alterados, removidos, token = export_produtos_delta(desde)
+        etag = f'"{token}"'
+        if desde and self._nao_modificado(etag):
+            return
+        registros = json.loads(alterados.to_json(orient="records", force_ascii=False))
+        self._responder(200, {"token": token, "alterados": registros, "removidos": removidos}, etag=etag)
+
+    # --- POST ---
+    def do_POST(self):
+        if not self._autorizado(escrita=True):
+            return
+        rota = urlsplit(self.path).path.rstrip("/")
+        try:
+            corpo = self._ler_json()
+            if not isinstance(corpo, dict):
+                raise ValueError("O corpo da requisição deve ser um objeto JSON.")
+            if rota == "/vendas":
+                itens = [corpo]
+            elif rota == "/vendas/lote":
+                itens = corpo.get("itens") or []
+                if not isinstance(itens, list) or not itens:
+                    raise ValueError("Informe ao menos um item em 'itens'.")
+                if not all(isinstance(item, dict) for item in itens):
+                    raise ValueError("Cada item de 'itens' deve ser um objeto JSON.")
+            else:
+                self._erro(404, "Rota não encontrada.")
+                return
+            produtos = sell_produtos_batch(itens, local_id=corpo.get("local_id"), usuario="api",
+                                           cliente_id=corpo.get("cliente_id"))
+        except (ValueError, TypeError) as e:
+            self._erro(409 if "Estoque insuficiente" in str(e) else 400, str(e))
+            return
+        except Exception as e:
+            self._erro_interno(e)
+            return
+        self._responder(200, produtos[0] if rota == "/vendas" else produtos)
+
+
+# ====================================================================
+# LINHA DE COMANDO
+# ====================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP/JSON do estoque (PDV e loja virtual).")
+    parser.add_argument("--host", default="127.0.0.1", help="Endereço de escuta (padrão: só esta máquina).")
+    parser.add_argument("--porta", type=int, default=8502, help="Porta TCP.")
+    args = parser.parse_args()
+
+    create_tables()
+    servidor = ThreadingHTTPServer((args.host, args.porta), ApiHandler)
+    print(f"API do estoque em http://{args.host}:{args.porta} (Ctrl+C para sair)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        _pool.close()
+
+
+if __name__ == "__main__":
+    main()
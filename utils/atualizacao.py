@@ -0,0 +1,58 @@
+# ====================================================================
+# ARQUIVO: utils/atualizacao.py
+# Cache de produtos por sessão + verificação periódica de alterações.
+# Cada sessão guarda sua cópia dos produtos e o último 'seq' do registro
+# de alterações; só os IDs alterados por outras sessões são recarregados.
+# ====================================================================
+
+import streamlit as st
+
+from utils.database import get_all_produtos, get_produtos_by_ids, get_change_seq, get_changes_since
+
+INTERVALO_VERIFICACAO = 5  # segundos
+
+
+def _carregar_tudo(chave, include_sold, local_id):
+    seq = get_change_seq()
+    produtos = {p['id']: p for p in get_all_produtos(include_sold=include_sold, local_id=local_id)}
+    st.session_state[chave] = {"seq": seq, "produtos": produtos}
+
+
+def get_produtos_cache(include_sold=True, local_id=None):
+    """Equivalente a get_all_produtos(include_sold, local_id), mas reaproveitando a cópia da sessão.
+
+    Na primeira chamada carrega a lista inteira; depois busca apenas os produtos alterados
+    desde a última leitura (ou nada, se ninguém escreveu).
+    """
+    chave = f"_produtos_cache_{include_sold}_{local_id}"
+    cache = st.session_state.get(chave)
+    if cache is None:
+        _carregar_tudo(chave, include_sold, local_id)
+    else:
+        mudancas = get_changes_since(cache["seq"])
+        if mudancas is None:
+            _carregar_tudo(chave, include_sold, local_id)
+        else:
+            seq, alterados, removidos = mudancas
+            produtos = cache["produtos"]
+            for product_id in removidos | alterados:
+                produtos.pop(product_id, None)
+            for p in get_produtos_by_ids(alterados, local_id):
+                if include_sold or p['quantidade'] > 0:
+                    produtos[p['id']] = p
+            cache["seq"] = seq
+
+    produtos = st.session_state[chave]["produtos"].values()
+    return sorted(produtos, key=lambda p: p.get('nome') or '')
+
+
+@st.fragment(run_every=INTERVALO_VERIFICACAO)
+def watch_changes():
+    """Verifica (barato) se outra sessão escreveu; se sim, recarrega a página.
+
+    Chame uma vez por página, depois de get_produtos_cache.
+    """
+    seq_visto = max((c["seq"] for k, c in st.session_state.items()
+                     if isinstance(k, str) and k.startswith("_produtos_cache_")), default=None)
+    if seq_visto is not None and get_change_seq() != seq_visto:
+        st.rerun()
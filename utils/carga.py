@@ -0,0 +1,276 @@
+# ====================================================================
+# ARQUIVO: utils/carga.py
+# Teste de carga das páginas: N usuários simultâneos executam as páginas reais
+# com o AppTest do Streamlit, sem navegador, contra um banco temporário populado
+# com produtos fictícios. Cada usuário roda em um processo próprio (o AppTest
+# não suporta várias execuções em threads do mesmo processo), então a disputa
+# pela escrita aparece como espera no BEGIN IMMEDIATE. Ao final, mostra a
+# latência de cada rerun por página (percentis) e as esperas por escrita.
+# Uso pela linha de comando:
+#   python -m utils.carga [--usuarios 8] [--duracao 60] [--produtos 300] [--semente 42]
+# ====================================================================
+
+import os
+import io
+import sys
+import csv
+import random
+import argparse
+import tempfile
+import time
+import multiprocessing
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)  # As páginas importam 'utils' mesmo depois do chdir para o banco temporário
+
+from streamlit.testing.v1 import AppTest
+
+from utils.database import create_tables, get_write_metrics, import_produtos_from_csv_buffer, MARCAS, ESTILOS, TIPOS
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+PAGINAS = {
+    "estoque": "pages/estoque_completo.py",
+    "gerenciamento": "pages/gerenciamento_produto.py",
+    "chat": "pages/chat_comando.py",
+    "vendidos": "pages/produto_vendido.py",
+}
+
+# Peso de cada fluxo no sorteio (navegação é o caso mais comum)
+FLUXOS = {"navegar": 6, "vender": 3, "editar": 1}
+
+TIMEOUT_RERUN = 120  # segundos
+PERCENTIS = (50, 90, 99)
+
+
+# ====================================================================
+# BANCO TEMPORÁRIO
+# ====================================================================
+
+def seed_database(produtos, rng):
+    """Cria o banco no diretório atual e importa 'produtos' produtos fictícios. Retorna os códigos de barras.
+
+    Os produtos passam pela mesma importação de CSV da página de gerenciamento.
+    """
+    create_tables()
+    hoje = date.today()
+    rows = []
+    for i in range(produtos):
+        rows.append({
+            "nome": f"Produto de Carga {i:05d}",
+            "preco": f"{rng.uniform(5, 300):.2f}",
+            "preco_custo": f"{rng.uniform(2, 150):.2f}",
+            "quantidade": rng.randint(1, 40),
+            "marca": rng.choice(MARCAS),
+            "estilo": rng.choice(ESTILOS),
+            "tipo": rng.choice(TIPOS),
+            "data_validade": (hoje + timedelta(days=rng.randint(-10, 720))).isoformat(),
+            "estoque_minimo": rng.choice((0, 0, 2, 5)),
+            "codigo_barras": f"789{i:010d}",
+        })
+    texto = io.StringIO()
+    escritor = csv.DictWriter(texto, fieldnames=list(rows[0]) if rows else ["nome"], delimiter=';')
+    escritor.writeheader()
+    escritor.writerows(rows)
+    import_produtos_from_csv_buffer(io.BytesIO(texto.getvalue().encode("utf-8")))
+    return [r["codigo_barras"] for r in rows]
+
+
+# ====================================================================
+# USUÁRIOS SIMULADOS
+# ====================================================================
+
+class Resultados:
+    """Latências (segundos) e erros por página de um usuário simulado."""
+
+    def __init__(self):
+        self.latencias = {nome: [] for nome in PAGINAS}
+        self.erros = {nome: 0 for nome in PAGINAS}
+        self.fluxos = {nome: 0 for nome in FLUXOS}
+
+    def registrar(self, pagina, duracao, erro=False):
+        self.latencias[pagina].append(duracao)
+        if erro:
+            self.erros[pagina] += 1
+
+    def somar(self, outro):
+        """Junta os resultados de outro usuário a estes."""
+        for pagina in PAGINAS:
+            self.latencias[pagina].extend(outro.latencias[pagina])
+            self.erros[pagina] += outro.erros[pagina]
+        for fluxo in FLUXOS:
+            self.fluxos[fluxo] += outro.fluxos[fluxo]
+
+
+class UsuarioSimulado:
+    """Uma sessão de funcionário: um AppTest por página, mantido entre os fluxos (como abas abertas)."""
+
+    def __init__(self, numero, codigos, resultados, rng):
+        self.username = f"carga{numero}"
+        self.codigos = codigos
+        self.resultados = resultados
+        self.rng = rng
+        self.apps = {}
+
+    def _app(self, pagina):
+        """AppTest da página, já logado e com a primeira execução feita."""
+        if pagina not in self.apps:
+            at = AppTest.from_file(os.path.join(RAIZ, PAGINAS[pagina]), default_timeout=TIMEOUT_RERUN)
+            at.session_state["logged_in"] = True
+            at.session_state["username"] = self.username
+            at.session_state["role"] = "staff"
+            self.apps[pagina] = at
+            self._rodar(pagina, at.run)
+        return self.apps[pagina]
+
+    def _rodar(self, pagina, acao):
+        """Executa um rerun (acao()) medindo o tempo; exceções da página contam como erro."""
+        inicio = time.perf_counter()
+        erro = False
+        try:
+            at = acao()
+            erro = bool(at.exception)
+        except Exception:
+            erro = True
+        self.resultados.registrar(pagina, time.perf_counter() - inicio, erro)
+
+    # --- Fluxos ---
+    def navegar(self):
+        at = self._app("estoque")
+        marca = next(s for s in at.selectbox if s.label == "Filtrar por Marca")
+        self._rodar("estoque", lambda: marca.select(self.rng.choice(marca.options)).run())
+        self._rodar("vendidos", self._app("vendidos").run)
+
+    def vender(self):
+        codigo = self.rng.choice(self.codigos)
+        if self.rng.random() < 0.5:
+            at = self._app("chat")
+            self._rodar("chat", lambda: at.chat_input[0].set_value(f"scan {codigo}").run())
+        else:
+            at = self._app("gerenciamento")
+            self._rodar("gerenciamento", lambda: at.sidebar.selectbox[0].select("Modo Scanner").run())
+            self._rodar("gerenciamento", lambda: at.text_input(key="scan_input").input(codigo).run())
+            self._rodar("gerenciamento", lambda: at.sidebar.selectbox[0].select("Visualizar / Ações").run())
+
+    def editar(self):
+        at = self._app("gerenciamento")
+        botoes = [b for b in at.button if b.key and b.key.startswith("mod_")]
+        if not botoes:
+            return
+        self._rodar("gerenciamento", self.rng.choice(botoes).click().run)
+        preco = next((n for n in at.number_input if n.label == "Preço (R$)"), None)
+        salvar = next((b for b in at.button if b.label == "Salvar Alterações"), None)
+        if preco is None or salvar is None:
+            return
+        preco.set_value(round(max(preco.value * self.rng.uniform(0.9, 1.1), 0.01), 2))
+        self._rodar("gerenciamento", salvar.click().run)
+
+    def executar(self, fim):
+        while time.monotonic() < fim:
+            fluxo = self.rng.choices(list(FLUXOS), weights=list(FLUXOS.values()))[0]
+            getattr(self, fluxo)()
+            self.resultados.fluxos[fluxo] += 1
+
+
+def _executar_usuario(numero, diretorio, codigos, duracao, semente):
+    """Processo de um usuário: roda os fluxos por 'duracao' segundos. Retorna (resultados, métricas de escrita)."""
+    os.chdir(diretorio)
+    resultados = Resultados()
+    UsuarioSimulado(numero, codigos, resultados, random.Random(semente)).executar(time.monotonic() + duracao)
+    return resultados, get_write_metrics()
+
+
+# ====================================================================
+# EXECUÇÃO E RELATÓRIO
+# ====================================================================
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def run_load_test(usuarios=8, duracao=60, produtos=300, semente=42):
+    """Roda o teste de carga num banco temporário e retorna o relatório (dict)."""
+    rng = random.Random(semente)
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="estoque_carga_") as diretorio:
+        # DATABASE e ASSETS_DIR são caminhos relativos: no diretório temporário, o banco real fica intocado
+        os.chdir(diretorio)
+        os.makedirs("data", exist_ok=True)
+        os.makedirs("assets", exist_ok=True)
+        try:
+            codigos = seed_database(produtos, rng)
+            # 'spawn': processos novos, sem herdar o estado do Streamlit deste processo
+            with multiprocessing.get_context("spawn").Pool(usuarios) as pool:
+                por_usuario = pool.starmap(
+                    _executar_usuario,
+                    [(n, diretorio, codigos, duracao, rng.random()) for n in range(usuarios)]
+                )
+        finally:
+            os.chdir(diretorio_original)
+
+    resultados = Resultados()
+    for resultados_usuario, _ in por_usuario:
+        resultados.somar(resultados_usuario)
+    metricas = [m for _, m in por_usuario]
+    transacoes = sum(m["transacoes"] for m in metricas)
+    espera_total = sum(m["espera_total"] for m in metricas)
+
+    paginas = {}
+    for pagina, latencias in resultados.latencias.items():
+        if latencias:
+            paginas[pagina] = {
+                "reruns": len(latencias),
+                "erros": resultados.erros[pagina],
+                **{f"p{p}": _percentil(latencias, p) for p in PERCENTIS},
+                "max": max(latencias),
+            }
+    return {
+        "usuarios": usuarios,
+        "duracao": duracao,
+        "produtos": produtos,
+        "fluxos": resultados.fluxos,
+        "paginas": paginas,
+        "escrita": {
+            "transacoes": transacoes,
+            "espera_total": espera_total,
+            "espera_media": espera_total / transacoes if transacoes else 0.0,
+            "espera_max": max(m["espera_max"] for m in metricas),
+            "retentativas": sum(m["retentativas"] for m in metricas),
+            "falhas": sum(m["falhas"] for m in metricas),
+        },
+    }
+
+
+def print_report(relatorio):
+    """Imprime o relatório em formato de tabela."""
+    print(f"{relatorio['usuarios']} usuário(s) • {relatorio['duracao']} s • {relatorio['produtos']} produtos")
+    print("Fluxos: " + ", ".join(f"{nome} {total}" for nome, total in relatorio["fluxos"].items()))
+    print()
+    colunas = [f"p{p}" for p in PERCENTIS] + ["max"]
+    print(f"{'Página':<15}{'Reruns':>8}{'Erros':>7}" + "".join(f"{c + ' (ms)':>11}" for c in colunas))
+    for pagina, dados in relatorio["paginas"].items():
+        print(f"{pagina:<15}{dados['reruns']:>8}{dados['erros']:>7}" + "".join(f"{dados[c] * 1000:>11.0f}" for c in colunas))
+    escrita = relatorio["escrita"]
+    print()
+    print(f"Escritas: {escrita['transacoes']} • espera pelo bloqueio: total {escrita['espera_total']:.2f} s, "
+          f"média {escrita['espera_media'] * 1000:.1f} ms, máx. {escrita['espera_max'] * 1000:.1f} ms • "
+          f"retentativas {escrita['retentativas']} • falhas {escrita['falhas']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga das páginas com usuários simultâneos (AppTest).")
+    parser.add_argument("--usuarios", type=int, default=8, help="Sessões simultâneas (um processo cada).")
+    parser.add_argument("--duracao", type=float, default=60, help="Duração do teste em segundos.")
+    parser.add_argument("--produtos", type=int, default=300, help="Produtos no banco temporário.")
+    parser.add_argument("--semente", type=int, default=42, help="Semente dos sorteios (repetibilidade).")
+    args = parser.parse_args()
+    print_report(run_load_test(args.usuarios, args.duracao, args.produtos, args.semente))
+
+
+if __name__ == "__main__":
+    main()
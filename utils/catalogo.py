@@ -0,0 +1,317 @@
+# ====================================================================
+# ARQUIVO: utils/catalogo.py
+# Catálogo público dos produtos em estoque, publicado como arquivos estáticos
+# (index.html, produtos.json e miniaturas das fotos) para os clientes
+# navegarem sem login: qualquer servidor de arquivos serve a pasta, sem
+# passar pelo banco nem pelo Streamlit. A primeira publicação monta o
+# catálogo inteiro; as seguintes só refazem o trecho de HTML e a miniatura
+# dos produtos alterados ou removidos desde a anterior (registro de
+# alterações: get_changes_since a partir do seq publicado).
+# Uso pela linha de comando:
+#   python -m utils.catalogo [--completo]        publica uma vez
+#   python -m utils.catalogo --observar 30       republica a cada 30 s, se houve escrita
+# Para servir: python -m http.server -d catalogo
+# ====================================================================
+
+import os
+import json
+import html
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+
+from PIL import Image
+
+from utils.database import (
+    get_all_produtos, get_produtos_by_ids, get_change_seq, get_changes_since, ASSETS_DIR
+)
+from utils.jobs import submit_job
+from utils.formatos import NOME_LOJA, format_to_brl
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+CATALOGO_DIR = os.environ.get("ESTOQUE_CATALOGO_DIR", "catalogo")
+MINIATURAS = "miniaturas"
+ARQUIVO_ESTADO = ".estado.json"  # Seq da última publicação e o trecho de HTML de cada produto
+
+TAMANHO_MINIATURA = (240, 240)
+ULTIMAS_UNIDADES = 2  # Até aqui, o produto aparece como "Últimas unidades"
+INTERVALO_PUBLICACAO = 30  # segundos entre verificações feitas pelas páginas
+LIMITE_INCREMENTAL = 500  # Mais alterados que isso: relê o catálogo inteiro (uma consulta) em vez de buscar por ID
+
+_publicacao_lock = threading.Lock()
+_seq_publicado = None
+_proxima_verificacao = 0.0
+
+
+# ====================================================================
+# ARQUIVOS
+# ====================================================================
+
+def _gravar(caminho, conteudo):
+    """Grava via arquivo temporário + os.replace: quem está lendo nunca vê um arquivo pela metade."""
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def _ler_estado(destino):
+    try:
+        with open(os.path.join(destino, ARQUIVO_ESTADO), encoding="utf-8") as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return estado if "seq" in estado else None  # Estado de outro formato: refaz tudo
+
+
+def _remover_miniatura(destino, nome):
+    if nome:
+        try:
+            os.remove(os.path.join(destino, MINIATURAS, nome))
+        except FileNotFoundError:
+            pass
+
+
+def _gerar_miniatura(destino, produto):
+    """Cria a miniatura JPEG da foto do produto e retorna o nome do arquivo (None se não houver foto).
+
+    O nome leva um hash da foto de origem: trocar a foto gera outro arquivo, sem cache velho no navegador.
+    """
+    foto = produto.get("foto")
+    if not foto:
+        return None
+    nome = f"{produto['id']}_{hashlib.sha1(foto.encode('utf-8')).hexdigest()[:10]}.jpg"
+    caminho = os.path.join(destino, MINIATURAS, nome)
+    if os.path.exists(caminho):
+        return nome
+    try:
+        with Image.open(os.path.join(ASSETS_DIR, foto)) as imagem:
+            imagem = imagem.convert("RGB")
+            imagem.thumbnail(TAMANHO_MINIATURA)
+            imagem.save(f"{caminho}.tmp", "JPEG", quality=80, optimize=True)
+        os.replace(f"{caminho}.tmp", caminho)
+    except (OSError, ValueError):
+        return None  # Foto ausente ou inválida: o produto sai sem imagem
+    return nome
+
+
+# ====================================================================
+# RENDERIZAÇÃO
+# ====================================================================
+
+def _renderizar_produto(produto, miniatura):
+    """Registro público (JSON) e trecho de HTML de um produto."""
+    registro = {
+        "id": produto["id"],
+        "nome": produto.get("nome"),
+        "preco": float(produto.get("preco") or 0),
+        "marca": produto.get("marca"),
+        "estilo": produto.get("estilo"),
+        "tipo": produto.get("tipo"),
+        "ultimas_unidades": int(produto.get("quantidade") or 0) <= ULTIMAS_UNIDADES,
+        "miniatura": f"{MINIATURAS}/{miniatura}" if miniatura else None,
+    }
+    esc = html.escape
+    imagem = (f'<img src="{esc(registro["miniatura"])}" alt="" loading="lazy">' if miniatura
+              else '<div class="sem-foto">Sem foto</div>')
+    aviso = '<span class="aviso">Últimas unidades</span>' if registro["ultimas_unidades"] else ""
+    busca = " ".join(str(registro[c] or "") for c in ("nome", "marca", "estilo", "tipo")).lower()
+    trecho = (
+        f'<article class="produto" data-busca="{esc(busca)}">{imagem}'
+        f'<h3>{esc(registro["nome"] or "")}</h3>'
+        f'<p class="detalhes">{esc(registro["marca"] or "")} • {esc(registro["tipo"] or "")}</p>'
+        f'<p class="preco">{format_to_brl(registro["preco"])}</p>{aviso}</article>'
+    )
+    return {"registro": registro, "html": trecho, "foto": produto.get("foto"), "miniatura": miniatura}
+
+
+PAGINA = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{titulo}</title>
+<style>
+body{{margin:0;font-family:sans-serif;background:#FFFFE0;color:#36454F}}
+header{{padding:16px;text-align:center}}h1,h2,h3{{color:#800020}}
+input{{width:min(480px,90%);padding:8px;border:1px solid #800020;border-radius:4px;background:#FFFACD}}
+section{{padding:0 16px}}.grade{{display:grid;grid-template-columns:repeat(auto-fill,minmax(200px,1fr));gap:12px}}
+.produto{{background:#FFFACD;border-radius:6px;padding:10px;text-align:center}}
+.produto img,.sem-foto{{width:100%;height:180px;object-fit:contain}}.sem-foto{{line-height:180px;color:#999}}
+.produto h3{{font-size:1em;margin:6px 0}}.detalhes{{font-size:.85em;margin:0}}.preco{{font-weight:bold;color:#800020}}
+.aviso{{font-size:.8em;color:#fff;background:#800020;padding:2px 6px;border-radius:3px}}
+footer{{padding:16px;text-align:center;font-size:.8em}}
+</style>
+</head>
+<body>
+<header><h1>{titulo}</h1><input id="busca" type="search" placeholder="Buscar produto, marca ou tipo"></header>
+{secoes}
+<footer>{total} produto(s) em estoque • Atualizado em {atualizado}</footer>
+<script>
+document.getElementById("busca").addEventListener("input", function () {{
+  var termo = this.value.toLowerCase();
+  document.querySelectorAll(".produto").forEach(function (p) {{
+    p.style.display = p.dataset.busca.indexOf(termo) < 0 ? "none" : "";
+  }});
+  document.querySelectorAll("section").forEach(function (s) {{
+    s.style.display = s.querySelector(".produto:not([style*='none'])") ? "" : "none";
+  }});
+}});
+</script>
+</body>
+</html>
+"""
+
+
+def _montar_pagina(produtos, atualizado):
+    """index.html a partir dos trechos já renderizados, agrupados por marca."""
+    por_marca = {}
+    for p in sorted(produtos.values(), key=lambda p: ((p["registro"]["marca"] or ""), (p["registro"]["nome"] or ""))):
+        por_marca.setdefault(p["registro"]["marca"] or "Outras", []).append(p["html"])
+    secoes = "\n".join(
+        f'<section><h2>{html.escape(marca)}</h2><div class="grade">{"".join(trechos)}</div></section>'
+        for marca, trechos in por_marca.items()
+    )
+    return PAGINA.format(titulo=f"Catálogo {NOME_LOJA}", secoes=secoes, total=len(produtos),
+                         atualizado=datetime.fromisoformat(atualizado).strftime("%d/%m/%Y %H:%M"))
+
+
+# ====================================================================
+# PUBLICAÇÃO
+# ====================================================================
+
+def publish_catalog(destino=CATALOGO_DIR, completo=False, progress=None):
+    """Publica o catálogo em 'destino'. Retorna {'alterados', 'removidos', 'produtos', 'publicado'}.
+
+    Sem 'completo', só os produtos alterados/removidos desde a última publicação são
+    renderizados de novo (e só têm a miniatura refeita se a foto mudou); sem nenhuma
+    mudança, nada é gravado.
+    """
+    global _seq_publicado
+    with _publicacao_lock:
+        os.makedirs(os.path.join(destino, MINIATURAS), exist_ok=True)
+        estado = None if completo else _ler_estado(destino)
+        mudancas = get_changes_since(estado["seq"]) if estado else None  # None: registro já podado
+
+        if mudancas is None:
+            # Catálogo inteiro. O seq é lido antes dos produtos: o que for gravado entre as duas
+            # leituras volta na próxima publicação (refazer um produto é idempotente)
+            seq = get_change_seq()
+            alterados = get_all_produtos(include_sold=False)
+            removidos = []
+            produtos = {}
+        else:
+            seq, ids_alterados, removidos = mudancas
+            if not ids_alterados and not removidos:
+                _seq_publicado = seq
+                return {"alterados": 0, "removidos": 0, "produtos": len(estado["produtos"]), "publicado": False}
+            produtos = estado["produtos"]
+            if len(ids_alterados) > LIMITE_INCREMENTAL:
+                # Muitos alterados (ex.: operação em massa): uma leitura sequencial sai mais barata que o IN
+                alterados = [p for p in get_all_produtos() if p["id"] in ids_alterados]
+            else:
+                alterados = get_produtos_by_ids(ids_alterados)
+
+        # 1. Removidos: saem do catálogo junto com a miniatura
+        for product_id in removidos:
+            anterior = produtos.pop(str(product_id), None)
+            if anterior:
+                _remover_miniatura(destino, anterior.get("miniatura"))
+
+        # 2. Alterados: sem estoque saem do catálogo; os demais têm o trecho refeito
+        total = len(alterados)
+        for index, produto in enumerate(alterados, start=1):
+            chave = str(produto["id"])
+            anterior = produtos.get(chave)
+            if anterior and (int(produto.get("quantidade") or 0) <= 0 or anterior.get("foto") != produto.get("foto")):
+                _remover_miniatura(destino, anterior.get("miniatura"))
+            if int(produto.get("quantidade") or 0) <= 0:
+                produtos.pop(chave, None)
+            else:
+                produtos[chave] = _renderizar_produto(produto, _gerar_miniatura(destino, produto))
+            if progress:
+                progress(index, total)
+
+        if mudancas is None:
+            # Catálogo refeito: apaga miniaturas que nenhum produto usa mais
+            em_uso = {p["miniatura"] for p in produtos.values()}
+            for nome in os.listdir(os.path.join(destino, MINIATURAS)):
+                if nome not in em_uso:
+                    _remover_miniatura(destino, nome)
+
+        # 3. Páginas: JSON e HTML montados com os trechos guardados (sem reler o banco)
+        agora = datetime.now().isoformat(timespec="seconds")
+        registros = sorted((p["registro"] for p in produtos.values()), key=lambda r: (r["nome"] or "", r["id"]))
+        _gravar(os.path.join(destino, "produtos.json"),
+                json.dumps({"atualizado_em": agora, "produtos": registros}, ensure_ascii=False))
+        _gravar(os.path.join(destino, "index.html"), _montar_pagina(produtos, agora))
+        _gravar(os.path.join(destino, ARQUIVO_ESTADO),
+                json.dumps({"seq": seq, "produtos": produtos}, ensure_ascii=False))
+        _seq_publicado = seq
+        return {"alterados": len(alterados), "removidos": len(removidos), "produtos": len(produtos), "publicado": True}
+
+
+def get_catalog_status(destino=CATALOGO_DIR):
+    """Pasta, quantidade de produtos e data da última publicação (lidos do produtos.json)."""
+    try:
+        with open(os.path.join(destino, "produtos.json"), encoding="utf-8") as f:
+            publicado = json.load(f)
+    except (OSError, ValueError):
+        publicado = {}
+    return {"destino": os.path.abspath(destino), "produtos": len(publicado.get("produtos", [])),
+            "atualizado_em": publicado.get("atualizado_em")}
+
+
+def schedule_catalog_publish():
+    """Agenda publish_catalog na fila de tarefas se houve escrita desde a última publicação.
+
+    Verifica no máximo uma vez a cada INTERVALO_PUBLICACAO neste processo (chamada pelas páginas).
+    """
+    global _proxima_verificacao
+    agora = time.monotonic()
+    if agora < _proxima_verificacao:
+        return None
+    _proxima_verificacao = agora + INTERVALO_PUBLICACAO
+    if get_change_seq() == _seq_publicado:
+        return None
+    return submit_job("publicar_catalogo", publish_catalog, usuario="sistema")
+
+
+# ====================================================================
+# LINHA DE COMANDO
+# ====================================================================
+
+def _imprimir(resultado):
+    if resultado["publicado"]:
+        print(f"Catálogo publicado: {resultado['produtos']} produto(s) • {resultado['alterados']} alterado(s), "
+              f"{resultado['removidos']} removido(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publica o catálogo público (HTML/JSON estático) dos produtos em estoque.")
+    parser.add_argument("--destino", default=CATALOGO_DIR, help="Pasta do catálogo.")
+    parser.add_argument("--completo", action="store_true", help="Refaz o catálogo inteiro.")
+    parser.add_argument("--observar", type=float, metavar="SEGUNDOS",
+                        help="Fica rodando e republica, a cada intervalo, se houve escrita no banco.")
+    args = parser.parse_args()
+
+    resultado = publish_catalog(args.destino, completo=args.completo)
+    _imprimir(resultado)
+    if not resultado["publicado"]:
+        print(f"Catálogo em dia ({resultado['produtos']} produto(s)).")
+    while args.observar:
+        try:
+            time.sleep(args.observar)
+        except KeyboardInterrupt:
+            break
+        if get_change_seq() != _seq_publicado:
+            _imprimir(publish_catalog(args.destino))
+
+
+if __name__ == "__main__":
+    main()
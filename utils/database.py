@@ -7,11 +7,23 @@ import sqlite3
 import os
 import hashlib
 import csv
+import json
+import time
+import random
+import logging
+import threading
+import atexit
+import functools
+from contextlib import contextmanager
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.graphics.barcode import code128
+from openpyxl import Workbook, load_workbook
 from datetime import datetime, date
 import io # Necessário para o download de PDF e CSV no Streamlit
+import pandas as pd
 
 # ====================================================================
 # CONFIGURAÇÃO DE DIRETÓRIOS E CONSTANTES
@@ -27,6 +39,12 @@ if not os.path.exists(DATABASE_DIR):
 if not os.path.exists(ASSETS_DIR):
     os.makedirs(ASSETS_DIR)
 
+# Espera máxima (segundos) por um banco ocupado por outro processo, e tentativas do BEGIN IMMEDIATE
+DB_TIMEOUT = float(os.environ.get("ESTOQUE_DB_TIMEOUT", "10"))
+TENTATIVAS_ESCRITA = 5
+
+logger = logging.getLogger(__name__)
+
 # Listas de categorias
 MARCAS = [
     "Eudora", "O Boticário", "Jequiti", "Avon", "Mary Kay", "Natura",
@@ -59,17 +77,101 @@ TIPOS = [
     "Infantil", "Lazer/Outdoor", "Presentes", "Outro"
 ]
 
+# Local de estoque padrão: recebe o estoque cadastrado, importado ou editado sem local
+LOCAL_PRINCIPAL = 1
+NOME_LOCAL_PRINCIPAL = "Loja"
+
+# Código do lote criado quando o estoque aumenta por edição ou operação em massa
+LOTE_AJUSTE = "AJUSTE"
+
 
 # ====================================================================
 # FUNÇÕES DE UTILIDADE E CONEXÃO
 # ====================================================================
 
+# Carimbo de data/hora usado pelos triggers: UTC com milissegundos, comparável como texto
+AGORA_SQL = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
 def get_db_connection():
     """Retorna um objeto de conexão com o banco de dados SQLite."""
-    conn = sqlite3.connect(DATABASE)
+    conn = sqlite3.connect(DATABASE, timeout=DB_TIMEOUT)
     conn.row_factory = sqlite3.Row
     return conn
 
+# --- Coordenação das escritas ---
+# Dentro do processo, um único escritor por vez (fila do lock); entre processos, BEGIN IMMEDIATE
+# pega o lock de escrita logo no início e o busy timeout + novas tentativas com espera aleatória
+# resolvem o "database is locked" em vez de deixá-lo chegar ao usuário.
+_write_lock = threading.Lock()
+_metricas_lock = threading.Lock()
+_metricas_escrita = {"transacoes": 0, "espera_total": 0.0, "espera_max": 0.0, "retentativas": 0, "falhas": 0}
+
+def _registrar_metrica(espera=None, retentativa=False, falha=False):
+    with _metricas_lock:
+        if espera is not None:
+            _metricas_escrita["transacoes"] += 1
+            _metricas_escrita["espera_total"] += espera
+            _metricas_escrita["espera_max"] = max(_metricas_escrita["espera_max"], espera)
+        if retentativa:
+            _metricas_escrita["retentativas"] += 1
+        if falha:
+            _metricas_escrita["falhas"] += 1
+
+def get_write_metrics():
+    """Retorna as métricas de espera por escrita deste processo (tempos em segundos)."""
+    with _metricas_lock:
+        metricas = dict(_metricas_escrita)
+    metricas["espera_media"] = metricas["espera_total"] / metricas["transacoes"] if metricas["transacoes"] else 0.0
+    return metricas
+
+def _banco_ocupado(erro):
+    mensagem = str(erro).lower()
+    return "locked" in mensagem or "busy" in mensagem
+
+@contextmanager
+def write_transaction():
+    """Abre uma transação de escrita (BEGIN IMMEDIATE) e entrega o cursor.
+
+    Confirma ao sair do bloco ou desfaz se houver exceção. Não chame outra função
+    de escrita dentro do bloco: o lock de escrita do processo não é reentrante.
+    """
+    inicio = time.perf_counter()
+    if not _write_lock.acquire(timeout=DB_TIMEOUT * TENTATIVAS_ESCRITA):
+        _registrar_metrica(falha=True)
+        raise sqlite3.OperationalError("Banco de dados ocupado. Tente novamente em instantes.")
+    try:
+        conn = get_db_connection()
+        try:
+            for tentativa in range(TENTATIVAS_ESCRITA):
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    break
+                except sqlite3.OperationalError as e:
+                    if not _banco_ocupado(e) or tentativa == TENTATIVAS_ESCRITA - 1:
+                        _registrar_metrica(falha=True)
+                        raise
+                    _registrar_metrica(retentativa=True)
+                    time.sleep(random.uniform(0, 0.05 * 2 ** tentativa))
+            _registrar_metrica(espera=time.perf_counter() - inicio)
+
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        finally:
+            conn.close()
+    finally:
+        _write_lock.release()
+
+def _add_column_if_missing(cursor, table, column, definition):
+    """Adiciona uma coluna a uma tabela existente (migração simples para bancos antigos)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row['name'] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
 def hash_password(password):
     """Gera o hash SHA256 da senha."""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -79,6 +181,9 @@ def create_tables():
     conn = get_db_connection()
     cursor = conn.cursor()
 
+    # 0. Modo WAL: leitores e o escritor não se bloqueiam (configuração persistente no arquivo)
+    cursor.execute("PRAGMA journal_mode=WAL")
+
     # 1. Cria a tabela 'produtos'
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS produtos (
@@ -96,6 +201,280 @@ def create_tables():
         );
     """)
 
+    # 1.1. Estoque mínimo por produto (alerta de reposição). O índice parcial contém apenas
+    # os produtos abaixo do mínimo, então a lista de reposição não varre a tabela inteira.
+    _add_column_if_missing(cursor, "produtos", "estoque_minimo", "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_produtos_reposicao ON produtos (nome)
+        WHERE estoque_minimo > 0 AND quantidade <= estoque_minimo
+    """)
+
+    # 1.1.0. Índice dos filtros por categoria (filtros da listagem e operações em massa)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_marca_estilo_tipo ON produtos (marca, estilo, tipo)")
+
+    # 1.1.0.1. Consultas do chatbot ("vence em N dias", "abaixo de N unidades"): só produtos com estoque
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_produtos_validade ON produtos (data_validade)
+        WHERE quantidade > 0 AND data_validade IS NOT NULL
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_quantidade ON produtos (quantidade) WHERE quantidade > 0")
+
+    # 1.1.1. Índices das ordenações usadas nas listagens (e na paginação por chave)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_nome_id ON produtos (nome, id)")
+    # Busca por prefixo do nome sem diferenciar maiúsculas (API): LIKE 'texto%' vira uma faixa do índice
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_nome_nocase ON produtos (nome COLLATE NOCASE, id)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_produtos_vendidos ON produtos (data_ultima_venda, id)
+        WHERE vendido = 1
+    """)
+
+    # 1.2. Código de barras/SKU: único quando informado (NULL para produtos sem código),
+    # sem diferenciar maiúsculas de minúsculas (o chatbot recebe os comandos em minúsculas)
+    _add_column_if_missing(cursor, "produtos", "codigo_barras", "TEXT")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_produtos_codigo_barras ON produtos (codigo_barras COLLATE NOCASE)
+        WHERE codigo_barras IS NOT NULL
+    """)
+
+    # 1.3. Índice por foto: permite checar rapidamente se um arquivo ainda é usado por algum produto
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_foto ON produtos (foto) WHERE foto IS NOT NULL")
+
+    # 1.3.1. Lotes: cada entrada de estoque com sua validade. Triggers mantêm produtos.quantidade
+    # (soma incremental) e produtos.data_validade (validade mais próxima com estoque), então
+    # as listagens continuam lendo apenas 'produtos'.
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lotes'")
+    lotes_existia = cursor.fetchone() is not None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lotes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            lote TEXT,
+            data_validade TEXT,
+            quantidade INTEGER NOT NULL CHECK (quantidade >= 0),
+            criado_em TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lotes_produto_validade ON lotes (produto_id, data_validade)")
+    if not lotes_existia:
+        # Migração (antes dos triggers): o estoque atual de cada produto vira um lote inicial
+        cursor.execute("""
+            INSERT INTO lotes (produto_id, lote, data_validade, quantidade)
+            SELECT id, 'INICIAL', data_validade, quantidade FROM produtos WHERE quantidade > 0
+        """)
+    validade_mais_proxima = """
+        UPDATE produtos SET data_validade = COALESCE((
+            SELECT MIN(data_validade) FROM lotes
+            WHERE produto_id = {ref}.produto_id AND quantidade > 0 AND data_validade IS NOT NULL
+        ), data_validade)
+        WHERE id = {ref}.produto_id;
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_lotes_insert AFTER INSERT ON lotes
+        BEGIN
+            UPDATE produtos SET quantidade = quantidade + NEW.quantidade WHERE id = NEW.produto_id;
+            {validade_mais_proxima.format(ref="NEW")}
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_lotes_update AFTER UPDATE OF quantidade ON lotes
+        BEGIN
+            UPDATE produtos SET quantidade = quantidade + NEW.quantidade - OLD.quantidade WHERE id = NEW.produto_id;
+            {validade_mais_proxima.format(ref="NEW")}
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_lotes_delete AFTER DELETE ON lotes
+        BEGIN
+            UPDATE produtos SET quantidade = MAX(quantidade - OLD.quantidade, 0) WHERE id = OLD.produto_id;
+            {validade_mais_proxima.format(ref="OLD")}
+        END;
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_delete_lotes AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM lotes WHERE produto_id = OLD.id;
+        END;
+    """)
+
+    # 1.3.2. Locais de estoque (loja, quiosque, venda porta a porta). 'estoque_locais' guarda a
+    # quantidade de cada produto em cada local, com chave (local, produto): a visão de um local
+    # lê só as suas linhas. produtos.quantidade continua sendo o total; o local principal fica
+    # com o que não está nos demais (total - outros locais), recalculado por trigger sempre que
+    # o total ou o estoque de outro local muda. locais.unidades é somado incrementalmente.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS locais (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL UNIQUE,
+            ativo INTEGER NOT NULL DEFAULT 1,
+            unidades INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    cursor.execute("INSERT OR IGNORE INTO locais (id, nome) VALUES (?, ?)", (LOCAL_PRINCIPAL, NOME_LOCAL_PRINCIPAL))
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'estoque_locais'")
+    estoque_locais_existia = cursor.fetchone() is not None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS estoque_locais (
+            local_id INTEGER NOT NULL,
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL CONSTRAINT estoque_local_nao_negativo CHECK (quantidade >= 0),
+            PRIMARY KEY (local_id, produto_id)
+        ) WITHOUT ROWID;
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_estoque_locais_produto ON estoque_locais (produto_id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transferencias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            origem_id INTEGER NOT NULL,
+            destino_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            usuario TEXT,
+            em TEXT NOT NULL
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transferencias_produto ON transferencias (produto_id, id)")
+
+    for operacao, delta in (("INSERT", "NEW.quantidade"), ("UPDATE OF quantidade", "NEW.quantidade - OLD.quantidade"),
+                            ("DELETE", "-OLD.quantidade")):
+        referencia = "OLD" if operacao == "DELETE" else "NEW"
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_estoque_locais_total_{operacao.split()[0].lower()}
+            AFTER {operacao} ON estoque_locais
+            BEGIN
+                UPDATE locais SET unidades = unidades + {delta} WHERE id = {referencia}.local_id;
+            END;
+        """)
+    if not estoque_locais_existia:
+        # Migração: todo o estoque atual fica no local principal
+        cursor.execute(
+            "INSERT INTO estoque_locais (local_id, produto_id, quantidade) SELECT ?, id, quantidade FROM produtos",
+            (LOCAL_PRINCIPAL,)
+        )
+
+    estoque_principal = f"""
+        INSERT INTO estoque_locais (local_id, produto_id, quantidade)
+        SELECT {LOCAL_PRINCIPAL}, p.id, p.quantidade - COALESCE((
+            SELECT SUM(e.quantidade) FROM estoque_locais e
+            WHERE e.produto_id = p.id AND e.local_id <> {LOCAL_PRINCIPAL}
+        ), 0)
+        FROM produtos p WHERE p.id = {{ref}}
+        ON CONFLICT(local_id, produto_id) DO UPDATE SET quantidade = excluded.quantidade;
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_estoque_principal_insert AFTER INSERT ON produtos
+        BEGIN
+            {estoque_principal.format(ref="NEW.id")}
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_estoque_principal_update AFTER UPDATE OF quantidade ON produtos
+        BEGIN
+            {estoque_principal.format(ref="NEW.id")}
+        END;
+    """)
+    for operacao in ("INSERT", "UPDATE OF quantidade", "DELETE"):
+        referencia = "OLD" if operacao == "DELETE" else "NEW"
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_estoque_locais_principal_{operacao.split()[0].lower()}
+            AFTER {operacao} ON estoque_locais
+            WHEN {referencia}.local_id <> {LOCAL_PRINCIPAL}
+            BEGIN
+                {estoque_principal.format(ref=f"{referencia}.produto_id")}
+            END;
+        """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_delete_estoque_locais AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM estoque_locais WHERE produto_id = OLD.id;
+        END;
+    """)
+
+    # 1.4. Registro de alterações (change feed): cada escrita em 'produtos' gera uma linha via trigger.
+    # As páginas comparam o último 'seq' visto para saber se outra sessão escreveu e quais IDs mudaram.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alteracoes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            operacao TEXT NOT NULL,
+            em TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+    """)
+    for operacao, referencia in (("INSERT", "NEW"), ("DELETE", "OLD")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_produtos_alteracoes_{operacao.lower()}
+            AFTER {operacao} ON produtos
+            BEGIN
+                INSERT INTO alteracoes (produto_id, operacao) VALUES ({referencia}.id, '{operacao}');
+            END;
+        """)
+
+    # 1.5. Data da última alteração de cada produto (UTC, ms) e registro permanente das remoções
+    # (tombstones), usados pela exportação incremental. Os triggers carimbam a linha; o UPDATE
+    # feito pelo próprio carimbo não gera um segundo registro em 'alteracoes'. Produtos antigos
+    # ficam com NULL (sem alteração desde a criação da coluna) e só entram na exportação completa.
+    _add_column_if_missing(cursor, "produtos", "atualizado_em", "TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_atualizado_em ON produtos (atualizado_em, id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS produtos_removidos (
+            produto_id INTEGER PRIMARY KEY,
+            removido_em TEXT NOT NULL
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_removidos_em ON produtos_removidos (removido_em)")
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_produtos_alteracoes_update'")
+    trigger_antigo = cursor.fetchone()
+    if trigger_antigo and "WHEN" not in trigger_antigo['sql']:
+        cursor.execute("DROP TRIGGER trg_produtos_alteracoes_update")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_alteracoes_update AFTER UPDATE ON produtos
+        WHEN NEW.atualizado_em IS OLD.atualizado_em
+        BEGIN
+            INSERT INTO alteracoes (produto_id, operacao) VALUES (NEW.id, 'UPDATE');
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_carimbo_insert AFTER INSERT ON produtos
+        BEGIN
+            UPDATE produtos SET atualizado_em = {AGORA_SQL} WHERE id = NEW.id;
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_carimbo_update AFTER UPDATE ON produtos
+        WHEN NEW.atualizado_em IS OLD.atualizado_em
+        BEGIN
+            UPDATE produtos SET atualizado_em = {AGORA_SQL} WHERE id = NEW.id;
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_carimbo_delete AFTER DELETE ON produtos
+        BEGIN
+            INSERT OR REPLACE INTO produtos_removidos (produto_id, removido_em) VALUES (OLD.id, {AGORA_SQL});
+        END;
+    """)
+
+    # 1.6. Preço de custo e histórico de preços (um registro por mudança de preço ou custo, via trigger)
+    _add_column_if_missing(cursor, "produtos", "preco_custo", "REAL NOT NULL DEFAULT 0")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS historico_precos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            preco_antigo REAL,
+            preco_novo REAL,
+            custo_antigo REAL,
+            custo_novo REAL,
+            em TEXT NOT NULL
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_historico_precos_produto ON historico_precos (produto_id, em)")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_historico_precos AFTER UPDATE OF preco, preco_custo ON produtos
+        WHEN NEW.preco IS NOT OLD.preco OR NEW.preco_custo IS NOT OLD.preco_custo
+        BEGIN
+            INSERT INTO historico_precos (produto_id, preco_antigo, preco_novo, custo_antigo, custo_novo, em)
+            VALUES (NEW.id, OLD.preco, NEW.preco, OLD.preco_custo, NEW.preco_custo, {AGORA_SQL});
+        END;
+    """)
+
     # 2. Cria a tabela 'users'
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -106,136 +485,1882 @@ def create_tables():
         );
     """)
     
-    # 3. Cria um usuário admin padrão se ele não existir (Senha: "123")
+    # 3. Cria a tabela 'vendas' (registro de cada venda) e as tabelas de resumo do dashboard.
+    # Os resumos são atualizados de forma incremental a cada venda, então o dashboard
+    # nunca precisa varrer o histórico completo.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vendas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            preco_unitario REAL NOT NULL,
+            data_venda TEXT NOT NULL
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vendas_resumo_dia (
+            dia TEXT PRIMARY KEY,
+            num_vendas INTEGER NOT NULL DEFAULT 0,
+            unidades INTEGER NOT NULL DEFAULT 0,
+            receita REAL NOT NULL DEFAULT 0
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vendas_resumo_produto (
+            produto_id INTEGER PRIMARY KEY,
+            nome TEXT,
+            marca TEXT,
+            tipo TEXT,
+            unidades INTEGER NOT NULL DEFAULT 0,
+            receita REAL NOT NULL DEFAULT 0,
+            ultima_venda TEXT
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vendas_resumo_marca_tipo (
+            marca TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            unidades INTEGER NOT NULL DEFAULT 0,
+            receita REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (marca, tipo)
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_produto ON vendas (produto_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_data ON vendas (data_venda, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_resumo_produto_unidades ON vendas_resumo_produto (unidades DESC)")
+
+    # 3.0. Custo no momento da venda (para margem e lucro); vendas antigas ficam com custo 0
+    _add_column_if_missing(cursor, "vendas", "custo_unitario", "REAL NOT NULL DEFAULT 0")
+    for tabela in ("vendas_resumo_dia", "vendas_resumo_produto", "vendas_resumo_marca_tipo"):
+        _add_column_if_missing(cursor, tabela, "custo", "REAL NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_resumo_produto_lucro ON vendas_resumo_produto ((receita - custo) DESC)")
+
+    # 3.1. Operações em massa (preço/estoque por filtro) com os valores anteriores, para desfazer
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alteracoes_massa (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            valor REAL NOT NULL,
+            filtros TEXT,
+            usuario TEXT,
+            total_produtos INTEGER NOT NULL DEFAULT 0,
+            criado_em TEXT NOT NULL,
+            desfeita_em TEXT
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alteracoes_massa_itens (
+            alteracao_id INTEGER NOT NULL,
+            produto_id INTEGER NOT NULL,
+            preco_antigo REAL,
+            preco_novo REAL,
+            quantidade_antiga INTEGER,
+            quantidade_nova INTEGER,
+            PRIMARY KEY (alteracao_id, produto_id)
+        );
+    """)
+    # Lotes movimentados por uma alteração de estoque (negativo = consumido, positivo = lote criado),
+    # para o desfazer devolver as unidades aos mesmos lotes, com as mesmas validades
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alteracoes_massa_lotes (
+            alteracao_id INTEGER NOT NULL,
+            lote_id INTEGER NOT NULL,
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (alteracao_id, lote_id)
+        );
+    """)
+
+    # 3.2. Clientes. Os totais (compras, unidades, valor gasto) são somados a cada venda,
+    # como os resumos do dashboard; o nome é NOCASE para a busca por prefixo usar o índice.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL COLLATE NOCASE,
+            telefone TEXT,
+            observacoes TEXT,
+            criado_em TEXT NOT NULL,
+            num_compras INTEGER NOT NULL DEFAULT 0,
+            unidades INTEGER NOT NULL DEFAULT 0,
+            total_gasto REAL NOT NULL DEFAULT 0,
+            ultima_compra TEXT
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nome ON clientes (nome)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_clientes_telefone ON clientes (telefone) WHERE telefone IS NOT NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_total ON clientes (total_gasto DESC)")
+    _add_column_if_missing(cursor, "vendas", "cliente_id", "INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_cliente ON vendas (cliente_id, id) WHERE cliente_id IS NOT NULL")
+
+    # 4. Cria a tabela 'jobs' (tarefas em segundo plano executadas por utils/jobs.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            usuario TEXT,
+            status TEXT NOT NULL DEFAULT 'pendente',
+            progresso REAL NOT NULL DEFAULT 0,
+            mensagem TEXT,
+            resultado TEXT,
+            arquivo TEXT,
+            cancelar INTEGER NOT NULL DEFAULT 0,
+            criado_em TEXT NOT NULL,
+            atualizado_em TEXT
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_usuario ON jobs (usuario, id DESC)")
+    _add_column_if_missing(cursor, "jobs", "pid", "INTEGER")  # Processo que executa a tarefa
+
+    # 5. Tabela chave/valor para metadados internos (ex.: data do último backup)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            chave TEXT PRIMARY KEY,
+            valor TEXT
+        );
+    """)
+
+    # 5.1. Auditoria: quem fez o quê, com os valores antes/depois (JSON). Gravada em lotes
+    # pela thread de audit(); os índices servem aos filtros do visualizador (mais recentes primeiro).
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS auditoria (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            em TEXT NOT NULL,
+            usuario TEXT,
+            acao TEXT NOT NULL,
+            produto_id INTEGER,
+            antes TEXT,
+            depois TEXT
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_auditoria_em ON auditoria (em)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_auditoria_usuario ON auditoria (usuario, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_auditoria_acao ON auditoria (acao, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_auditoria_produto ON auditoria (produto_id, id) WHERE produto_id IS NOT NULL")
+
+    # 6. Cria um usuário admin padrão se ele não existir (Senha: "123")
     try:
         cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
                         ("admin", hash_password("123"), "admin"))
     except sqlite3.IntegrityError:
         pass 
 
-    conn.commit()
+    conn.commit()
+    conn.close()
+
+# Garante que as tabelas sejam criadas na inicialização
+create_tables()
+
+
+# ====================================================================
+# FUNÇÕES CRUD DE PRODUTOS
+# ====================================================================
+
+def normalize_codigo_barras(codigo):
+    """Remove espaços do código de barras/SKU; códigos vazios viram None."""
+    codigo = str(codigo).strip() if codigo is not None else ""
+    return codigo or None
+
+def add_produto(nome, preco, quantidade, marca, estilo, tipo, foto=None, data_validade=None, estoque_minimo=0,
+                codigo_barras=None, lote=None, preco_custo=0, usuario=None):
+    """Adiciona um novo produto ao DB e retorna o seu ID.
+
+    A quantidade inicial entra como o primeiro lote do produto (com a validade informada).
+    usuario: quem cadastrou (vai para a auditoria).
+    """
+    try:
+        with write_transaction() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO produtos (nome, preco, quantidade, marca, estilo, tipo, foto, data_validade, estoque_minimo,
+                                      codigo_barras, preco_custo)
+                VALUES (?, ?, 0, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (nome, preco, marca, estilo, tipo, foto, data_validade, estoque_minimo or 0,
+                 normalize_codigo_barras(codigo_barras), preco_custo or 0)
+            )
+            product_id = cursor.lastrowid
+            if quantidade:
+                _insert_lote(cursor, product_id, quantidade, data_validade, lote)
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Código de barras '{codigo_barras}' já cadastrado em outro produto.")
+    audit("produto_criado", usuario, product_id, depois={
+        "nome": nome, "preco": preco, "quantidade": quantidade, "marca": marca, "estilo": estilo, "tipo": tipo,
+        "codigo_barras": normalize_codigo_barras(codigo_barras), "preco_custo": preco_custo or 0,
+    })
+    return product_id
+
+def _produto_no_local(row):
+    """Produto com a 'quantidade' do local (o total de todos os locais fica em 'quantidade_total')."""
+    produto = dict(row)
+    produto['quantidade_total'] = produto['quantidade']
+    produto['quantidade'] = produto.pop('quantidade_local')
+    return produto
+
+def get_all_produtos(include_sold=True, local_id=None):
+    """Retorna todos os produtos. Se include_sold=False, retorna apenas itens com quantidade > 0.
+
+    Com local_id, retorna os produtos daquele local, com 'quantidade' = estoque no local
+    (lê só as linhas do local em 'estoque_locais').
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if local_id is not None:
+        cursor.execute(
+            f"""
+            SELECT p.*, e.quantidade AS quantidade_local
+            FROM estoque_locais e JOIN produtos p ON p.id = e.produto_id
+            WHERE e.local_id = ? {'' if include_sold else 'AND e.quantidade > 0'}
+            ORDER BY p.nome ASC, p.id ASC
+            """,
+            (local_id,)
+        )
+        produtos = [_produto_no_local(row) for row in cursor.fetchall()]
+        conn.close()
+        return produtos
+    if include_sold:
+        cursor.execute("SELECT * FROM produtos ORDER BY nome ASC, id ASC")
+    else:
+        cursor.execute("SELECT * FROM produtos WHERE quantidade > 0 ORDER BY nome ASC, id ASC")
+        
+    produtos = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return produtos
+
+def get_produtos_vendidos():
+    """Retorna todos os produtos que foram marcados como vendidos (vendido=1)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM produtos WHERE vendido = 1 ORDER BY data_ultima_venda DESC, id DESC")
+    produtos = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return produtos
+
+def get_produto_by_codigo(codigo_barras):
+    """Busca um produto pelo código de barras/SKU (consulta direta no índice único)."""
+    codigo = normalize_codigo_barras(codigo_barras)
+    if codigo is None:
+        return None
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM produtos WHERE codigo_barras = ? COLLATE NOCASE", (codigo,))
+    produto = cursor.fetchone()
+    conn.close()
+    return dict(produto) if produto else None
+
+def get_produtos_by_ids(product_ids, local_id=None):
+    """Busca vários produtos pelo ID (usado para recarregar só o que mudou).
+
+    Com local_id, só os produtos presentes no local, com a quantidade do local.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    marcadores = ", ".join("?" for _ in product_ids)
+    if local_id is not None:
+        cursor.execute(
+            f"""
+            SELECT p.*, e.quantidade AS quantidade_local
+            FROM estoque_locais e JOIN produtos p ON p.id = e.produto_id
+            WHERE e.local_id = ? AND e.produto_id IN ({marcadores})
+            """,
+            [local_id] + product_ids
+        )
+        produtos = [_produto_no_local(row) for row in cursor.fetchall()]
+    else:
+        cursor.execute(f"SELECT * FROM produtos WHERE id IN ({marcadores})", product_ids)
+        produtos = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return produtos
+
+def get_produtos_para_repor():
+    """Retorna os produtos com quantidade igual ou abaixo do estoque mínimo (lê apenas o índice parcial)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT id, nome, marca, tipo, quantidade, estoque_minimo, estoque_minimo - quantidade AS faltam
+        FROM produtos INDEXED BY idx_produtos_reposicao
+        WHERE estoque_minimo > 0 AND quantidade <= estoque_minimo
+        ORDER BY nome ASC
+        """
+    )
+    produtos = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return produtos
+
+# --- Lotes ---
+
+def _insert_lote(cursor, product_id, quantidade, data_validade=None, lote=None):
+    cursor.execute(
+        "INSERT INTO lotes (produto_id, lote, data_validade, quantidade) VALUES (?, ?, ?, ?)",
+        (product_id, lote or None, data_validade, quantidade)
+    )
+    return cursor.lastrowid
+
+def _ajustar_estoque(cursor, product_id, delta, data_validade=None):
+    """Muda o total do produto em 'delta' unidades pelos lotes (os triggers acertam produtos.quantidade).
+
+    Entradas viram um lote de ajuste; saídas consomem os lotes que vencem primeiro (FEFO).
+    """
+    if delta > 0:
+        _insert_lote(cursor, product_id, delta, data_validade, LOTE_AJUSTE)
+    elif delta < 0:
+        _consumir_lotes_fefo(cursor, product_id, -delta)
+
+def _ajustar_estoque_massa(cursor, ajustes, params=(), alteracao_id=None):
+    """Versão em massa de _ajustar_estoque: poucas instruções para todos os produtos, sem laço em Python.
+
+    ajustes: SELECT com as colunas produto_id e delta. Retorna quantos produtos mudaram.
+    Com alteracao_id, os lotes criados e consumidos vão para 'alteracoes_massa_lotes'.
+    """
+    cursor.execute("DROP TABLE IF EXISTS temp.ajustes_estoque")
+    cursor.execute(
+        f"""
+        CREATE TEMP TABLE ajustes_estoque AS
+        SELECT a.produto_id, a.delta, p.quantidade + a.delta AS quantidade_nova
+        FROM ({ajustes}) a JOIN produtos p ON p.id = a.produto_id
+        WHERE a.delta <> 0
+        """,
+        params
+    )
+    # 1. Entradas: um lote de ajuste por produto (ids crescentes: os novos ficam acima do maior atual)
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM lotes")
+    ultimo_lote = cursor.fetchone()[0]
+    cursor.execute(
+        "INSERT INTO lotes (produto_id, lote, quantidade) SELECT produto_id, ?, delta FROM ajustes_estoque WHERE delta > 0",
+        (LOTE_AJUSTE,)
+    )
+    # 2. Saídas (FEFO): cada lote cede o que falta depois dos lotes que vencem antes dele (soma acumulada)
+    cursor.execute("DROP TABLE IF EXISTS temp.consumo_lotes")
+    cursor.execute(
+        """
+        CREATE TEMP TABLE consumo_lotes AS
+        SELECT id AS lote_id, produto_id, retirar FROM (
+            SELECT l.id, l.produto_id, MIN(l.quantidade, -a.delta - (SUM(l.quantidade) OVER (
+                PARTITION BY l.produto_id ORDER BY l.data_validade IS NULL, l.data_validade, l.id
+            ) - l.quantidade)) AS retirar
+            FROM ajustes_estoque a JOIN lotes l ON l.produto_id = a.produto_id AND l.quantidade > 0
+            WHERE a.delta < 0
+        )
+        WHERE retirar > 0
+        """
+    )
+    cursor.execute(
+        """
+        UPDATE lotes SET quantidade = lotes.quantidade - c.retirar
+        FROM consumo_lotes c WHERE lotes.id = c.lote_id
+        """
+    )
+    if alteracao_id is not None:
+        cursor.execute(
+            """
+            INSERT INTO alteracoes_massa_lotes (alteracao_id, lote_id, produto_id, quantidade)
+            SELECT ?, id, produto_id, quantidade FROM lotes WHERE id > ?
+            UNION ALL
+            SELECT ?, lote_id, produto_id, -retirar FROM consumo_lotes
+            """,
+            (alteracao_id, ultimo_lote, alteracao_id)
+        )
+    cursor.execute("DROP TABLE consumo_lotes")
+    # 3. O que os lotes não cobriram (estoque sem lote, como em _consumir_lotes_fefo) sai direto do total
+    cursor.execute(
+        """
+        UPDATE produtos SET quantidade = a.quantidade_nova
+        FROM ajustes_estoque a
+        WHERE a.produto_id = produtos.id AND produtos.quantidade <> a.quantidade_nova
+        """
+    )
+    cursor.execute("SELECT COUNT(*) FROM ajustes_estoque")
+    alterados = cursor.fetchone()[0]
+    cursor.execute("DROP TABLE ajustes_estoque")
+    return alterados
+
+def add_lote(product_id, quantidade, data_validade=None, lote=None, usuario=None):
+    """Registra a entrada de um novo lote (reposição). O total do produto é atualizado pelo trigger."""
+    if quantidade <= 0:
+        raise ValueError("A quantidade do lote deve ser positiva.")
+    with write_transaction() as cursor:
+        cursor.execute("SELECT quantidade FROM produtos WHERE id = ?", (product_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError("Produto não encontrado.")
+        lote_id = _insert_lote(cursor, product_id, quantidade, data_validade, lote)
+    audit("lote", usuario, product_id, antes={"quantidade": row['quantidade']}, depois={
+        "quantidade": row['quantidade'] + quantidade, "lote": lote or None, "data_validade": data_validade,
+    })
+    return lote_id
+
+def get_lotes(product_id, include_empty=False):
+    """Retorna os lotes do produto na ordem de saída (validade mais próxima primeiro)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT * FROM lotes
+        WHERE produto_id = ? {'' if include_empty else 'AND quantidade > 0'}
+        ORDER BY data_validade IS NULL, data_validade ASC, id ASC
+        """,
+        (product_id,)
+    )
+    lotes = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return lotes
+
+# --- Paginação por chave (keyset) ---
+# Em vez de OFFSET, cada página começa depois da última linha da página anterior. Com os
+# índices acima, a página 500 custa o mesmo que a página 1.
+
+def get_produtos_page(limit=20, after=None, include_sold=True):
+    """Retorna uma página de produtos ordenada por (nome, id).
+
+    after: tupla (nome, id) do último produto da página anterior (None = primeira página).
+    Use (ultimo['nome'], ultimo['id']) como 'after' da próxima página.
+    """
+    condicoes, params = [], []
+    if not include_sold:
+        condicoes.append("quantidade > 0")
+    if after is not None:
+        condicoes.append("(nome, id) > (?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM produtos {where} ORDER BY nome ASC, id ASC LIMIT ?", (*params, limit))
+    produtos = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return produtos
+
+def get_produtos_vendidos_page(limit=20, before=None):
+    """Página de produtos vendidos, da venda mais recente para a mais antiga.
+
+    before: tupla (data_ultima_venda, id) do último item da página anterior.
+    """
+    where, params = "", []
+    if before is not None:
+        where = "AND (data_ultima_venda, id) < (?, ?)"
+        params.extend(before)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT * FROM produtos
+        WHERE vendido = 1 {where}
+        ORDER BY data_ultima_venda DESC, id DESC LIMIT ?
+        """,
+        (*params, limit)
+    )
+    produtos = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return produtos
+
+def get_vendas_page(limit=20, before=None):
+    """Página do histórico de vendas (mais recentes primeiro), com nome e marca do produto.
+
+    before: data_venda (ISO) ou tupla (data_venda, id) da última venda da página anterior.
+    """
+    where, params = "", []
+    if isinstance(before, str):
+        where = "WHERE v.data_venda < ?"
+        params.append(before)
+    elif before is not None:
+        where = "WHERE (v.data_venda, v.id) < (?, ?)"
+        params.extend(before)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT v.*, p.nome, p.marca
+        FROM vendas v LEFT JOIN produtos p ON p.id = v.produto_id
+        {where}
+        ORDER BY v.data_venda DESC, v.id DESC LIMIT ?
+        """,
+        (*params, limit)
+    )
+    vendas = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return vendas
+
+def get_produto_by_id(product_id):
+    """Busca um produto pelo ID."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM produtos WHERE id = ?", (product_id,))
+    produto = cursor.fetchone()
+    conn.close()
+    return dict(produto) if produto else None
+
+def update_produto(product_id, nome, preco, quantidade, marca, estilo, tipo, foto, data_validade, estoque_minimo=None,
+                   codigo_barras=None, preco_custo=None, usuario=None):
+    """Atualiza um produto existente.
+
+    Se estoque_minimo, codigo_barras ou preco_custo forem None, o valor atual é mantido
+    (codigo_barras='' remove o código). Mudanças de preço/custo vão para 'historico_precos'.
+    'quantidade' é o total: a diferença entra ou sai do local principal, pelos lotes (um lote de
+    ajuste com a validade informada quando aumenta; os lotes que vencem primeiro quando diminui).
+    A validade do produto é a dos lotes: 'data_validade' só vale para o lote de ajuste, ou para o
+    produto quando nenhum lote em estoque tem validade.
+    Os campos alterados (antes/depois) vão para a auditoria, em nome de 'usuario'.
+    """
+    try:
+        with write_transaction() as cursor:
+            cursor.execute("SELECT * FROM produtos WHERE id = ?", (product_id,))
+            antes = cursor.fetchone()
+            cursor.execute(
+                """
+                UPDATE produtos SET nome=?, preco=?, marca=?, estilo=?, tipo=?, foto=?,
+                    data_validade=CASE WHEN EXISTS (
+                        SELECT 1 FROM lotes
+                        WHERE produto_id = produtos.id AND quantidade > 0 AND data_validade IS NOT NULL
+                    ) THEN data_validade ELSE ? END,
+                    estoque_minimo=COALESCE(?, estoque_minimo),
+                    codigo_barras=CASE WHEN ? IS NULL THEN codigo_barras ELSE ? END,
+                    preco_custo=COALESCE(?, preco_custo)
+                WHERE id=?
+                """,
+                (nome, preco, marca, estilo, tipo, foto, data_validade, estoque_minimo,
+                 codigo_barras, normalize_codigo_barras(codigo_barras), preco_custo, product_id)
+            )
+            if antes is not None:
+                _ajustar_estoque(cursor, product_id, int(quantidade) - antes['quantidade'], data_validade)
+            cursor.execute("SELECT * FROM produtos WHERE id = ?", (product_id,))
+            depois = cursor.fetchone()
+    except sqlite3.IntegrityError as e:
+        if "estoque_local_nao_negativo" in str(e):
+            raise ValueError("A quantidade total não pode ser menor que o estoque dos outros locais. "
+                             "Transfira as unidades para a loja antes de reduzir.")
+        if "produtos.codigo_barras" in str(e):
+            raise ValueError(f"Código de barras '{codigo_barras}' já cadastrado em outro produto.")
+        raise
+    if antes is not None:
+        campos_antes, campos_depois = _diferencas(dict(antes), {
+            k: v for k, v in dict(depois).items() if k not in ("atualizado_em", "vendido", "data_ultima_venda")
+        })
+        if campos_depois:
+            audit("produto_editado", usuario, product_id, antes=campos_antes, depois=campos_depois)
+
+def delete_produto(product_id, remove_foto=True, usuario=None):
+    """Remove um produto e retorna o nome da sua foto.
+
+    Com remove_foto=False a foto fica no disco, para ser apagada depois por
+    remove_product_photo (ex.: em uma tarefa de segundo plano).
+    """
+    with write_transaction() as cursor:
+        # 1. Recupera o produto (foto e dados para a auditoria)
+        cursor.execute("SELECT * FROM produtos WHERE id = ?", (product_id,))
+        row = cursor.fetchone()
+        foto = row['foto'] if row else None
+
+        # 2. Deleta do banco de dados
+        cursor.execute("DELETE FROM produtos WHERE id = ?", (product_id,))
+
+    if row is not None:
+        audit("produto_removido", usuario, product_id, antes=dict(row))
+
+    if remove_foto and foto:
+        remove_product_photo(foto)
+    return foto
+
+def remove_product_photo(foto, progress=None):
+    """Apaga o arquivo de foto em ASSETS_DIR, desde que nenhum produto ainda o utilize.
+
+    Retorna True se o arquivo foi removido.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM produtos WHERE foto = ? LIMIT 1", (foto,))
+    em_uso = cursor.fetchone() is not None
+    conn.close()
+
+    removed = False
+    if not em_uso:
+        try:
+            os.remove(os.path.join(ASSETS_DIR, foto))
+            removed = True
+        except FileNotFoundError:
+            pass
+    if progress:
+        progress(1, 1)
+    return removed
+
+def mark_produto_as_sold(product_id, quantity_sold=1, local_id=None, usuario=None, cliente_id=None):
+    """Baixa o estoque (lotes que vencem primeiro saem primeiro), registra a venda e
+    atualiza os resumos do dashboard (tudo em uma transação).
+
+    local_id: local de onde sai a mercadoria (None = local principal).
+    cliente_id: cliente da venda (opcional); os totais do cliente são atualizados na mesma transação."""
+    with write_transaction() as cursor:
+        venda = _vender(cursor, product_id, quantity_sold, datetime.now().isoformat(), local_id, cliente_id)
+    _auditar_venda(usuario, venda)
+
+def _auditar_venda(usuario, venda):
+    audit("venda", usuario, venda['produto_id'], antes={"quantidade": venda['quantidade'] + venda['vendidas']},
+          depois={"quantidade": venda['quantidade'], "vendidas": venda['vendidas'],
+                  "preco": venda['preco'], "local_id": venda['local_id'], "cliente_id": venda['cliente_id']})
+
+def sell_produtos_batch(itens, local_id=None, usuario=None, cliente_id=None):
+    """Vende vários itens em uma única transação (tudo ou nada).
+
+    itens: lista de dicts com 'produto_id' ou 'codigo_barras', 'quantidade' (padrão 1) e,
+    opcionalmente, 'local_id' (padrão: o local_id da chamada ou o local principal).
+    cliente_id: cliente de todos os itens (conta como uma compra).
+    Retorna os produtos atualizados, na ordem dos itens. Levanta ValueError (e nada é
+    vendido) se algum código não existir ou algum item não tiver estoque.
+    """
+    data_venda = datetime.now().isoformat()
+    ids, vendas = [], []
+    with write_transaction() as cursor:
+        for item in itens:
+            product_id = item.get('produto_id')
+            if product_id is None:
+                codigo = normalize_codigo_barras(item.get('codigo_barras'))
+                cursor.execute("SELECT id FROM produtos WHERE codigo_barras = ? COLLATE NOCASE", (codigo,))
+                row = cursor.fetchone()
+                if not row:
+                    raise ValueError(f"Código '{item.get('codigo_barras')}' não encontrado.")
+                product_id = row['id']
+            quantidade = int(item.get('quantidade', 1))
+            if quantidade <= 0:
+                raise ValueError("A quantidade deve ser maior que zero.")
+            try:
+                vendas.append(_vender(cursor, product_id, quantidade, data_venda, item.get('local_id', local_id), cliente_id))
+            except ValueError as e:
+                raise ValueError(f"Produto {product_id}: {e}")
+            ids.append(product_id)
+    for venda in vendas:
+        _auditar_venda(usuario, venda)
+
+    produtos = {p['id']: p for p in get_produtos_by_ids(ids)}
+    return [produtos[product_id] for product_id in ids]
+
+def _vender(cursor, product_id, quantity_sold, data_venda, local_id=None, cliente_id=None):
+    """Uma venda dentro da transação de quem chama: UPDATE protegido, baixa FEFO e registro.
+
+    Retorna os dados da venda para a auditoria (quantidade total após a baixa, unidades, preço e local).
+    """
+    # 0. Estoque do local. O do local principal é derivado (total - outros locais), então só é
+    # conferido; nos demais, a baixa é um UPDATE protegido. O trigger acerta o principal depois.
+    local_id = local_id or LOCAL_PRINCIPAL
+    if local_id == LOCAL_PRINCIPAL:
+        cursor.execute(
+            "SELECT quantidade FROM estoque_locais WHERE local_id = ? AND produto_id = ?", (local_id, product_id)
+        )
+        row = cursor.fetchone()
+        if row is None or row['quantidade'] < quantity_sold:
+            raise ValueError("Estoque insuficiente para esta venda.")
+    else:
+        cursor.execute(
+            """
+            UPDATE estoque_locais SET quantidade = quantidade - ?
+            WHERE local_id = ? AND produto_id = ? AND quantidade >= ?
+            """,
+            (quantity_sold, local_id, product_id, quantity_sold)
+        )
+        if cursor.rowcount == 0:
+            raise ValueError("Estoque insuficiente neste local.")
+
+    # 1. Prossegue somente se houver estoque suficiente (UPDATE protegido, sem leitura prévia)
+    cursor.execute(
+        """
+        UPDATE produtos SET vendido = 1, data_ultima_venda = ?
+        WHERE id = ? AND quantidade >= ?
+        """,
+        (data_venda, product_id, quantity_sold)
+    )
+    if cursor.rowcount == 0:
+        raise ValueError("Estoque insuficiente para esta venda.")
+
+    # 2. Baixa dos lotes (FEFO); os triggers de 'lotes' descontam de produtos.quantidade
+    _consumir_lotes_fefo(cursor, product_id, quantity_sold)
+
+    # 3. Registra a venda e atualiza os resumos
+    cursor.execute("SELECT nome, preco, preco_custo, marca, tipo, quantidade FROM produtos WHERE id = ?", (product_id,))
+    produto = dict(cursor.fetchone())
+    _registrar_venda(cursor, product_id, produto, quantity_sold, data_venda, cliente_id)
+    return {"produto_id": product_id, "quantidade": produto['quantidade'], "vendidas": quantity_sold,
+            "preco": produto['preco'], "local_id": local_id, "cliente_id": cliente_id}
+
+def _consumir_lotes_fefo(cursor, product_id, quantidade):
+    """Consome 'quantidade' dos lotes do produto, do que vence primeiro ao que vence por último.
+
+    Lotes sem validade saem por último. O que faltar (estoque sem lote, de bancos anteriores aos
+    lotes) é descontado direto de produtos.quantidade.
+    """
+    restante = quantidade
+    cursor.execute(
+        """
+        SELECT id, quantidade FROM lotes
+        WHERE produto_id = ? AND quantidade > 0
+        ORDER BY data_validade IS NULL, data_validade ASC, id ASC
+        """,
+        (product_id,)
+    )
+    for lote in cursor.fetchall():
+        if restante <= 0:
+            break
+        retirar = min(restante, lote['quantidade'])
+        cursor.execute("UPDATE lotes SET quantidade = quantidade - ? WHERE id = ?", (retirar, lote['id']))
+        restante -= retirar
+
+    if restante > 0:
+        cursor.execute("UPDATE produtos SET quantidade = quantidade - ? WHERE id = ?", (restante, product_id))
+
+def _registrar_venda(cursor, product_id, produto, quantidade, data_venda, cliente_id=None):
+    """Insere a venda em 'vendas' e soma seus valores nas tabelas de resumo (UPSERT incremental)."""
+    preco = float(produto.get('preco') or 0.0)
+    custo_unitario = float(produto.get('preco_custo') or 0.0)
+    receita = preco * quantidade
+    custo = custo_unitario * quantidade
+
+    cursor.execute(
+        """
+        INSERT INTO vendas (produto_id, quantidade, preco_unitario, custo_unitario, data_venda, cliente_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (product_id, quantidade, preco, custo_unitario, data_venda, cliente_id)
+    )
+    cursor.execute(
+        """
+        INSERT INTO vendas_resumo_dia (dia, num_vendas, unidades, receita, custo) VALUES (?, 1, ?, ?, ?)
+        ON CONFLICT(dia) DO UPDATE SET
+            num_vendas = num_vendas + 1,
+            unidades = unidades + excluded.unidades,
+            receita = receita + excluded.receita,
+            custo = custo + excluded.custo
+        """,
+        (data_venda[:10], quantidade, receita, custo)
+    )
+    cursor.execute(
+        """
+        INSERT INTO vendas_resumo_produto (produto_id, nome, marca, tipo, unidades, receita, custo, ultima_venda)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(produto_id) DO UPDATE SET
+            nome = excluded.nome,
+            marca = excluded.marca,
+            tipo = excluded.tipo,
+            unidades = unidades + excluded.unidades,
+            receita = receita + excluded.receita,
+            custo = custo + excluded.custo,
+            ultima_venda = excluded.ultima_venda
+        """,
+        (product_id, produto.get('nome'), produto.get('marca'), produto.get('tipo'), quantidade, receita, custo, data_venda)
+    )
+    cursor.execute(
+        """
+        INSERT INTO vendas_resumo_marca_tipo (marca, tipo, unidades, receita, custo) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(marca, tipo) DO UPDATE SET
+            unidades = unidades + excluded.unidades,
+            receita = receita + excluded.receita,
+            custo = custo + excluded.custo
+        """,
+        (produto.get('marca') or 'Outra', produto.get('tipo') or 'Outro', quantidade, receita, custo)
+    )
+    if cliente_id is not None:
+        # Itens da mesma venda em lote têm a mesma data_venda: contam como uma compra só
+        cursor.execute(
+            """
+            UPDATE clientes SET
+                num_compras = num_compras + (ultima_compra IS NOT ?),
+                unidades = unidades + ?,
+                total_gasto = total_gasto + ?,
+                ultima_compra = ?
+            WHERE id = ?
+            """,
+            (data_venda, quantidade, receita, data_venda, cliente_id)
+        )
+        if cursor.rowcount == 0:
+            raise ValueError("Cliente não encontrado.")
+
+def sell_produto_by_codigo(codigo_barras, quantity_sold=1, local_id=None, usuario=None, cliente_id=None):
+    """Vende pelo código de barras: uma busca no índice e um UPDATE protegido.
+
+    Retorna o produto (com a quantidade já atualizada). Levanta ValueError se o código
+    não existir ou se não houver estoque (no local informado; None = local principal).
+    """
+    codigo = normalize_codigo_barras(codigo_barras)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM produtos WHERE codigo_barras = ? COLLATE NOCASE", (codigo,))
+    row = cursor.fetchone()
+    conn.close()
+    if not row:
+        raise ValueError(f"Código '{codigo_barras}' não encontrado.")
+
+    mark_produto_as_sold(row['id'], quantity_sold, local_id, usuario, cliente_id)
+    if local_id is not None:
+        return get_produtos_by_ids([row['id']], local_id)[0]
+    return get_produto_by_id(row['id'])
+
+# ====================================================================
+# LOCAIS DE ESTOQUE E TRANSFERÊNCIAS
+# ====================================================================
+
+def get_locais(include_inactive=False):
+    """Retorna os locais de estoque (principal primeiro) com o total de unidades de cada um."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT * FROM locais {'' if include_inactive else 'WHERE ativo = 1'} ORDER BY id <> ?, nome ASC",
+        (LOCAL_PRINCIPAL,)
+    )
+    locais = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return locais
+
+def add_local(nome, usuario=None):
+    """Cadastra um local de estoque e retorna o seu ID."""
+    nome = (nome or "").strip()
+    if not nome:
+        raise ValueError("Informe o nome do local.")
+    try:
+        with write_transaction() as cursor:
+            cursor.execute("INSERT INTO locais (nome) VALUES (?)", (nome,))
+            local_id = cursor.lastrowid
+    except sqlite3.IntegrityError:
+        raise ValueError(f"O local '{nome}' já existe.")
+    audit("local", usuario, depois={"local_id": local_id, "nome": nome, "ativo": 1})
+    return local_id
+
+def set_local_ativo(local_id, ativo, usuario=None):
+    """Ativa ou desativa um local. Só é possível desativar um local vazio (e nunca o principal)."""
+    with write_transaction() as cursor:
+        if not ativo:
+            if local_id == LOCAL_PRINCIPAL:
+                raise ValueError("O local principal não pode ser desativado.")
+            cursor.execute("SELECT unidades FROM locais WHERE id = ?", (local_id,))
+            row = cursor.fetchone()
+            if row and row['unidades'] > 0:
+                raise ValueError("Transfira o estoque do local antes de desativá-lo.")
+        cursor.execute("UPDATE locais SET ativo = ? WHERE id = ?", (1 if ativo else 0, local_id))
+    audit("local", usuario, antes={"local_id": local_id, "ativo": 0 if ativo else 1},
+          depois={"local_id": local_id, "ativo": 1 if ativo else 0})
+
+def get_estoque_por_local(product_id):
+    """Quantidade do produto em cada local onde ele tem (ou já teve) estoque."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT e.local_id, l.nome, e.quantidade
+        FROM estoque_locais e JOIN locais l ON l.id = e.local_id
+        WHERE e.produto_id = ?
+        ORDER BY e.local_id <> ?, l.nome ASC
+        """,
+        (product_id, LOCAL_PRINCIPAL)
+    )
+    estoque = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return estoque
+
+def transfer_estoque(product_id, origem_id, destino_id, quantidade, usuario=None):
+    """Move 'quantidade' do produto de um local para outro (em uma transação) e retorna o ID da transferência.
+
+    O total do produto não muda. Levanta ValueError se a origem não tiver estoque suficiente.
+    """
+    quantidade = int(quantidade)
+    if quantidade <= 0:
+        raise ValueError("A quantidade deve ser maior que zero.")
+    if origem_id == destino_id:
+        raise ValueError("Origem e destino devem ser diferentes.")
+
+    with write_transaction() as cursor:
+        cursor.execute("SELECT id FROM locais WHERE id IN (?, ?) AND ativo = 1", (origem_id, destino_id))
+        if len(cursor.fetchall()) != 2:
+            raise ValueError("Local de origem ou destino inválido.")
+
+        # 1. Saída da origem (o principal é derivado: só confere; os demais, UPDATE protegido)
+        if origem_id == LOCAL_PRINCIPAL:
+            cursor.execute(
+                "SELECT quantidade FROM estoque_locais WHERE local_id = ? AND produto_id = ?", (origem_id, product_id)
+            )
+            row = cursor.fetchone()
+            disponivel = row['quantidade'] if row else 0
+        else:
+            cursor.execute(
+                """
+                UPDATE estoque_locais SET quantidade = quantidade - ?
+                WHERE local_id = ? AND produto_id = ? AND quantidade >= ?
+                """,
+                (quantidade, origem_id, product_id, quantidade)
+            )
+            disponivel = quantidade if cursor.rowcount else 0
+        if disponivel < quantidade:
+            raise ValueError("Estoque insuficiente no local de origem.")
+
+        # 2. Entrada no destino; o trigger recalcula o local principal
+        if destino_id != LOCAL_PRINCIPAL:
+            cursor.execute(
+                """
+                INSERT INTO estoque_locais (local_id, produto_id, quantidade) VALUES (?, ?, ?)
+                ON CONFLICT(local_id, produto_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+                """,
+                (destino_id, product_id, quantidade)
+            )
+
+        # 3. Toca o produto: registro de alterações (as sessões recarregam) e carimbo atualizado_em
+        cursor.execute("UPDATE produtos SET quantidade = quantidade WHERE id = ?", (product_id,))
+        cursor.execute(
+            """
+            INSERT INTO transferencias (produto_id, origem_id, destino_id, quantidade, usuario, em)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (product_id, origem_id, destino_id, quantidade, usuario, datetime.now().isoformat())
+        )
+        transferencia_id = cursor.lastrowid
+    audit("transferencia", usuario, product_id, depois={
+        "transferencia_id": transferencia_id, "origem_id": origem_id, "destino_id": destino_id, "quantidade": quantidade,
+    })
+    return transferencia_id
+
+def get_transferencias(product_id=None, limit=20):
+    """Últimas transferências (de um produto ou de todos), com os nomes do produto e dos locais."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT t.*, p.nome AS produto, o.nome AS origem, d.nome AS destino
+        FROM transferencias t
+        LEFT JOIN produtos p ON p.id = t.produto_id
+        LEFT JOIN locais o ON o.id = t.origem_id
+        LEFT JOIN locais d ON d.id = t.destino_id
+        WHERE ? IS NULL OR t.produto_id = ?
+        ORDER BY t.id DESC LIMIT ?
+        """,
+        (product_id, product_id, limit)
+    )
+    transferencias = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return transferencias
+
+# ====================================================================
+# CLIENTES
+# Busca por prefixo do telefone (só dígitos) ou do nome, sempre pelo índice.
+# Histórico e valor gasto não somam as vendas: os totais ficam no próprio
+# cadastro (atualizados por _registrar_venda) e o histórico é lido pelo
+# índice (cliente_id, id), página a página.
+# ====================================================================
+
+LIMITE_BUSCA_CLIENTES = 10
+
+def normalize_telefone(telefone):
+    """Só os dígitos do telefone; vazio vira None."""
+    digitos = "".join(c for c in str(telefone or "") if c.isdigit())
+    return digitos or None
+
+def add_cliente(nome, telefone=None, observacoes=None, usuario=None):
+    """Cadastra um cliente e retorna o seu ID. O telefone (se informado) não pode se repetir."""
+    nome = (nome or "").strip()
+    if not nome:
+        raise ValueError("Informe o nome do cliente.")
+    telefone = normalize_telefone(telefone)
+    try:
+        with write_transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO clientes (nome, telefone, observacoes, criado_em) VALUES (?, ?, ?, ?)",
+                (nome, telefone, (observacoes or "").strip() or None, datetime.now().isoformat())
+            )
+            cliente_id = cursor.lastrowid
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Telefone '{telefone}' já cadastrado em outro cliente.")
+    audit("cliente_criado", usuario, depois={"cliente_id": cliente_id, "nome": nome, "telefone": telefone})
+    return cliente_id
+
+def update_cliente(cliente_id, nome, telefone=None, observacoes=None, usuario=None):
+    """Atualiza nome, telefone e observações do cliente (os totais de compras não mudam)."""
+    nome = (nome or "").strip()
+    if not nome:
+        raise ValueError("Informe o nome do cliente.")
+    depois = {"nome": nome, "telefone": normalize_telefone(telefone), "observacoes": (observacoes or "").strip() or None}
+    try:
+        with write_transaction() as cursor:
+            cursor.execute("SELECT nome, telefone, observacoes FROM clientes WHERE id = ?", (cliente_id,))
+            antes = cursor.fetchone()
+            if antes is None:
+                raise ValueError("Cliente não encontrado.")
+            cursor.execute(
+                "UPDATE clientes SET nome = ?, telefone = ?, observacoes = ? WHERE id = ?",
+                (depois["nome"], depois["telefone"], depois["observacoes"], cliente_id)
+            )
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Telefone '{depois['telefone']}' já cadastrado em outro cliente.")
+    campos_antes, campos_depois = _diferencas(dict(antes), depois)
+    if campos_depois:
+        audit("cliente_editado", usuario, antes={"cliente_id": cliente_id, **campos_antes},
+              depois={"cliente_id": cliente_id, **campos_depois})
+
+def get_cliente(cliente_id):
+    """Busca um cliente pelo ID (com os totais de compras)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM clientes WHERE id = ?", (cliente_id,))
+    cliente = cursor.fetchone()
+    conn.close()
+    return dict(cliente) if cliente else None
+
+def buscar_clientes(termo=None, limit=LIMITE_BUSCA_CLIENTES):
+    """Clientes cujo telefone (se o termo tiver só dígitos e símbolos) ou nome começa com 'termo'.
+
+    Sem termo, retorna os que mais gastaram.
+    """
+    termo = (termo or "").strip()
+    telefone = normalize_telefone(termo)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if not termo:
+        cursor.execute("SELECT * FROM clientes ORDER BY total_gasto DESC LIMIT ?", (limit,))
+    elif telefone and not any(c.isalpha() for c in termo):
+        # GLOB com prefixo literal vira uma faixa no índice do telefone
+        cursor.execute(
+            "SELECT * FROM clientes WHERE telefone GLOB ? ORDER BY telefone LIMIT ?", (f"{telefone}*", limit)
+        )
+    else:
+        # LIKE com prefixo sobre coluna NOCASE também usa o índice; curingas digitados são ignorados
+        prefixo = termo.replace("%", "").replace("_", "")
+        cursor.execute("SELECT * FROM clientes WHERE nome LIKE ? ORDER BY nome LIMIT ?", (f"{prefixo}%", limit))
+    clientes = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return clientes
+
+def get_compras_cliente(cliente_id, limit=20, before=None):
+    """Compras do cliente, mais recentes primeiro, com o nome do produto.
+
+    before: ID da última venda da página anterior.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT v.*, COALESCE(p.nome, r.nome) AS nome, COALESCE(p.marca, r.marca) AS marca,
+               v.quantidade * v.preco_unitario AS total
+        FROM vendas v
+        LEFT JOIN produtos p ON p.id = v.produto_id
+        LEFT JOIN vendas_resumo_produto r ON r.produto_id = v.produto_id
+        WHERE v.cliente_id = ? AND v.id < ?
+        ORDER BY v.id DESC LIMIT ?
+        """,
+        (cliente_id, before if before is not None else 2 ** 63 - 1, limit)
+    )
+    compras = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return compras
+
+# ====================================================================
+# OPERAÇÕES EM MASSA (PREÇO/ESTOQUE POR MARCA, ESTILO E TIPO)
+# Cada operação é um único UPDATE por filtro, numa transação, e guarda
+# os valores anteriores em 'alteracoes_massa_itens' para poder desfazer.
+# Ajustes de estoque passam pelos lotes (_ajustar_estoque_massa).
+# ====================================================================
+
+TIPOS_ALTERACAO_MASSA = {
+    "preco_percentual": "Preço (%)",
+    "preco_absoluto": "Preço (R$)",
+    "estoque": "Estoque (unidades)",
+}
+
+def _bulk_where(marca=None, estilo=None, tipo=None):
+    condicoes, params = [], []
+    for coluna, valor in (("marca", marca), ("estilo", estilo), ("tipo", tipo)):
+        if valor:
+            condicoes.append(f"{coluna} = ?")
+            params.append(valor)
+    return (" AND ".join(condicoes) or "1 = 1"), params
+
+# Estoque do local principal de 'produtos.id': o único que os ajustes em massa podem baixar
+# (o dos outros locais só sai por venda ou transferência)
+_ESTOQUE_PRINCIPAL_SQL = f"""COALESCE((
+    SELECT e.quantidade FROM estoque_locais e WHERE e.local_id = {LOCAL_PRINCIPAL} AND e.produto_id = produtos.id
+), 0)"""
+
+def _bulk_new_values(tipo_alteracao, valor):
+    """Expressões SQL (com parâmetros) do novo preço e da nova quantidade.
+
+    Reduções de estoque param no que há no local principal.
+    """
+    if tipo_alteracao == "preco_percentual":
+        return "ROUND(MAX(preco * (1 + ? / 100.0), 0.01), 2)", [valor], "quantidade", []
+    if tipo_alteracao == "preco_absoluto":
+        return "ROUND(MAX(preco + ?, 0.01), 2)", [valor], "quantidade", []
+    if tipo_alteracao == "estoque":
+        return "preco", [], f"quantidade + MAX(?, -{_ESTOQUE_PRINCIPAL_SQL})", [int(valor)]
+    raise ValueError(f"Tipo de alteração inválido: {tipo_alteracao}")
+
+def preview_bulk_update(tipo_alteracao, valor, marca=None, estilo=None, tipo=None, limit=10):
+    """Retorna (quantidade de produtos afetados, amostra com valores antigos e novos)."""
+    where, params = _bulk_where(marca, estilo, tipo)
+    expr_preco, params_preco, expr_qtd, params_qtd = _bulk_new_values(tipo_alteracao, valor)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM produtos WHERE {where}", params)
+    total = cursor.fetchone()[0]
+    cursor.execute(
+        f"""
+        SELECT id, nome, preco AS preco_antigo, {expr_preco} AS preco_novo,
+               quantidade AS quantidade_antiga, {expr_qtd} AS quantidade_nova
+        FROM produtos WHERE {where} ORDER BY nome ASC LIMIT ?
+        """,
+        (*params_preco, *params_qtd, *params, limit)
+    )
+    amostra = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return total, amostra
+
+def _erro_estoque_massa(erro):
+    """Converte a violação do CHECK de estoque por local em ValueError (mensagem para a página)."""
+    if "estoque_local_nao_negativo" in str(erro):
+        return ValueError("O ajuste deixaria um local com estoque negativo. Transfira as unidades para a "
+                          f"'{NOME_LOCAL_PRINCIPAL}' antes de reduzir.")
+    return erro
+
+def apply_bulk_update(tipo_alteracao, valor, marca=None, estilo=None, tipo=None, usuario=None):
+    """Aplica a alteração a todos os produtos do filtro. Retorna (ID da alteração, produtos afetados).
+
+    Reduções de estoque só retiram o que está no local principal. Levanta ValueError se a
+    alteração não puder ser aplicada.
+    """
+    where, params = _bulk_where(marca, estilo, tipo)
+    expr_preco, params_preco, expr_qtd, params_qtd = _bulk_new_values(tipo_alteracao, valor)
+    filtros = json.dumps({"marca": marca, "estilo": estilo, "tipo": tipo}, ensure_ascii=False)
+
+    try:
+        with write_transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO alteracoes_massa (tipo, valor, filtros, usuario, criado_em) VALUES (?, ?, ?, ?, ?)",
+                (tipo_alteracao, valor, filtros, usuario, datetime.now().isoformat())
+            )
+            alteracao_id = cursor.lastrowid
+
+            # 1. Guarda valores antigos e novos de todos os produtos do filtro (INSERT ... SELECT)
+            cursor.execute(
+                f"""
+                INSERT INTO alteracoes_massa_itens
+                    (alteracao_id, produto_id, preco_antigo, preco_novo, quantidade_antiga, quantidade_nova)
+                SELECT ?, id, preco, {expr_preco}, quantidade, {expr_qtd} FROM produtos WHERE {where}
+                """,
+                (alteracao_id, *params_preco, *params_qtd, *params)
+            )
+            total = cursor.rowcount
+
+            # 2. Um único UPDATE (preço) ou ajuste pelos lotes (estoque) para todo o filtro
+            if tipo_alteracao == "estoque":
+                _ajustar_estoque_massa(
+                    cursor,
+                    """
+                    SELECT produto_id, quantidade_nova - quantidade_antiga AS delta
+                    FROM alteracoes_massa_itens WHERE alteracao_id = ?
+                    """,
+                    (alteracao_id,),
+                    alteracao_id=alteracao_id
+                )
+            else:
+                cursor.execute(f"UPDATE produtos SET preco = {expr_preco} WHERE {where}", (*params_preco, *params))
+            cursor.execute("UPDATE alteracoes_massa SET total_produtos = ? WHERE id = ?", (total, alteracao_id))
+    except sqlite3.IntegrityError as e:
+        raise _erro_estoque_massa(e)
+    # Uma entrada por operação: os valores de cada produto já ficam em 'alteracoes_massa_itens'
+    audit("alteracao_massa", usuario, depois={
+        "alteracao_id": alteracao_id, "tipo": tipo_alteracao, "valor": valor, "filtros": json.loads(filtros),
+        "total_produtos": total,
+    })
+    return alteracao_id, total
+
+def undo_bulk_update(alteracao_id, usuario=None):
+    """Desfaz uma alteração em massa. Retorna quantos produtos foram restaurados.
+
+    Preços só voltam nos produtos cujo preço não mudou depois da operação. Ajustes de
+    estoque são revertidos pela diferença aplicada (vendas feitas depois são preservadas); a
+    reversão de uma entrada só retira o que ainda está no local principal. As unidades voltam
+    aos lotes que a operação movimentou (mesmas validades); o que sobrar segue _ajustar_estoque_massa.
+    """
+    try:
+        with write_transaction() as cursor:
+            cursor.execute("SELECT tipo, desfeita_em FROM alteracoes_massa WHERE id = ?", (alteracao_id,))
+            alteracao = cursor.fetchone()
+            if not alteracao:
+                raise ValueError("Alteração não encontrada.")
+            if alteracao['desfeita_em']:
+                raise ValueError("Esta alteração já foi desfeita.")
+
+            if alteracao['tipo'] == "estoque":
+                restaurados = _desfazer_estoque_massa(cursor, alteracao_id)
+            else:
+                cursor.execute(
+                    """
+                    UPDATE produtos SET preco = i.preco_antigo
+                    FROM alteracoes_massa_itens i
+                    WHERE i.alteracao_id = ? AND i.produto_id = produtos.id AND produtos.preco = i.preco_novo
+                    """,
+                    (alteracao_id,)
+                )
+                restaurados = cursor.rowcount
+            cursor.execute("UPDATE alteracoes_massa SET desfeita_em = ? WHERE id = ?", (datetime.now().isoformat(), alteracao_id))
+    except sqlite3.IntegrityError as e:
+        raise _erro_estoque_massa(e)
+    audit("alteracao_massa_desfeita", usuario, depois={"alteracao_id": alteracao_id, "restaurados": restaurados})
+    return restaurados
+
+def _desfazer_estoque_massa(cursor, alteracao_id):
+    """Reverte uma alteração de estoque em massa pelos lotes. Retorna quantos produtos mudaram."""
+    # 1. Diferença a reverter por produto (limitada ao local principal, calculada antes de mexer nos lotes)
+    cursor.execute("DROP TABLE IF EXISTS temp.desfazer_estoque")
+    cursor.execute(
+        f"""
+        CREATE TEMP TABLE desfazer_estoque AS
+        SELECT i.produto_id, MAX(i.quantidade_antiga - i.quantidade_nova, -{_ESTOQUE_PRINCIPAL_SQL}) AS delta
+        FROM alteracoes_massa_itens i JOIN produtos ON produtos.id = i.produto_id
+        WHERE i.alteracao_id = ?
+        """,
+        (alteracao_id,)
+    )
+    # 2. Lotes consumidos recebem de volta o que cederam; o lote criado devolve o que ainda tem
+    cursor.execute("DROP TABLE IF EXISTS temp.desfazer_lotes")
+    cursor.execute(
+        """
+        CREATE TEMP TABLE desfazer_lotes AS
+        SELECT m.lote_id, m.produto_id,
+            CASE WHEN m.quantidade < 0 THEN -m.quantidade ELSE -MIN(m.quantidade, l.quantidade, -d.delta) END AS mov
+        FROM alteracoes_massa_lotes m
+        JOIN lotes l ON l.id = m.lote_id
+        JOIN desfazer_estoque d ON d.produto_id = m.produto_id
+        WHERE m.alteracao_id = ? AND (m.quantidade < 0 OR d.delta < 0)
+        """,
+        (alteracao_id,)
+    )
+    cursor.execute(
+        """
+        UPDATE lotes SET quantidade = lotes.quantidade + r.mov
+        FROM desfazer_lotes r WHERE lotes.id = r.lote_id AND r.mov <> 0
+        """
+    )
+    # 3. O restante (lotes apagados, estoque sem lote, entrada já vendida) segue o ajuste comum
+    _ajustar_estoque_massa(
+        cursor,
+        """
+        SELECT d.produto_id, d.delta - COALESCE((
+            SELECT SUM(r.mov) FROM desfazer_lotes r WHERE r.produto_id = d.produto_id
+        ), 0) AS delta
+        FROM desfazer_estoque d
+        """
+    )
+    cursor.execute("SELECT COUNT(*) FROM desfazer_estoque WHERE delta <> 0")
+    restaurados = cursor.fetchone()[0]
+    cursor.execute("DROP TABLE desfazer_estoque")
+    cursor.execute("DROP TABLE desfazer_lotes")
+    return restaurados
+
+def get_bulk_updates(limit=20):
+    """Retorna as alterações em massa mais recentes."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM alteracoes_massa ORDER BY id DESC LIMIT ?", (limit,))
+    alteracoes = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    for a in alteracoes:
+        a['filtros'] = json.loads(a['filtros']) if a.get('filtros') else {}
+    return alteracoes
+
+# ====================================================================
+# ACESSO COLUNAR (DATAFRAME) PARA ANÁLISES E EXPORTAÇÕES
+# Lê direto em colunas tipadas, sem criar um dict Python por linha.
+# ====================================================================
+
+PRODUTO_DTYPES = {
+    "id": "Int64", "nome": "string", "preco": "float64", "quantidade": "Int64",
+    "marca": "string", "estilo": "string", "tipo": "string", "foto": "string",
+    "data_validade": "string", "vendido": "Int64", "data_ultima_venda": "string",
+    "estoque_minimo": "Int64", "codigo_barras": "string", "atualizado_em": "string",
+    "preco_custo": "float64",
+}
+
+def _get_table_columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row['name'] for row in cursor.fetchall()]
+
+def get_produtos_frame(columns=None, filters=None):
+    """Retorna os produtos como DataFrame (ordenado por nome, id).
+
+    columns: lista de colunas (None = todas).
+    filters: dict coluna -> valor (igualdade) ou lista de valores (IN). A chave especial
+    'em_estoque' (True/False) filtra por quantidade > 0 / = 0.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    validas = _get_table_columns(cursor, "produtos")
+    columns = list(columns) if columns else validas
+    invalidas = [c for c in columns if c not in validas]
+    if invalidas:
+        conn.close()
+        raise ValueError(f"Colunas inválidas: {', '.join(invalidas)}")
+
+    condicoes, params = [], []
+    for coluna, valor in (filters or {}).items():
+        if coluna == "em_estoque":
+            condicoes.append("quantidade > 0" if valor else "quantidade = 0")
+        elif coluna not in validas:
+            conn.close()
+            raise ValueError(f"Filtro inválido: {coluna}")
+        elif isinstance(valor, (list, tuple, set)):
+            valor = list(valor)
+            condicoes.append(f"{coluna} IN ({', '.join('?' for _ in valor)})")
+            params.extend(valor)
+        elif valor is None:
+            condicoes.append(f"{coluna} IS NULL")
+        else:
+            condicoes.append(f"{coluna} = ?")
+            params.append(valor)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+
+    df = pd.read_sql(
+        f"SELECT {', '.join(columns)} FROM produtos {where} ORDER BY nome ASC, id ASC",
+        conn,
+        params=params,
+        dtype={c: PRODUTO_DTYPES[c] for c in columns if c in PRODUTO_DTYPES},
+    )
     conn.close()
+    return df
 
-# Garante que as tabelas sejam criadas na inicialização
-create_tables()
+def format_brl_series(valores):
+    """Formata uma Series numérica como 'R$ 1.234,56' (vetorizado)."""
+    texto = valores.astype("float64").map("{:_.2f}".format)
+    return "R$ " + texto.str.replace('.', ',', regex=False).str.replace('_', '.', regex=False)
 
+def format_date_series(datas):
+    """Converte datas ISO para DD/MM/AAAA (vetorizado); vazios viram '-' e valores inválidos ficam como estão."""
+    convertidas = pd.to_datetime(datas, errors='coerce', format='ISO8601').dt.strftime('%d/%m/%Y')
+    return convertidas.fillna(datas).fillna('-').astype("string")
 
 # ====================================================================
-# FUNÇÕES CRUD DE PRODUTOS
+# FUNÇÕES DE ANÁLISE DE VENDAS (DASHBOARD)
+# Leem apenas as tabelas de resumo, nunca o histórico completo de vendas.
 # ====================================================================
 
-def add_produto(nome, preco, quantidade, marca, estilo, tipo, foto=None, data_validade=None):
-    """Adiciona um novo produto ao DB."""
+PERIODOS_VENDAS = {
+    "dia": "dia",
+    "semana": "date(dia, 'weekday 0', '-6 days')",  # Segunda-feira da semana
+    "mes": "substr(dia, 1, 7)",
+}
+
+def get_receita_por_periodo(periodo="dia", data_inicio=None, data_fim=None):
+    """Retorna receita, unidades e número de vendas agrupados por dia, semana ou mês."""
+    if periodo not in PERIODOS_VENDAS:
+        raise ValueError(f"Período inválido: {periodo}. Use 'dia', 'semana' ou 'mes'.")
+    chave = PERIODOS_VENDAS[periodo]
+
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        "INSERT INTO produtos (nome, preco, quantidade, marca, estilo, tipo, foto, data_validade) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (nome, preco, quantidade, marca, estilo, tipo, foto, data_validade)
+        f"""
+        SELECT {chave} AS periodo, SUM(num_vendas) AS num_vendas, SUM(unidades) AS unidades, SUM(receita) AS receita
+        FROM vendas_resumo_dia
+        WHERE dia >= COALESCE(?, dia) AND dia <= COALESCE(?, dia)
+        GROUP BY periodo
+        ORDER BY periodo ASC
+        """,
+        (data_inicio, data_fim)
     )
-    conn.commit()
+    resumo = [dict(row) for row in cursor.fetchall()]
     conn.close()
+    return resumo
 
-def get_all_produtos(include_sold=True):
-    """Retorna todos os produtos. Se include_sold=False, retorna apenas itens com quantidade > 0."""
+def get_top_vendidos(limit=10):
+    """Retorna os produtos mais vendidos (por unidades) a partir do resumo por produto."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    if include_sold:
-        cursor.execute("SELECT * FROM produtos ORDER BY nome ASC")
-    else:
-        cursor.execute("SELECT * FROM produtos WHERE quantidade > 0 ORDER BY nome ASC")
-        
+    cursor.execute(
+        "SELECT * FROM vendas_resumo_produto ORDER BY unidades DESC, receita DESC LIMIT ?",
+        (limit,)
+    )
     produtos = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return produtos
 
-def get_produtos_vendidos():
-    """Retorna todos os produtos que foram marcados como vendidos (vendido=1)."""
+def get_mix_vendas(dimensao="marca"):
+    """Retorna unidades e receita agrupadas por 'marca' ou 'tipo'."""
+    if dimensao not in ("marca", "tipo"):
+        raise ValueError(f"Dimensão inválida: {dimensao}. Use 'marca' ou 'tipo'.")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT {dimensao}, SUM(unidades) AS unidades, SUM(receita) AS receita
+        FROM vendas_resumo_marca_tipo
+        GROUP BY {dimensao}
+        ORDER BY receita DESC
+        """
+    )
+    mix = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return mix
+
+# ====================================================================
+# MARGEM E LUCRO
+# Agregações em SQL sobre as tabelas de resumo (e o catálogo), guardadas em
+# cache enquanto o 'seq' do registro de alterações não mudar: toda venda ou
+# mudança de preço/custo altera 'produtos' e, portanto, o seq.
+# ====================================================================
+
+_cache_relatorios = {}
+MAX_CACHE_RELATORIOS = 64
+
+def _cache_por_versao(func):
+    """Reaproveita o resultado de func(*args) até a próxima escrita em 'produtos'.
+
+    Os resultados são compartilhados entre chamadas: não os modifique.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        seq = get_change_seq()
+        chave = (func.__name__, args, tuple(sorted(kwargs.items())))
+        item = _cache_relatorios.get(chave)
+        if item and item[0] == seq:
+            return item[1]
+        resultado = func(*args, **kwargs)
+        if len(_cache_relatorios) >= MAX_CACHE_RELATORIOS:
+            _cache_relatorios.clear()
+        _cache_relatorios[chave] = (seq, resultado)
+        return resultado
+    return wrapper
+
+# Lucro e margem (% da receita), calculados pelo SQLite a partir de SUM(receita) e SUM(custo)
+_SQL_LUCRO = """
+    SUM(receita) AS receita, SUM(custo) AS custo, SUM(receita) - SUM(custo) AS lucro,
+    ROUND(100.0 * (SUM(receita) - SUM(custo)) / NULLIF(SUM(receita), 0), 1) AS margem
+"""
+
+@_cache_por_versao
+def get_margem_por_periodo(periodo="mes", data_inicio=None, data_fim=None):
+    """Retorna receita, custo, lucro e margem (%) por dia, semana ou mês."""
+    if periodo not in PERIODOS_VENDAS:
+        raise ValueError(f"Período inválido: {periodo}. Use 'dia', 'semana' ou 'mes'.")
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT {PERIODOS_VENDAS[periodo]} AS periodo, SUM(unidades) AS unidades, {_SQL_LUCRO}
+        FROM vendas_resumo_dia
+        WHERE dia >= COALESCE(?, dia) AND dia <= COALESCE(?, dia)
+        GROUP BY periodo
+        ORDER BY periodo ASC
+        """,
+        (data_inicio, data_fim)
+    )
+    resumo = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return resumo
+
+@_cache_por_versao
+def get_margem_por_produto(limit=10):
+    """Retorna os produtos que mais deram lucro (lê o índice de lucro do resumo por produto)."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM produtos WHERE vendido = 1 ORDER BY data_ultima_venda DESC")
+    cursor.execute(
+        """
+        SELECT produto_id, nome, marca, unidades, receita, custo, receita - custo AS lucro,
+               ROUND(100.0 * (receita - custo) / NULLIF(receita, 0), 1) AS margem
+        FROM vendas_resumo_produto
+        ORDER BY receita - custo DESC
+        LIMIT ?
+        """,
+        (limit,)
+    )
     produtos = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return produtos
 
-def get_produto_by_id(product_id):
-    """Busca um produto pelo ID."""
+@_cache_por_versao
+def get_margem_por_marca():
+    """Retorna receita, custo, lucro e margem (%) das vendas por marca."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM produtos WHERE id = ?", (product_id,))
-    produto = cursor.fetchone()
+    cursor.execute(
+        f"""
+        SELECT marca, SUM(unidades) AS unidades, {_SQL_LUCRO}
+        FROM vendas_resumo_marca_tipo
+        GROUP BY marca
+        ORDER BY lucro DESC
+        """
+    )
+    marcas = [dict(row) for row in cursor.fetchall()]
     conn.close()
-    return dict(produto) if produto else None
+    return marcas
 
-def update_produto(product_id, nome, preco, quantidade, marca, estilo, tipo, foto, data_validade):
-    """Atualiza um produto existente."""
+@_cache_por_versao
+def get_valor_estoque(marca=None):
+    """Valor do estoque a preço de venda e de custo, por marca (uma agregação no SQLite)."""
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
         """
-        UPDATE produtos SET nome=?, preco=?, quantidade=?, marca=?, estilo=?, tipo=?, foto=?, data_validade=?
-        WHERE id=?
+        SELECT COALESCE(marca, 'Outra') AS marca, SUM(quantidade) AS unidades,
+               SUM(preco * quantidade) AS valor_venda, SUM(preco_custo * quantidade) AS valor_custo,
+               SUM((preco - preco_custo) * quantidade) AS lucro_potencial
+        FROM produtos
+        WHERE quantidade > 0 AND (? IS NULL OR marca = ?)
+        GROUP BY COALESCE(marca, 'Outra')
+        ORDER BY valor_venda DESC
         """,
-        (nome, preco, quantidade, marca, estilo, tipo, foto, data_validade, product_id)
+        (marca, marca)
     )
-    conn.commit()
+    valores = [dict(row) for row in cursor.fetchall()]
     conn.close()
+    return valores
 
-def delete_produto(product_id):
-    """Remove um produto e sua foto associada."""
+def get_historico_precos(product_id, limit=20):
+    """Retorna as últimas mudanças de preço/custo do produto (mais recente primeiro)."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    
-    # 1. Recupera o produto para apagar a foto
-    produto = get_produto_by_id(product_id)
-    if produto and produto.get('foto'):
-        try:
-            os.remove(os.path.join(ASSETS_DIR, produto['foto']))
-        except FileNotFoundError:
-            pass 
+    cursor.execute(
+        "SELECT * FROM historico_precos WHERE produto_id = ? ORDER BY em DESC, id DESC LIMIT ?",
+        (product_id, limit)
+    )
+    historico = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return historico
 
-    # 2. Deleta do banco de dados
-    cursor.execute("DELETE FROM produtos WHERE id = ?", (product_id,))
-    conn.commit()
+# ====================================================================
+# CONSULTAS DO CHATBOT
+# Perguntas do chat respondidas por uma consulta indexada cada, com LIMIT:
+# o total vem de COUNT(*) OVER () na mesma consulta, sem trazer o catálogo.
+# ====================================================================
+
+LIMITE_CHAT = 10
+
+def _com_total(rows):
+    """Separa o total (coluna 'total' da janela) das linhas. Retorna (total, itens)."""
+    itens = [dict(row) for row in rows]
+    total = itens[0].pop('total') if itens else 0
+    for item in itens[1:]:
+        item.pop('total')
+    return total, itens
+
+def get_estoque_chat(marca=None, limit=LIMITE_CHAT):
+    """Produtos em estoque (opcionalmente de uma marca), por nome. Retorna (total, itens)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT id, nome, preco, quantidade, marca, estilo, COUNT(*) OVER () AS total
+        FROM produtos
+        WHERE quantidade > 0 AND (? IS NULL OR marca = ?)
+        ORDER BY nome ASC, id ASC LIMIT ?
+        """,
+        (marca, marca, limit)
+    )
+    resultado = _com_total(cursor.fetchall())
     conn.close()
+    return resultado
 
-def mark_produto_as_sold(product_id, quantity_sold=1):
-    """Atualiza a quantidade e registra a última venda."""
+def get_mais_vendidos_desde(data_inicio, limit=LIMITE_CHAT):
+    """Produtos mais vendidos (unidades) a partir de data_inicio (ISO), lendo só as vendas do período."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    
-    # 1. Verifica se há estoque
-    produto = get_produto_by_id(product_id)
-    if not produto or produto.get('quantidade', 0) < quantity_sold:
-        raise ValueError("Estoque insuficiente para esta venda.")
-    
-    # 2. Atualiza
+    # '+' no GROUP BY impede o SQLite de trocar a busca por data (idx_vendas_data) por uma
+    # varredura de todas as vendas na ordem de idx_vendas_produto
     cursor.execute(
-        "UPDATE produtos SET quantidade = quantidade - ?, vendido = 1, data_ultima_venda = ? WHERE id = ?",
-        (quantity_sold, datetime.now().isoformat(), product_id)
+        """
+        SELECT v.produto_id, COALESCE(r.nome, 'ID ' || v.produto_id) AS nome,
+               SUM(v.quantidade) AS unidades, SUM(v.quantidade * v.preco_unitario) AS receita
+        FROM vendas v
+        LEFT JOIN vendas_resumo_produto r ON r.produto_id = v.produto_id
+        WHERE v.data_venda >= ?
+        GROUP BY +v.produto_id
+        ORDER BY unidades DESC, receita DESC LIMIT ?
+        """,
+        (data_inicio, limit)
     )
-    conn.commit()
+    produtos = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return produtos
+
+def get_produtos_vencendo(dias, limit=LIMITE_CHAT):
+    """Produtos com estoque cuja validade mais próxima cai nos próximos 'dias' (inclui vencidos).
+
+    Retorna (total, itens), da validade mais próxima para a mais distante.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT id, nome, quantidade, marca, data_validade, COUNT(*) OVER () AS total
+        FROM produtos
+        WHERE quantidade > 0 AND data_validade IS NOT NULL AND data_validade <= date('now', 'localtime', ?)
+        ORDER BY data_validade ASC, nome ASC LIMIT ?
+        """,
+        (f"+{int(dias)} days", limit)
+    )
+    resultado = _com_total(cursor.fetchall())
+    conn.close()
+    return resultado
+
+def get_produtos_abaixo_de(unidades, limit=LIMITE_CHAT):
+    """Produtos com estoque entre 1 e unidades - 1 (os menores primeiro). Retorna (total, itens)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT id, nome, quantidade, marca, COUNT(*) OVER () AS total
+        FROM produtos
+        WHERE quantidade > 0 AND quantidade < ?
+        ORDER BY quantidade ASC, nome ASC LIMIT ?
+        """,
+        (unidades, limit)
+    )
+    resultado = _com_total(cursor.fetchall())
     conn.close()
+    return resultado
 
 # ====================================================================
-# FUNÇÕES DE USUÁRIOS (LOGIN/ADMIN)
+# FILTROS COM CONTAGEM (FACETAS)
+# Uma consulta agrupada por (marca, estilo, tipo) — só o índice composto é
+# lido — guardada até a próxima escrita. As contagens de cada filtro, que
+# dependem dos outros dois filtros escolhidos, saem dessas poucas linhas.
 # ====================================================================
 
-def add_user(username, password, role="staff"):
-    """Adiciona um novo usuário (admin ou staff) ao banco de dados."""
-    hashed_pass = hash_password(password)
+FACETAS = ("marca", "estilo", "tipo")
+
+@_cache_por_versao
+def get_facetas(local_id=None):
+    """Retorna as combinações (marca, estilo, tipo, produtos) do catálogo (ou dos produtos do local)."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    try:
+    if local_id is not None:
         cursor.execute(
-            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-            (username, hashed_pass, role)
+            """
+            SELECT p.marca, p.estilo, p.tipo, COUNT(*) AS produtos
+            FROM estoque_locais e JOIN produtos p ON p.id = e.produto_id
+            WHERE e.local_id = ?
+            GROUP BY p.marca, p.estilo, p.tipo
+            """,
+            (local_id,)
         )
-        conn.commit()
+    else:
+        cursor.execute("SELECT marca, estilo, tipo, COUNT(*) AS produtos FROM produtos GROUP BY marca, estilo, tipo")
+    combinacoes = tuple(tuple(row) for row in cursor.fetchall())
+    conn.close()
+    return combinacoes
+
+def contar_facetas(combinacoes, marca=None, estilo=None, tipo=None):
+    """Contagem de produtos de cada valor de marca, estilo e tipo, respeitando os outros dois filtros.
+
+    Retorna {'marca': {valor: n}, 'estilo': {...}, 'tipo': {...}}; a chave None de cada
+    dimensão é o total sem filtrar por ela. Valores sem produtos não aparecem.
+    """
+    filtros = (marca, estilo, tipo)
+    contagens = {dimensao: {None: 0} for dimensao in FACETAS}
+    for *valores, produtos in combinacoes:
+        for i, dimensao in enumerate(FACETAS):
+            # O produto conta para esta dimensão se passa nos filtros das outras duas
+            if all(f is None or f == v for j, (f, v) in enumerate(zip(filtros, valores)) if j != i):
+                contagem = contagens[dimensao]
+                contagem[None] += produtos
+                if valores[i]:
+                    contagem[valores[i]] = contagem.get(valores[i], 0) + produtos
+    return contagens
+
+# ====================================================================
+# REGISTRO DE ALTERAÇÕES (CHANGE FEED)
+# ====================================================================
+
+def get_change_seq():
+    """Retorna o número da última alteração em 'produtos' (consulta barata, pela chave primária)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    seq = _get_change_seq(cursor)
+    conn.close()
+    return seq
+
+def _get_change_seq(cursor):
+    # sqlite_sequence guarda o último valor do AUTOINCREMENT, mesmo depois da poda do registro
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'alteracoes'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def get_changes_since(seq):
+    """Retorna (novo_seq, ids_alterados, ids_removidos) desde 'seq'.
+
+    Retorna None se o registro já foi podado além de 'seq' (a página deve recarregar tudo).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(seq) FROM alteracoes")
+    menor = cursor.fetchone()[0]
+    if menor is None:
+        menor = _get_change_seq(cursor) + 1
+    if seq < menor - 1:
+        conn.close()
+        return None
+
+    cursor.execute("SELECT seq, produto_id, operacao FROM alteracoes WHERE seq > ? ORDER BY seq", (seq,))
+    alterados, removidos = set(), set()
+    for row in cursor.fetchall():
+        seq = row['seq']
+        if row['operacao'] == 'DELETE':
+            alterados.discard(row['produto_id'])
+            removidos.add(row['produto_id'])
+        else:
+            removidos.discard(row['produto_id'])
+            alterados.add(row['produto_id'])
+    conn.close()
+    return seq, alterados, removidos
+
+def prune_alteracoes(dias=7):
+    """Apaga registros de alteração mais antigos que 'dias'. Retorna quantos foram apagados."""
+    with write_transaction() as cursor:
+        cursor.execute("DELETE FROM alteracoes WHERE em < datetime('now', ?)", (f"-{int(dias)} days",))
+        return cursor.rowcount
+
+# ====================================================================
+# AUDITORIA
+# audit() só acrescenta a entrada a um buffer em memória; uma thread de fundo
+# grava o buffer em lote (uma transação por lote) a cada AUDITORIA_INTERVALO
+# ou quando ele atinge AUDITORIA_LOTE entradas. Assim a venda/edição não ganha
+# nenhuma escrita extra. Entradas ainda no buffer se perdem se o processo cair.
+# ====================================================================
+
+AUDITORIA_INTERVALO = 2.0  # segundos
+AUDITORIA_LOTE = 200
+
+ACOES_AUDITORIA = {
+    "produto_criado": "Produto cadastrado",
+    "produto_editado": "Produto editado",
+    "produto_removido": "Produto removido",
+    "venda": "Venda",
+    "lote": "Entrada de lote",
+    "transferencia": "Transferência",
+    "alteracao_massa": "Alteração em massa",
+    "alteracao_massa_desfeita": "Alteração em massa desfeita",
+    "importacao": "Importação",
+    "local": "Local de estoque",
+    "usuario_criado": "Usuário cadastrado",
+    "cliente_criado": "Cliente cadastrado",
+    "cliente_editado": "Cliente editado",
+}
+
+_auditoria_buffer = []
+_auditoria_lock = threading.Lock()
+_auditoria_evento = threading.Event()
+_auditoria_thread = None
+
+def audit(acao, usuario=None, produto_id=None, antes=None, depois=None):
+    """Registra uma ação na auditoria (vai para o buffer; a gravação no banco é feita em lote)."""
+    with _auditoria_lock:
+        _auditoria_buffer.append((datetime.now().isoformat(), usuario or None, acao, produto_id, antes, depois))
+        cheio = len(_auditoria_buffer) >= AUDITORIA_LOTE
+    _iniciar_thread_auditoria()
+    if cheio:
+        _auditoria_evento.set()
+
+def _diferencas(antes, depois):
+    """Só os campos alterados: (dict antes, dict depois)."""
+    campos = [c for c in depois if c in antes and antes[c] != depois[c]]
+    return {c: antes[c] for c in campos}, {c: depois[c] for c in campos}
+
+def flush_audit():
+    """Grava agora as entradas do buffer. Retorna quantas foram gravadas."""
+    with _auditoria_lock:
+        entradas = _auditoria_buffer[:]
+        _auditoria_buffer.clear()
+    if not entradas:
+        return 0
+
+    def _json(valor):
+        return json.dumps(valor, ensure_ascii=False, default=str) if valor is not None else None
+
+    linhas = [(em, usuario, acao, produto_id, _json(antes), _json(depois))
+              for em, usuario, acao, produto_id, antes, depois in entradas]
+    try:
+        with write_transaction() as cursor:
+            cursor.executemany(
+                "INSERT INTO auditoria (em, usuario, acao, produto_id, antes, depois) VALUES (?, ?, ?, ?, ?, ?)",
+                linhas
+            )
+    except sqlite3.Error:
+        logger.exception("Falha ao gravar %d entrada(s) de auditoria; nova tentativa no próximo lote.", len(entradas))
+        with _auditoria_lock:
+            _auditoria_buffer[:0] = entradas
+        return 0
+    return len(entradas)
+
+def _loop_auditoria():
+    while True:
+        _auditoria_evento.wait(AUDITORIA_INTERVALO)
+        _auditoria_evento.clear()
+        flush_audit()
+
+def _iniciar_thread_auditoria():
+    global _auditoria_thread
+    if _auditoria_thread is not None:
+        return
+    with _auditoria_lock:
+        if _auditoria_thread is None:
+            _auditoria_thread = threading.Thread(target=_loop_auditoria, name="auditoria", daemon=True)
+            _auditoria_thread.start()
+            atexit.register(flush_audit)  # Grava o que sobrou ao encerrar o processo
+
+def get_auditoria(usuario=None, acao=None, produto_id=None, data_inicio=None, data_fim=None, limit=50, before=None):
+    """Entradas de auditoria (mais recentes primeiro), filtradas e paginadas por chave (before = último id visto).
+
+    data_inicio/data_fim: datas ISO (AAAA-MM-DD), inclusivas.
+    """
+    condicoes, params = [], []
+    for coluna, valor in (("usuario", usuario), ("acao", acao), ("produto_id", produto_id)):
+        if valor:
+            condicoes.append(f"{coluna} = ?")
+            params.append(valor)
+    if data_inicio:
+        condicoes.append("em >= ?")
+        params.append(str(data_inicio))
+    if data_fim:
+        condicoes.append("em < date(?, '+1 day')")
+        params.append(str(data_fim))
+    if before is not None:
+        condicoes.append("id < ?")
+        params.append(before)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM auditoria {where} ORDER BY id DESC LIMIT ?", params + [limit])
+    entradas = []
+    for row in cursor.fetchall():
+        entrada = dict(row)
+        entrada['antes'] = json.loads(entrada['antes']) if entrada['antes'] else None
+        entrada['depois'] = json.loads(entrada['depois']) if entrada['depois'] else None
+        entradas.append(entrada)
+    conn.close()
+    return entradas
+
+def get_usuarios_auditoria():
+    """Usuários que aparecem na auditoria (para o filtro do visualizador)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT usuario FROM auditoria WHERE usuario IS NOT NULL ORDER BY usuario")
+    usuarios = [row['usuario'] for row in cursor.fetchall()]
+    conn.close()
+    return usuarios
+
+# ====================================================================
+# FUNÇÕES DE USUÁRIOS (LOGIN/ADMIN)
+# ====================================================================
+
+def add_user(username, password, role="staff", usuario=None):
+    """Adiciona um novo usuário (admin ou staff) ao banco de dados."""
+    hashed_pass = hash_password(password)
+    try:
+        with write_transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                (username, hashed_pass, role)
+            )
+        audit("usuario_criado", usuario, depois={"username": username, "role": role})
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 def get_user(username):
     """Busca um usuário pelo nome de usuário."""
@@ -268,68 +2393,250 @@ def check_user_login(username, password):
 
 def export_produtos_to_csv_content():
     """Exporta todos os produtos para uma string CSV (para download direto)."""
-    produtos = get_all_produtos()
-    if not produtos:
+    produtos = get_produtos_frame()
+    if produtos.empty:
         return ""
         
-    fieldnames = list(produtos[0].keys())
-    # Cria um buffer de string na memória
+    # Use ';' para melhor compatibilidade BRL
+    return produtos.to_csv(sep=';', index=False)
+
+def export_reposicao_to_csv_content(produtos=None):
+    """Exporta a lista de reposição (produtos abaixo do estoque mínimo) para uma string CSV.
+
+    produtos: resultado de get_produtos_para_repor já lido pela página (None = consulta aqui).
+    """
+    if produtos is None:
+        produtos = get_produtos_para_repor()
+    if not produtos:
+        return ""
+
     csv_buffer = io.StringIO()
-    writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames, extrasaction='ignore', delimiter=';') # Use ';' para melhor compatibilidade BRL
+    writer = csv.DictWriter(csv_buffer, fieldnames=list(produtos[0].keys()), delimiter=';')
     writer.writeheader()
     writer.writerows(produtos)
-    
+
     return csv_buffer.getvalue()
 
-def import_produtos_from_csv_buffer(file_buffer):
-    """Importa produtos de um buffer de arquivo CSV (substituindo o uso de filepath)."""
+# Token inicial: anterior a qualquer carimbo real
+TOKEN_DELTA_INICIAL = "1970-01-01T00:00:00.000Z"
+
+def export_produtos_delta(desde=None):
+    """Retorna os produtos alterados e os IDs removidos desde o carimbo/token 'desde'.
+
+    Retorna (DataFrame dos alterados, lista de {'id', 'removido_em'}, novo_token). Passe o
+    novo_token na próxima chamada. As duas consultas leem o mesmo instante do banco e a
+    comparação é inclusiva (>=): uma linha gravada no mesmo milissegundo do token pode sair
+    de novo, mas nenhuma alteração é perdida. Sem 'desde', retorna o catálogo inteiro.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
+    cursor.execute("BEGIN")  # Mesmo snapshot para produtos, remoções e token
+    colunas = _get_table_columns(cursor, "produtos")
+    dtypes = {c: PRODUTO_DTYPES[c] for c in colunas if c in PRODUTO_DTYPES}
+    if desde:
+        alterados = pd.read_sql(
+            "SELECT * FROM produtos WHERE atualizado_em >= ? ORDER BY atualizado_em, id",
+            conn, params=(desde,), dtype=dtypes
+        )
+        cursor.execute(
+            "SELECT produto_id AS id, removido_em FROM produtos_removidos WHERE removido_em >= ? ORDER BY removido_em",
+            (desde,)
+        )
+        removidos = [dict(row) for row in cursor.fetchall()]
+    else:
+        alterados = pd.read_sql("SELECT * FROM produtos ORDER BY nome ASC, id ASC", conn, dtype=dtypes)
+        removidos = []
+    cursor.execute(
+        "SELECT MAX(em) FROM (SELECT MAX(atualizado_em) AS em FROM produtos "
+        "UNION ALL SELECT MAX(removido_em) FROM produtos_removidos)"
+    )
+    novo_token = cursor.fetchone()[0] or desde or TOKEN_DELTA_INICIAL
+    conn.rollback()
+    conn.close()
+    return alterados, removidos, novo_token
+
+def export_produtos_delta_to_csv_content(desde=None):
+    """Exportação incremental em CSV: alterados + linhas de remoção (coluna 'removido' = 1).
+
+    Retorna (conteúdo CSV, novo_token).
+    """
+    alterados, removidos, novo_token = export_produtos_delta(desde)
+    alterados["removido"] = 0
+    if removidos:
+        tombstones = pd.DataFrame(removidos).rename(columns={"removido_em": "atualizado_em"})
+        tombstones["removido"] = 1
+        alterados = pd.concat([alterados, tombstones.astype({"atualizado_em": "string"})], ignore_index=True)
+    if alterados.empty:
+        return "", novo_token
+    return alterados.to_csv(sep=';', index=False), novo_token
+
+# Colunas aceitas na importação (CSV/XLSX), na ordem do INSERT
+COLUNAS_IMPORTACAO = [
+    "nome", "preco", "quantidade", "marca", "estilo", "tipo", "foto", "data_validade",
+    "vendido", "data_ultima_venda", "estoque_minimo", "codigo_barras", "preco_custo",
+]
+LOTE_IMPORTACAO = 1000
+
+def _parse_import_row(row):
+    """Converte uma linha (dict coluna -> valor) em valores para o INSERT, ou None se for inválida."""
+    try:
+        # Garante que os campos cruciais não sejam nulos ou inválidos
+        nome = row.get('nome')
+        if not nome:
+            return None
+
+        # Tenta converter campos para o tipo correto
+        preco = float(str(row.get('preco') or '0').replace(',', '.'))
+        quantidade = int(float(row.get('quantidade') or 0))
+        vendido = int(float(row.get('vendido') or 0))
+        estoque_minimo = int(float(row.get('estoque_minimo') or 0))
+        preco_custo = float(str(row.get('preco_custo') or '0').replace(',', '.'))
+    except ValueError:
+        return None # Pula a linha se os campos numéricos estiverem inválidos
+
+    def _texto(valor):
+        if isinstance(valor, (datetime, date)):
+            return valor.isoformat()
+        return str(valor) if valor not in (None, '') else None
+
+    return (
+        str(nome), preco, quantidade, _texto(row.get('marca')), _texto(row.get('estilo')),
+        _texto(row.get('tipo')), _texto(row.get('foto')), _texto(row.get('data_validade')), vendido,
+        _texto(row.get('data_ultima_venda')), estoque_minimo, normalize_codigo_barras(row.get('codigo_barras')),
+        preco_custo
+    )
+
+def _insert_import_batch(cursor, lote):
+    """Insere um lote de produtos; linhas que falharem (ex.: código de barras repetido) são ignoradas.
+
+    O produto entra com quantidade 0 e a quantidade da planilha vira o primeiro lote (com a validade
+    da planilha), como em add_produto: o total continua sendo a soma dos lotes.
+    """
+    sql = f"INSERT INTO produtos ({', '.join(COLUNAS_IMPORTACAO)}) VALUES ({', '.join('?' for _ in COLUNAS_IMPORTACAO)})"
+    indice_quantidade = COLUNAS_IMPORTACAO.index("quantidade")
+    indice_validade = COLUNAS_IMPORTACAO.index("data_validade")
+    inseridos = 0
+    for valores in lote:
+        quantidade = valores[indice_quantidade]
+        try:
+            cursor.execute(sql, valores[:indice_quantidade] + (0,) + valores[indice_quantidade + 1:])
+        except sqlite3.Error as e:
+            logger.warning("Importação: linha ignorada (%s): %s", e, valores[0])
+            continue
+        if quantidade > 0:
+            _insert_lote(cursor, cursor.lastrowid, quantidade, valores[indice_validade])
+        inseridos += 1
+    return inseridos
+
+def _import_rows(rows, total=None, progress=None, usuario=None, arquivo=None):
+    """Importa um iterável de dicts em lotes de LOTE_IMPORTACAO, uma transação por lote.
+
+    Entre um lote e outro o lock de escrita é liberado, então vendas e edições de outras
+    sessões não esperam a importação inteira. progress(feitos, total) pode interromper a
+    importação levantando uma exceção; os lotes já gravados permanecem.
+    """
     count = 0
-    
+    lote = []
+
+    def _gravar(lote):
+        with write_transaction() as cursor:
+            return _insert_import_batch(cursor, lote)
+
+    for index, row in enumerate(rows, start=1):
+        if progress:
+            progress(index, total or index)
+        valores = _parse_import_row(row)
+        if valores is None:
+            continue
+        lote.append(valores)
+        if len(lote) >= LOTE_IMPORTACAO:
+            count += _gravar(lote)
+            lote = []
+    if lote:
+        count += _gravar(lote)
+    audit("importacao", usuario, depois={"arquivo": arquivo, "produtos": count})
+    return count
+
+def import_produtos_from_csv_buffer(file_buffer, progress=None, usuario=None):
+    """Importa produtos de um buffer de arquivo CSV (substituindo o uso de filepath).
+
+    progress, se informado, é chamado como progress(feitos, total) durante a importação
+    (usado pela fila de tarefas em utils/jobs.py, que pode interromper a execução).
+    """
     # Decodifica o buffer do Streamlit (bytes) para string e usa StringIO para ler como arquivo
     string_data = io.StringIO(file_buffer.getvalue().decode('utf-8'))
     
-    reader = csv.DictReader(string_data, delimiter=';') # Usa ';' como delimitador
-    
-    for row in reader:
-        try:
-            # Garante que os campos cruciais não sejam nulos ou inválidos
-            nome = row.get('nome')
-            if not nome: continue 
-            
-            # Tenta converter campos para o tipo correto
-            preco = float(row.get('preco', '0').replace(',', '.'))
-            quantidade = int(row.get('quantidade', '0'))
-            vendido = int(row.get('vendido', '0'))
-            
-        except ValueError:
-            continue # Pula a linha se os campos numéricos estiverem inválidos
-
-        # Insere um NOVO produto (ID será AUTOINCREMENT)
-        try:
-            cursor.execute(
-                """
-                INSERT INTO produtos (nome, preco, quantidade, marca, estilo, tipo, foto, data_validade, vendido, data_ultima_venda)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    nome, preco, quantidade, row.get('marca'), row.get('estilo'), 
-                    row.get('tipo'), row.get('foto'), row.get('data_validade'), vendido, 
-                    row.get('data_ultima_venda')
-                )
-            )
-            count += 1
-        except Exception as e:
-            print(f"Erro ao inserir linha: {e}")
-            
-    conn.commit()
-    conn.close()
-    return count
+    rows = list(csv.DictReader(string_data, delimiter=';')) # Usa ';' como delimitador
+    return _import_rows(rows, len(rows), progress, usuario, getattr(file_buffer, "name", None))
+
+def import_produtos_from_xlsx_buffer(file_buffer, progress=None, usuario=None):
+    """Importa produtos de uma planilha XLSX (primeira aba, cabeçalho na primeira linha).
+
+    Usa o modo read_only do openpyxl: as linhas são lidas sob demanda e gravadas em lotes,
+    então a memória usada não cresce com o tamanho da planilha.
+    """
+    wb = load_workbook(file_buffer, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        linhas = ws.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if not cabecalho:
+            return 0
+        colunas = [str(c).strip().lower() if c is not None else "" for c in cabecalho]
+        total = (ws.max_row - 1) if ws.max_row else None
+
+        rows = (dict(zip(colunas, linha)) for linha in linhas)
+        return _import_rows(rows, total, progress, usuario, getattr(file_buffer, "name", None))
+    finally:
+        wb.close()
+
+def export_produtos_to_xlsx_bytes(progress=None):
+    """Exporta todos os produtos para XLSX e retorna os bytes.
+
+    Usa o modo write_only do openpyxl e lê o banco em blocos (fetchmany), sem montar
+    a lista completa de produtos em memória.
+    """
+    conn = get_db_connection()
+    conn.row_factory = None # Tuplas simples: sem objeto por linha além do necessário
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM produtos")
+    total = cursor.fetchone()[0]
+    cursor.execute("SELECT * FROM produtos ORDER BY nome ASC, id ASC")
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Produtos")
+    ws.append([coluna[0] for coluna in cursor.description])
+
+    feitos = 0
+    try:
+        while True:
+            bloco = cursor.fetchmany(LOTE_IMPORTACAO)
+            if not bloco:
+                break
+            for linha in bloco:
+                ws.append(linha)
+            feitos += len(bloco)
+            if progress:
+                progress(feitos, total)
+    finally:
+        conn.close()
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def generate_stock_pdf_bytes(progress=None):
+    """Gera um relatório PDF com a lista de produtos e retorna os bytes (para download direto).
 
-def generate_stock_pdf_bytes():
-    """Gera um relatório PDF com a lista de produtos e retorna os bytes (para download direto)."""
-    produtos = get_all_produtos(include_sold=False) # Apenas produtos em estoque
+    progress, se informado, é chamado como progress(feitos, total) a cada produto desenhado.
+    """
+    # Apenas produtos em estoque; formatação e total calculados por coluna
+    produtos = get_produtos_frame(["nome", "marca", "tipo", "quantidade", "preco", "data_validade"], {"em_estoque": True})
+    produtos["validade"] = format_date_series(produtos["data_validade"])
+    produtos["preco_formatado"] = format_brl_series(produtos["preco"].fillna(0.0))
+    for coluna, tamanho in (("nome", 30), ("marca", 20), ("tipo", 20)):
+        produtos[coluna] = produtos[coluna].fillna('-').str.slice(0, tamanho)
+    total_valor_estoque = float((produtos["preco"].fillna(0.0) * produtos["quantidade"].fillna(0)).sum())
     
     # Usa um buffer de memória (BytesIO) para evitar salvar no disco
     buffer = io.BytesIO()
@@ -363,9 +2670,10 @@ def generate_stock_pdf_bytes():
     
     # Conteúdo da tabela
     c.setFont('Helvetica', 9)
-    total_valor_estoque = 0.0
     
-    for p in produtos:
+    for index, p in enumerate(produtos.itertuples(index=False), start=1):
+        if progress:
+            progress(index, len(produtos))
         if y_position < 40: 
             c.showPage() 
             y_position = height - 50
@@ -382,31 +2690,13 @@ def generate_stock_pdf_bytes():
             y_position -= 15
             c.setFont('Helvetica', 9)
 
-        # Formatação de Data, Preço e Cálculo
-        validade = p.get('data_validade') or '-'
-        if validade != '-':
-            try:
-                validade = datetime.fromisoformat(validade).strftime('%d/%m/%Y')
-            except ValueError:
-                pass 
-                
-        nome = p.get('nome') or '-'
-        marca = p.get('marca') or '-'
-        tipo = p.get('tipo') or '-'
-        quantidade = p.get('quantidade') or 0
-        preco = p.get('preco') or 0.0
-        
-        # Formato BRL para exibição
-        preco_formatado = f"R$ {float(preco):_.2f}".replace('.', 'X').replace('_', '.').replace('X', ',')
-        total_valor_estoque += float(preco) * float(quantidade)
-
-        # Desenha as linhas
-        c.drawString(col_x[0], y_position, nome[:30]) 
-        c.drawString(col_x[1], y_position, marca[:20])
-        c.drawString(col_x[2], y_position, tipo[:20])
-        c.drawString(col_x[3], y_position, str(quantidade))
-        c.drawString(col_x[4], y_position, preco_formatado)
-        c.drawString(col_x[5], y_position, validade)
+        # Desenha as linhas (valores já formatados por coluna)
+        c.drawString(col_x[0], y_position, p.nome) 
+        c.drawString(col_x[1], y_position, p.marca)
+        c.drawString(col_x[2], y_position, p.tipo)
+        c.drawString(col_x[3], y_position, str(p.quantidade))
+        c.drawString(col_x[4], y_position, p.preco_formatado)
+        c.drawString(col_x[5], y_position, p.validade)
         
         y_position -= 15
         
@@ -423,3 +2713,107 @@ def generate_stock_pdf_bytes():
     # Retorna os bytes do PDF
     buffer.seek(0)
     return buffer.getvalue()
+
+# ====================================================================
+# ETIQUETAS (PREÇO / GÔNDOLA)
+# ====================================================================
+
+# Folha A4 com 3 x 8 etiquetas de 70 x 37 mm, sem margem
+ETIQUETA_COLUNAS = 3
+ETIQUETA_LINHAS = 8
+FORM_ETIQUETA = "etiqueta"
+
+def _ajustar_texto(texto, fonte, tamanho, largura):
+    """Corta o texto (com '…') para caber na largura, em pontos."""
+    texto = texto or '-'
+    if stringWidth(texto, fonte, tamanho) <= largura:
+        return texto
+    while texto and stringWidth(texto + '…', fonte, tamanho) > largura:
+        texto = texto[:-1]
+    return texto + '…'
+
+def _desenhar_modelo_etiqueta(c, largura, altura):
+    """Parte fixa da etiqueta (borda de corte, nome da loja, legendas), gravada uma única vez no PDF."""
+    c.beginForm(FORM_ETIQUETA, lowerx=0, lowery=0, upperx=largura, uppery=altura)
+    c.setStrokeGray(0.8)
+    c.setLineWidth(0.3)
+    c.rect(0, 0, largura, altura)
+    c.setFillGray(0.45)
+    c.setFont('Helvetica', 6)
+    c.drawString(6, altura - 10, 'Cores e Fragrâncias')
+    c.drawRightString(largura - 6, altura - 49, 'Validade')
+    c.endForm()
+
+def generate_labels_pdf_bytes(product_ids=None, marca=None, estilo=None, tipo=None, copias=1,
+                              por_unidade=False, progress=None):
+    """Gera uma folha de etiquetas (nome, marca, preço, validade e código de barras) e retorna os bytes do PDF.
+
+    Seleciona os produtos pelos IDs ou por marca/estilo/tipo (só os que têm estoque).
+    copias: etiquetas por produto; com por_unidade=True, uma por unidade em estoque.
+    progress, se informado, é chamado como progress(feitos, total) a cada etiqueta.
+    """
+    filtros = {"em_estoque": True}
+    if product_ids:
+        filtros["id"] = list(product_ids)
+    for coluna, valor in (("marca", marca), ("estilo", estilo), ("tipo", tipo)):
+        if valor:
+            filtros[coluna] = valor
+    produtos = get_produtos_frame(["id", "nome", "marca", "preco", "quantidade", "data_validade", "codigo_barras"], filtros)
+    produtos["validade"] = format_date_series(produtos["data_validade"])
+    produtos["preco_formatado"] = format_brl_series(produtos["preco"].fillna(0.0))
+    produtos["repeticoes"] = produtos["quantidade"].fillna(0).astype(int) if por_unidade else max(int(copias), 1)
+    total = int(produtos["repeticoes"].sum())
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    largura, altura = width / ETIQUETA_COLUNAS, height / ETIQUETA_LINHAS
+    por_folha = ETIQUETA_COLUNAS * ETIQUETA_LINHAS
+    _desenhar_modelo_etiqueta(c, largura, altura)
+
+    feitos = 0
+    for p in produtos.itertuples(index=False):
+        # Texto e código de barras são iguais em todas as cópias do produto
+        nome = _ajustar_texto(p.nome, 'Helvetica-Bold', 9, largura - 12)
+        marca_texto = _ajustar_texto(p.marca, 'Helvetica', 7, largura - 12)
+        codigo = p.codigo_barras if isinstance(p.codigo_barras, str) and p.codigo_barras else None
+        barras = None
+        if codigo:
+            barras = code128.Code128(codigo, barHeight=22, barWidth=0.9)
+            if barras.width > largura - 8:
+                barras = code128.Code128(codigo, barHeight=22, barWidth=0.9 * (largura - 8) / barras.width)
+
+        for _ in range(p.repeticoes):
+            posicao = feitos % por_folha
+            if feitos and posicao == 0:
+                c.showPage()
+            x = (posicao % ETIQUETA_COLUNAS) * largura
+            y = height - (posicao // ETIQUETA_COLUNAS + 1) * altura
+
+            c.saveState()
+            c.translate(x, y)
+            c.doForm(FORM_ETIQUETA)
+            c.setFont('Helvetica-Bold', 9)
+            c.drawString(6, altura - 22, nome)
+            c.setFont('Helvetica', 7)
+            c.drawString(6, altura - 32, marca_texto)
+            c.setFont('Helvetica-Bold', 16)
+            c.drawString(6, altura - 58, p.preco_formatado)
+            c.setFont('Helvetica', 8)
+            c.drawRightString(largura - 6, altura - 58, p.validade)
+            if barras:
+                barras.drawOn(c, (largura - barras.width) / 2, 12)
+                c.setFont('Helvetica', 6)
+                c.drawCentredString(largura / 2, 5, codigo)
+            else:
+                c.setFont('Helvetica', 6)
+                c.drawCentredString(largura / 2, 5, f'ID {p.id}')
+            c.restoreState()
+
+            feitos += 1
+            if progress:
+                progress(feitos, total)
+
+    c.save()
+    buffer.seek(0)
+    return buffer.getvalue()
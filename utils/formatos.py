@@ -0,0 +1,29 @@
+# ====================================================================
+# ARQUIVO: utils/formatos.py
+# Nome da loja e formatadores de valores (moeda, datas) no padrão brasileiro.
+# Sem dependências do projeto: pode ser importado tanto pelas páginas
+# (via utils/pagina.py) quanto por módulos que rodam fora do Streamlit,
+# como o catálogo estático.
+# ====================================================================
+
+from datetime import datetime
+
+NOME_LOJA = "Cores e Fragrâncias"
+
+
+def format_to_brl(value):
+    """Formata um float para string no formato R$ 1.234,56."""
+    try:
+        return f"R$ {float(value):_.2f}".replace('.', 'X').replace('_', '.').replace('X', ',')
+    except (ValueError, TypeError):
+        return "R$ N/A"
+
+
+def format_date(valor, formato='%d/%m/%Y'):
+    """Converte uma data ISO para o formato brasileiro; vazios viram '-' e valores inválidos ficam como estão."""
+    if not valor:
+        return '-'
+    try:
+        return datetime.fromisoformat(str(valor)).strftime(formato)
+    except (ValueError, TypeError):
+        return valor
@@ -0,0 +1,163 @@
+# ====================================================================
+# ARQUIVO: utils/imagens.py
+# Coleta de lixo das fotos em assets/: arquivos órfãos (sem produto)
+# e duplicados (mesmo conteúdo salvo com nomes diferentes).
+# Uso pela linha de comando:
+#   python -m utils.imagens            (apenas relatório, nada é apagado)
+#   python -m utils.imagens --executar (remove órfãos e duplicados)
+# ====================================================================
+
+import os
+import time
+import hashlib
+import argparse
+from collections import defaultdict
+
+from utils.database import get_db_connection, write_transaction, ASSETS_DIR
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+# Arquivos que nunca são tratados como fotos de produto
+ARQUIVOS_PROTEGIDOS = {"logo.png", "logo"}
+
+# Arquivos mais novos que isso são ignorados: podem ser um upload cujo cadastro ainda não terminou
+IDADE_MINIMA_SEGUNDOS = 60 * 60
+
+
+def get_referenced_photos():
+    """Retorna o conjunto de nomes de foto usados por algum produto."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT foto FROM produtos WHERE foto IS NOT NULL AND foto != ''")
+    fotos = {row['foto'] for row in cursor.fetchall()}
+    conn.close()
+    return fotos
+
+
+def _scan_assets():
+    """Lista os arquivos de foto em ASSETS_DIR (um único os.scandir) com tamanho e data."""
+    limite = time.time() - IDADE_MINIMA_SEGUNDOS
+    arquivos = []
+    with os.scandir(ASSETS_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name in ARQUIVOS_PROTEGIDOS:
+                continue
+            info = entry.stat()
+            if info.st_mtime > limite:
+                continue
+            arquivos.append({"nome": entry.name, "tamanho": info.st_size, "mtime": info.st_mtime})
+    return arquivos
+
+
+def _file_hash(nome):
+    sha = hashlib.sha256()
+    with open(os.path.join(ASSETS_DIR, nome), "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def find_duplicate_images(arquivos=None, referenciadas=None):
+    """Agrupa arquivos com o mesmo conteúdo.
+
+    Só calcula o hash de arquivos que têm o mesmo tamanho de algum outro. Em cada grupo,
+    o arquivo mantido ('manter') é o mais antigo entre os referenciados por produtos
+    (ou o mais antigo de todos, se nenhum for referenciado).
+    """
+    arquivos = _scan_assets() if arquivos is None else arquivos
+    referenciadas = get_referenced_photos() if referenciadas is None else referenciadas
+
+    por_tamanho = defaultdict(list)
+    for arquivo in arquivos:
+        por_tamanho[arquivo["tamanho"]].append(arquivo)
+
+    grupos = []
+    for candidatos in por_tamanho.values():
+        if len(candidatos) < 2:
+            continue
+        por_hash = defaultdict(list)
+        for arquivo in candidatos:
+            por_hash[_file_hash(arquivo["nome"])].append(arquivo)
+        for iguais in por_hash.values():
+            if len(iguais) < 2:
+                continue
+            iguais.sort(key=lambda a: (a["nome"] not in referenciadas, a["mtime"], a["nome"]))
+            grupos.append({
+                "manter": iguais[0]["nome"],
+                "duplicados": [a["nome"] for a in iguais[1:]],
+                "tamanho": iguais[0]["tamanho"],
+            })
+    return grupos
+
+
+def collect_image_garbage(dry_run=True, progress=None):
+    """Encontra (e, se dry_run=False, remove) fotos órfãs e duplicadas.
+
+    Para duplicados, os produtos que apontam para a cópia passam a apontar para o arquivo
+    mantido antes de a cópia ser apagada. Retorna um relatório com os arquivos e os bytes
+    recuperáveis (ou recuperados).
+    """
+    arquivos = _scan_assets()
+    referenciadas = get_referenced_photos()
+    grupos = find_duplicate_images(arquivos, referenciadas)
+
+    duplicados = {nome for grupo in grupos for nome in grupo["duplicados"]}
+    orfaos = [a for a in arquivos if a["nome"] not in referenciadas and a["nome"] not in duplicados]
+    tamanhos = {a["nome"]: a["tamanho"] for a in arquivos}
+
+    relatorio = {
+        "arquivos_analisados": len(arquivos),
+        "orfaos": [a["nome"] for a in orfaos],
+        "duplicados": grupos,
+        "bytes_recuperaveis": sum(a["tamanho"] for a in orfaos) + sum(tamanhos[n] for n in duplicados),
+        "removidos": [],
+        "dry_run": dry_run,
+    }
+    if dry_run:
+        return relatorio
+
+    # 1. Aponta os produtos para o arquivo mantido de cada grupo (uma transação)
+    with write_transaction() as cursor:
+        for grupo in grupos:
+            marcadores = ", ".join("?" for _ in grupo["duplicados"])
+            cursor.execute(f"UPDATE produtos SET foto = ? WHERE foto IN ({marcadores})", (grupo["manter"], *grupo["duplicados"]))
+
+    # 2. Remove os arquivos (conferindo de novo, já que o banco pode ter mudado desde a análise)
+    ainda_referenciadas = get_referenced_photos()
+    candidatos = [a["nome"] for a in orfaos] + sorted(duplicados)
+    for index, nome in enumerate(candidatos, start=1):
+        if progress:
+            progress(index, len(candidatos))
+        if nome in ainda_referenciadas:
+            continue
+        try:
+            os.remove(os.path.join(ASSETS_DIR, nome))
+            relatorio["removidos"].append(nome)
+        except FileNotFoundError:
+            pass
+
+    relatorio["bytes_recuperaveis"] = sum(tamanhos[n] for n in relatorio["removidos"])
+    return relatorio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Limpeza de fotos órfãs e duplicadas em assets/.")
+    parser.add_argument("--executar", action="store_true", help="Remove os arquivos (sem isso, apenas relata).")
+    args = parser.parse_args()
+
+    relatorio = collect_image_garbage(dry_run=not args.executar)
+    print(f"Arquivos analisados: {relatorio['arquivos_analisados']}")
+    print(f"Órfãos: {len(relatorio['orfaos'])}")
+    for nome in relatorio["orfaos"]:
+        print(f"  - {nome}")
+    print(f"Grupos de duplicados: {len(relatorio['duplicados'])}")
+    for grupo in relatorio["duplicados"]:
+        print(f"  - mantém {grupo['manter']}, remove {', '.join(grupo['duplicados'])}")
+    acao = "Recuperados" if args.executar else "Recuperáveis"
+    print(f"{acao}: {relatorio['bytes_recuperaveis'] / (1024 * 1024):.1f} MB".replace('.', ','))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# ====================================================================
+# ARQUIVO: utils/jobs.py
+# Fila de tarefas em segundo plano (importação CSV, PDF, remoção de fotos).
+# As tarefas rodam em um pool de threads do próprio processo e o estado
+# fica na tabela 'jobs', visível para todas as sessões do Streamlit.
+# Tarefas terminadas há mais de RETENCAO_DIAS dias são apagadas junto com
+# o arquivo de resultado.
+# ====================================================================
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from utils.database import get_db_connection, write_transaction, DATABASE_DIR
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+JOBS_DIR = os.path.join(DATABASE_DIR, "jobs")
+MAX_WORKERS = int(os.environ.get("ESTOQUE_JOB_WORKERS", "4"))
+RETENCAO_DIAS = int(os.environ.get("ESTOQUE_JOB_RETENCAO_DIAS", "7"))
+INTERVALO_LIMPEZA = 3600  # segundos entre duas limpezas de tarefas antigas no mesmo processo
+INTERVALO_CANCELAMENTO = 1.0  # segundos entre duas leituras de 'jobs.cancelar' durante a tarefa
+
+STATUS_ATIVOS = ("pendente", "executando")
+
+if not os.path.exists(JOBS_DIR):
+    os.makedirs(JOBS_DIR)
+
+_executor = None
+_executor_lock = threading.Lock()
+_ultima_limpeza = 0.0
+
+# Progresso e pedidos de cancelamento ficam em memória enquanto a tarefa roda:
+# assim o progresso não precisa escrever no banco no meio de uma transação da própria tarefa.
+# Pedidos de outros processos chegam por 'jobs.cancelar', lido (sem escrever) a cada INTERVALO_CANCELAMENTO.
+_progresso = {}
+_cancelados = set()
+
+
+class JobCancelado(Exception):
+    """Levantada dentro da tarefa quando o usuário pede o cancelamento."""
+
+
+def _get_executor():
+    """Cria o pool de workers na primeira utilização (uma vez por processo)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _marcar_interrompidos()
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="estoque-job")
+        return _executor
+
+
+def _processo_ativo(pid):
+    """True se o processo 'pid' (desta máquina) ainda está rodando."""
+    if not pid or pid == os.getpid():
+        return False  # Sem PID (tarefa antiga) ou PID reaproveitado por este processo, que acabou de começar
+    if os.name == "nt":
+        # No Windows, os.kill(pid, 0) encerraria o processo: consulta o código de saída
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        codigo = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(codigo))
+        kernel32.CloseHandle(handle)
+        return codigo.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Existe, mas é de outro usuário
+    return True
+
+
+def _marcar_interrompidos():
+    """Tarefas ativas cujo processo parou não voltam a rodar: ficam como 'interrompido'.
+
+    As de outros processos ainda vivos (outro servidor Streamlit, a linha de comando) não são tocadas.
+    """
+    conn = get_db_connection()
+    ativos = conn.execute("SELECT id, pid FROM jobs WHERE status IN (?, ?)", STATUS_ATIVOS).fetchall()
+    conn.close()
+    orfaos = [row["id"] for row in ativos if not _processo_ativo(row["pid"])]
+    if orfaos:
+        agora = datetime.now().isoformat()
+        with write_transaction() as cursor:
+            cursor.executemany(
+                "UPDATE jobs SET status = 'interrompido', atualizado_em = ? WHERE id = ? AND status IN (?, ?)",
+                [(agora, job_id, *STATUS_ATIVOS) for job_id in orfaos]
+            )
+
+
+def _limpar_antigos():
+    """Apaga as tarefas terminadas há mais de RETENCAO_DIAS dias e os arquivos de resultado delas."""
+    global _ultima_limpeza
+    if time.monotonic() - _ultima_limpeza < INTERVALO_LIMPEZA:
+        return
+    _ultima_limpeza = time.monotonic()
+    limite = (datetime.now() - timedelta(days=RETENCAO_DIAS)).isoformat()
+    with write_transaction() as cursor:
+        cursor.execute(
+            "SELECT id, arquivo FROM jobs WHERE criado_em < ? AND status NOT IN (?, ?)", (limite, *STATUS_ATIVOS)
+        )
+        antigas = cursor.fetchall()
+        cursor.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in antigas])
+    # Arquivos só depois do commit: se a transação falhar, as linhas continuam apontando para eles
+    for row in antigas:
+        if row["arquivo"]:
+            try:
+                os.remove(os.path.join(JOBS_DIR, row["arquivo"]))
+            except FileNotFoundError:
+                pass
+
+
+def _atualizar_job(job_id, **campos):
+    campos["atualizado_em"] = datetime.now().isoformat()
+    colunas = ", ".join(f"{nome} = ?" for nome in campos)
+    with write_transaction() as cursor:
+        cursor.execute(f"UPDATE jobs SET {colunas} WHERE id = ?", (*campos.values(), job_id))
+
+
+# ====================================================================
+# EXECUÇÃO
+# ====================================================================
+
+def _cancelamento_pedido(job_id):
+    """True se o cancelamento foi pedido neste processo ou gravado no banco por outro."""
+    if job_id in _cancelados:
+        return True
+    conn = get_db_connection()
+    row = conn.execute("SELECT cancelar FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    if row and row["cancelar"]:
+        _cancelados.add(job_id)
+        return True
+    return False
+
+
+def _make_progress(job_id):
+    """Cria o callback progress(feitos, total, mensagem=None) entregue à função da tarefa."""
+    ultima_consulta = time.monotonic()
+
+    def progress(feitos, total, mensagem=None):
+        nonlocal ultima_consulta
+        if job_id in _cancelados:
+            raise JobCancelado()
+        if time.monotonic() - ultima_consulta >= INTERVALO_CANCELAMENTO:
+            ultima_consulta = time.monotonic()
+            if _cancelamento_pedido(job_id):
+                raise JobCancelado()
+        _progresso[job_id] = (min(feitos / total, 1.0) if total else 0.0, mensagem)
+    return progress
+
+
+def _salvar_resultado(job_id, resultado, extensao):
+    """Bytes/str vão para um arquivo em JOBS_DIR; outros valores são gravados como JSON."""
+    if isinstance(resultado, str):
+        resultado = resultado.encode("utf-8")
+    if isinstance(resultado, (bytes, bytearray)):
+        arquivo = f"job_{job_id}.{extensao or 'bin'}"
+        with open(os.path.join(JOBS_DIR, arquivo), "wb") as f:
+            f.write(resultado)
+        return {"arquivo": arquivo}
+    return {"resultado": json.dumps(resultado, default=str)}
+
+
+def _run_job(job_id, func, args, kwargs, extensao):
+    if _cancelamento_pedido(job_id):
+        _cancelados.discard(job_id)
+        _atualizar_job(job_id, status="cancelado")
+        return
+
+    _atualizar_job(job_id, status="executando")
+    try:
+        resultado = func(*args, progress=_make_progress(job_id), **kwargs)
+        _atualizar_job(job_id, status="concluido", progresso=1.0, **_salvar_resultado(job_id, resultado, extensao))
+    except JobCancelado:
+        _atualizar_job(job_id, status="cancelado", progresso=_ultimo_progresso(job_id), mensagem="Cancelado pelo usuário.")
+    except Exception as e:
+        _atualizar_job(job_id, status="erro", progresso=_ultimo_progresso(job_id), mensagem=str(e))
+    finally:
+        _progresso.pop(job_id, None)
+        _cancelados.discard(job_id)
+
+
+def _ultimo_progresso(job_id):
+    return _progresso.get(job_id, (0.0, None))[0]
+
+
+def submit_job(tipo, func, *args, usuario=None, extensao=None, **kwargs):
+    """Registra uma tarefa e a coloca na fila. Retorna o ID da tarefa.
+
+    func é chamada como func(*args, progress=..., **kwargs). O valor retornado fica
+    disponível em get_job (números/dicts) ou get_job_file (bytes/str, salvos com 'extensao').
+    """
+    executor = _get_executor()  # Antes do INSERT: a primeira chamada marca as tarefas órfãs como interrompidas
+    _limpar_antigos()
+    with write_transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO jobs (tipo, usuario, status, criado_em, pid) VALUES (?, ?, 'pendente', ?, ?)",
+            (tipo, usuario, datetime.now().isoformat(), os.getpid())
+        )
+        job_id = cursor.lastrowid
+
+    executor.submit(_run_job, job_id, func, args, kwargs, extensao)
+    return job_id
+
+
+def cancel_job(job_id):
+    """Pede o cancelamento de uma tarefa pendente ou em execução.
+
+    Vale também para tarefas de outro processo: elas leem 'jobs.cancelar' durante o progresso.
+    """
+    _cancelados.add(job_id)
+    with write_transaction() as cursor:
+        cursor.execute("UPDATE jobs SET cancelar = 1 WHERE id = ? AND status IN (?, ?)", (job_id, *STATUS_ATIVOS))
+
+
+# ====================================================================
+# CONSULTA
+# ====================================================================
+
+def _com_progresso(job):
+    """Completa a linha do banco com o progresso em memória (se a tarefa estiver rodando)."""
+    job = dict(job)
+    if job["id"] in _progresso:
+        job["progresso"], mensagem = _progresso[job["id"]]
+        job["mensagem"] = mensagem or job.get("mensagem")
+    if job.get("resultado"):
+        job["resultado"] = json.loads(job["resultado"])
+    return job
+
+
+def get_job(job_id):
+    """Busca uma tarefa pelo ID."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    job = cursor.fetchone()
+    conn.close()
+    return _com_progresso(job) if job else None
+
+
+def list_jobs(usuario=None, limit=10):
+    """Retorna as tarefas mais recentes (de um usuário, se informado)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if usuario:
+        cursor.execute("SELECT * FROM jobs WHERE usuario = ? ORDER BY id DESC LIMIT ?", (usuario, limit))
+    else:
+        cursor.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+    jobs = [_com_progresso(row) for row in cursor.fetchall()]
+    conn.close()
+    return jobs
+
+
+def get_job_file(job):
+    """Retorna os bytes do arquivo gerado pela tarefa (ou None)."""
+    if not job or not job.get("arquivo"):
+        return None
+    try:
+        with open(os.path.join(JOBS_DIR, job["arquivo"]), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
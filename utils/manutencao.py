@@ -0,0 +1,226 @@
+# ====================================================================
+# ARQUIVO: utils/manutencao.py
+# Backup online, rotação, otimização e estatísticas do data/estoque.db.
+# Uso pela linha de comando:
+#   python -m utils.manutencao backup [--manter N]
+#   python -m utils.manutencao otimizar
+#   python -m utils.manutencao status
+# ====================================================================
+
+import os
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+from utils.database import get_db_connection, write_transaction, prune_alteracoes, DATABASE, DATABASE_DIR
+from utils.jobs import submit_job
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+BACKUP_DIR = os.path.join(DATABASE_DIR, "backups")
+BACKUPS_MANTIDOS = 7
+INTERVALO_MANUTENCAO = timedelta(hours=24)
+
+if not os.path.exists(BACKUP_DIR):
+    os.makedirs(BACKUP_DIR)
+
+_proxima_verificacao = None
+
+
+def _get_meta(chave):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT valor FROM meta WHERE chave = ?", (chave,))
+    row = cursor.fetchone()
+    conn.close()
+    return row['valor'] if row else None
+
+
+def _set_meta(chave, valor):
+    with write_transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO meta (chave, valor) VALUES (?, ?) ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor",
+            (chave, valor)
+        )
+
+
+# ====================================================================
+# BACKUP
+# ====================================================================
+
+def backup_database(manter=BACKUPS_MANTIDOS, progress=None):
+    """Copia o banco com a API de backup do sqlite3 (sem bloquear os leitores) e remove backups antigos.
+
+    Retorna o caminho do arquivo de backup criado.
+    """
+    destino = os.path.join(BACKUP_DIR, f"estoque_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+
+    origem = get_db_connection()
+    copia = sqlite3.connect(destino)
+
+    def _progresso_backup(status, restantes, total):
+        if progress:
+            progress(total - restantes, total)
+
+    try:
+        # Copia em blocos de páginas: entre um bloco e outro os demais acessos continuam normalmente
+        origem.backup(copia, pages=256, progress=_progresso_backup)
+    finally:
+        copia.close()
+        origem.close()
+
+    rotate_backups(manter)
+    _set_meta("ultimo_backup", datetime.now().isoformat())
+    return destino
+
+
+def list_backups():
+    """Retorna os backups existentes (mais recente primeiro) com nome, tamanho e data."""
+    backups = []
+    for nome in os.listdir(BACKUP_DIR):
+        if nome.startswith("estoque_") and nome.endswith(".db"):
+            caminho = os.path.join(BACKUP_DIR, nome)
+            backups.append({
+                "nome": nome,
+                "caminho": caminho,
+                "tamanho": os.path.getsize(caminho),
+                "criado_em": datetime.fromtimestamp(os.path.getmtime(caminho)).isoformat(),
+            })
+    return sorted(backups, key=lambda b: b["nome"], reverse=True)
+
+
+def rotate_backups(manter=BACKUPS_MANTIDOS):
+    """Mantém apenas os 'manter' backups mais recentes. Retorna os nomes removidos."""
+    removidos = []
+    for backup in list_backups()[manter:]:
+        os.remove(backup["caminho"])
+        removidos.append(backup["nome"])
+    return removidos
+
+
+# ====================================================================
+# OTIMIZAÇÃO E ESTATÍSTICAS
+# ====================================================================
+
+def get_database_stats():
+    """Retorna tamanho do arquivo, páginas livres e fragmentação (% de páginas livres)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    stats = {}
+    for pragma in ("page_size", "page_count", "freelist_count", "journal_mode", "auto_vacuum"):
+        cursor.execute(f"PRAGMA {pragma}")
+        stats[pragma] = cursor.fetchone()[0]
+    conn.close()
+
+    stats["tamanho_arquivo"] = os.path.getsize(DATABASE)
+    wal = DATABASE + "-wal"
+    stats["tamanho_wal"] = os.path.getsize(wal) if os.path.exists(wal) else 0
+    stats["fragmentacao"] = (stats["freelist_count"] / stats["page_count"] * 100) if stats["page_count"] else 0.0
+    stats["ultimo_backup"] = _get_meta("ultimo_backup")
+    stats["ultima_otimizacao"] = _get_meta("ultima_otimizacao")
+    return stats
+
+
+def optimize_database(progress=None):
+    """Roda PRAGMA optimize, libera páginas vazias (incremental_vacuum) e faz checkpoint do WAL.
+
+    Na primeira execução o banco é convertido para auto_vacuum=INCREMENTAL, o que exige
+    um VACUUM completo (único). Retorna as estatísticas antes e depois.
+    """
+    antes = get_database_stats()
+
+    conn = get_db_connection()
+    conn.isolation_level = None  # VACUUM não pode rodar dentro de uma transação
+    cursor = conn.cursor()
+    if antes["auto_vacuum"] != 2:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+    if progress:
+        progress(1, 3)
+
+    cursor.execute("PRAGMA incremental_vacuum")
+    cursor.fetchall()
+    if progress:
+        progress(2, 3)
+
+    cursor.execute("PRAGMA optimize")
+    cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    if progress:
+        progress(3, 3)
+
+    _set_meta("ultima_otimizacao", datetime.now().isoformat())
+    return {"antes": antes, "depois": get_database_stats()}
+
+
+def check_integrity():
+    """Roda PRAGMA quick_check e retorna a lista de problemas (vazia se o banco estiver íntegro)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA quick_check")
+    resultado = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return [] if resultado == ["ok"] else resultado
+
+
+def run_scheduled_maintenance(progress=None):
+    """Faz backup e otimização se a última manutenção tiver mais de INTERVALO_MANUTENCAO."""
+    ultima = _get_meta("ultima_otimizacao")
+    if ultima and datetime.now() - datetime.fromisoformat(ultima) < INTERVALO_MANUTENCAO:
+        return False
+    backup_database()
+    prune_alteracoes()
+    optimize_database(progress=progress)
+    return True
+
+
+def schedule_maintenance():
+    """Agenda run_scheduled_maintenance na fila de tarefas, no máximo uma vez por intervalo neste processo."""
+    global _proxima_verificacao
+    if _proxima_verificacao and datetime.now() < _proxima_verificacao:
+        return None
+    _proxima_verificacao = datetime.now() + INTERVALO_MANUTENCAO
+    return submit_job("manutencao_db", run_scheduled_maintenance, usuario="sistema")
+
+
+# ====================================================================
+# LINHA DE COMANDO
+# ====================================================================
+
+def format_bytes(tamanho):
+    """Formata um tamanho em bytes para leitura (ex.: 1,5 MB)."""
+    for unidade in ("B", "KB", "MB", "GB"):
+        if tamanho < 1024 or unidade == "GB":
+            return f"{tamanho:.1f} {unidade}".replace('.', ',')
+        tamanho /= 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção do banco de dados do estoque.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_backup = sub.add_parser("backup", help="Faz um backup online e remove os antigos.")
+    p_backup.add_argument("--manter", type=int, default=BACKUPS_MANTIDOS, help="Quantidade de backups mantidos.")
+    sub.add_parser("otimizar", help="Roda optimize/incremental_vacuum.")
+    sub.add_parser("status", help="Mostra tamanho, fragmentação e integridade.")
+    args = parser.parse_args()
+
+    if args.comando == "backup":
+        print(f"Backup criado: {backup_database(args.manter)}")
+    elif args.comando == "otimizar":
+        resultado = optimize_database()
+        print(f"Tamanho: {format_bytes(resultado['antes']['tamanho_arquivo'])} -> "
+              f"{format_bytes(resultado['depois']['tamanho_arquivo'])}")
+    else:
+        stats = get_database_stats()
+        print(f"Arquivo: {DATABASE} ({format_bytes(stats['tamanho_arquivo'])}, WAL {format_bytes(stats['tamanho_wal'])})")
+        print(f"Modo de journal: {stats['journal_mode']} • auto_vacuum: {stats['auto_vacuum']}")
+        print(f"Páginas: {stats['page_count']} • Livres: {stats['freelist_count']} ({stats['fragmentacao']:.1f}%)")
+        print(f"Último backup: {stats['ultimo_backup'] or '-'} • Última otimização: {stats['ultima_otimizacao'] or '-'}")
+        problemas = check_integrity()
+        print("Integridade: ok" if not problemas else "Integridade: " + "; ".join(problemas))
+
+
+if __name__ == "__main__":
+    main()
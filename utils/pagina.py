@@ -0,0 +1,147 @@
+# ====================================================================
+# ARQUIVO: utils/pagina.py
+# Estrutura comum das páginas: configuração + CSS, verificação de login/papel
+# e os formatadores (de utils/formatos.py). O style.css é lido e minificado uma vez por processo e só
+# volta a ser lido quando o arquivo muda (data de modificação).
+# ====================================================================
+
+import os
+import re
+import threading
+
+import streamlit as st
+
+from utils.database import get_locais, get_cliente, buscar_clientes, LOCAL_PRINCIPAL
+from utils.catalogo import schedule_catalog_publish
+from utils.formatos import NOME_LOJA, format_to_brl, format_date  # Reexportados para as páginas
+
+# ====================================================================
+# CONFIGURAÇÃO
+# ====================================================================
+
+ARQUIVO_CSS = "style.css"
+MENSAGEM_LOGIN = "🔒 **Acesso Restrito.** Por favor, faça login na Área Administrativa."
+
+_css_cache = {}  # caminho -> (mtime, css minificado)
+_css_lock = threading.Lock()
+
+
+# ====================================================================
+# CSS
+# ====================================================================
+
+def minify_css(css):
+    """Remove comentários e espaços desnecessários do CSS."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)  # ":" fica de fora (ex.: "div :hover")
+    return css.replace(";}", "}").strip()
+
+
+def get_css(file_name=ARQUIVO_CSS):
+    """Retorna o CSS minificado, relendo o arquivo apenas se ele mudou desde a última leitura."""
+    try:
+        mtime = os.stat(file_name).st_mtime_ns
+    except OSError:
+        return ""
+    cache = _css_cache.get(file_name)
+    if cache and cache[0] == mtime:
+        return cache[1]
+    with _css_lock:
+        with open(file_name, encoding='utf-8') as f:
+            css = minify_css(f.read())
+        _css_cache[file_name] = (mtime, css)
+    return css
+
+
+def load_css(file_name=ARQUIVO_CSS):
+    """Aplica o CSS personalizado na página (sem ler o disco a cada rerun)."""
+    css = get_css(file_name)
+    if css:
+        st.markdown(f'<style>{css}</style>', unsafe_allow_html=True)
+
+
+# ====================================================================
+# SESSÃO E ACESSO
+# ====================================================================
+
+def init_session():
+    """Garante as chaves de login no session_state."""
+    st.session_state.setdefault("logged_in", False)
+    st.session_state.setdefault("username", "")
+    st.session_state.setdefault("role", "guest")
+
+
+def is_admin():
+    """True se o usuário logado for administrador."""
+    return bool(st.session_state.get("logged_in")) and st.session_state.get("role") == "admin"
+
+
+def require_login(role=None, mensagem=None):
+    """Interrompe a página se não houver login (ou se o papel for diferente de 'role')."""
+    init_session()
+    if not st.session_state.get("logged_in"):
+        st.error(mensagem or MENSAGEM_LOGIN)
+        st.stop()
+    if role and st.session_state.get("role") != role:
+        st.error(mensagem or f"🔒 **Acesso Restrito.** Esta página é exclusiva para o papel '{role}'.")
+        st.stop()
+
+
+def setup_page(titulo, layout="centered", login=False, role=None, mensagem=None):
+    """Configura a página (título e layout), aplica o CSS e, se pedido, exige login/papel.
+
+    Com login, também agenda a republicação do catálogo público se houve escrita (no máximo a cada 30 s).
+    """
+    st.set_page_config(page_title=f"{titulo} - {NOME_LOJA}", layout=layout)
+    load_css()
+    if login or role:
+        require_login(role, mensagem)
+    else:
+        init_session()
+    if st.session_state.get("logged_in"):
+        schedule_catalog_publish()  # Visitantes sem login não disparam tarefas
+
+
+def select_local():
+    """Local de estoque da sessão (seletor na barra lateral, só quando há mais de um local ativo).
+
+    Retorna o ID do local escolhido, guardado em st.session_state['local_id'].
+    """
+    locais = get_locais()
+    if len(locais) <= 1:
+        st.session_state["local_id"] = LOCAL_PRINCIPAL
+        return LOCAL_PRINCIPAL
+    nomes = {l["id"]: f"{l['nome']} ({l['unidades']} un.)" for l in locais}
+    ids = list(nomes)
+    atual = st.session_state.get("local_id")
+    # Sem 'key': o estado de widgets é descartado ao trocar de página, e o local deve valer para todas
+    local_id = st.sidebar.selectbox("📍 Local de estoque", ids, index=ids.index(atual) if atual in nomes else 0,
+                                    format_func=nomes.get)
+    st.session_state["local_id"] = local_id
+    return local_id
+
+
+def format_cliente(cliente):
+    """Nome do cliente com o telefone, para listas e seletores."""
+    return f"{cliente['nome']} ({cliente['telefone']})" if cliente.get('telefone') else cliente['nome']
+
+
+def select_cliente():
+    """Cliente das próximas vendas (busca por nome/telefone na barra lateral; opcional).
+
+    Retorna o ID do cliente ou None, guardado em st.session_state['cliente_id'] (vale também no chatbot).
+    """
+    atual = st.session_state.get("cliente_id")
+    termo = st.sidebar.text_input("👤 Buscar cliente", placeholder="Nome ou telefone")
+    clientes = {c["id"]: format_cliente(c) for c in buscar_clientes(termo)} if termo.strip() else {}
+    if atual and atual not in clientes:
+        cliente = get_cliente(atual)
+        if cliente:
+            clientes = {atual: format_cliente(cliente), **clientes}
+    opcoes = [0] + list(clientes)  # 0 = sem cliente (None no selectbox significaria "nada escolhido")
+    cliente_id = st.sidebar.selectbox("Cliente da venda", opcoes, index=opcoes.index(atual) if atual in opcoes else 0,
+                                      format_func=lambda i: clientes.get(i, "Sem cliente")) or None
+    st.session_state["cliente_id"] = cliente_id
+    return cliente_id
+